@@ -0,0 +1,141 @@
+"""
+Measure how long it takes to import the module behind each xia2 console
+script, with python -X importtime, as a guard against imports creeping back
+to the top level of the command line tools.
+
+    python benchmarks/cli_importtime.py [-n 5] [--save baseline.json]
+        [--baseline baseline.json [--tolerance 0.2]] [script ...]
+
+Each module is imported n times in a fresh interpreter, and the fastest time
+reported, with the slowest of its (transitive) imports from outside xia2.
+With --baseline, any script more than tolerance (a fraction) and 20ms slower
+to import than in the baseline is reported, and the exit status is 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+SETUP_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "setup.py")
+
+# the time any import may vary by without being counted as a regression
+SLACK = 0.02
+
+
+def console_scripts(setup_py=SETUP_PY):
+    """The console scripts listed in setup.py, as {name: module}."""
+    with open(setup_py) as fh:
+        tree = ast.parse(fh.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            getattr(target, "id", None) == "console_scripts" for target in node.targets
+        ):
+            scripts = ast.literal_eval(node.value)
+            break
+    else:
+        raise RuntimeError("no console_scripts in %s" % setup_py)
+    return {
+        name.strip(): entry_point.split(":")[0].strip()
+        for name, entry_point in (script.split("=", 1) for script in scripts)
+    }
+
+
+def import_time(module):
+    """
+    Import module in a fresh interpreter under -X importtime.
+
+    :return: the cumulative import time of the module in seconds, and the
+             cumulative times of the top-level packages from outside xia2 it
+             imported, or None and the error if the import failed
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        return None, result.stderr.strip().splitlines()[-1]
+
+    total = None
+    packages = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            cumulative = int(fields[1]) / 1e6
+        except ValueError:
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if name == module:
+            total = cumulative
+        elif "." not in name and name != "xia2" and depth <= 2:
+            packages[name] = max(packages.get(name, 0), cumulative)
+    return total, packages
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("scripts", nargs="*", help="only these console scripts")
+    parser.add_argument("-n", type=int, default=5, help="imports of each module")
+    parser.add_argument("--save", help="write the times to this file")
+    parser.add_argument("--baseline", help="compare with the times in this file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    options = parser.parse_args(args)
+
+    scripts = console_scripts()
+    if options.scripts:
+        scripts = {name: scripts[name] for name in options.scripts}
+
+    baseline = {}
+    if options.baseline:
+        with open(options.baseline) as fh:
+            baseline = json.load(fh)
+
+    times = {}
+    regressions = []
+    for name, module in sorted(scripts.items()):
+        best = None
+        packages = {}
+        for _ in range(options.n):
+            total, packages = import_time(module)
+            if total is None:
+                break
+            best = total if best is None else min(best, total)
+        if best is None:
+            print("%-28s  failed: %s" % (name, packages))
+            continue
+        times[name] = best
+        slowest = sorted(packages.items(), key=lambda p: p[1], reverse=True)[:3]
+        line = "%-28s %7.3fs  %s" % (
+            name,
+            best,
+            ", ".join("%s %.3fs" % p for p in slowest),
+        )
+        if name in baseline:
+            line += "  (baseline %.3fs)" % baseline[name]
+            if best > baseline[name] * (1 + options.tolerance) + SLACK:
+                regressions.append(name)
+                line += " REGRESSION"
+        print(line)
+
+    if options.save:
+        with open(options.save, "w") as fh:
+            json.dump(times, fh, indent=2, sort_keys=True)
+
+    if regressions:
+        print("Slower to import than the baseline: %s" % ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,74 @@
+"""
+Measure the per-program overhead of starting a child through SimpleDriver,
+comparing the old path (environment copy and /bin/sh) with the direct exec
+path, for a program which does no work at all.
+
+    python benchmarks/driver_spawn.py [-n 200] [--executable true]
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import os
+import time
+
+from xia2.Driver.DriverHelper import executable_exists
+from xia2.Driver.SimpleDriver import SimpleDriver
+
+
+class LegacySimpleDriver(SimpleDriver):
+    """SimpleDriver as it was: deep copy of the environment and the command
+    line run through the shell."""
+
+    _use_shell = True
+
+    def _popen_command(self, command_line, environment, shell):
+        environment = copy.deepcopy(os.environ)
+        for name in self._working_environment:
+            added = os.pathsep.join(self._working_environment[name])
+            if name in environment and name not in self._working_environment_exclusive:
+                environment[name] = f"{added}{os.pathsep}{environment[name]}"
+            else:
+                environment[name] = added
+        return super()._popen_command(command_line, environment, shell)
+
+
+def time_spawns(driver_class, executable, n, working_environment):
+    start = time.perf_counter()
+    for _ in range(n):
+        d = driver_class()
+        d.set_executable(executable)
+        for name, value in working_environment.items():
+            d.add_working_environment(name, value)
+        d.start()
+        d.close_wait()
+        d.check_for_errors()
+    return (time.perf_counter() - start) / n
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("-n", type=int, default=200, help="programs to start")
+    parser.add_argument("--executable", default="true")
+    options = parser.parse_args(args)
+
+    executable = executable_exists(options.executable)
+    if not executable:
+        parser.error("executable %s does not exist in PATH" % options.executable)
+
+    for label, working_environment in (
+        ("inherited environment", {}),
+        ("working environment", {"XIA2_BENCHMARK_PATH": "/nonexistent"}),
+    ):
+        print(label)
+        for driver_class, name in (
+            (LegacySimpleDriver, "shell"),
+            (SimpleDriver, "exec"),
+        ):
+            t = time_spawns(driver_class, executable, options.n, working_environment)
+            print(f"  {name:<6} {t * 1000:7.3f} ms per program")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,60 @@
+"""
+Measure the time taken to set up the xia2 master PHIL scope at the start of
+a process, parsing it (and importing the dials modules it includes scopes
+from) every time as by default, and reading it from the cache kept under
+$XDG_CACHE_HOME/xia2/phil when $XIA2_PHIL_CACHE is set.
+
+    python benchmarks/phil_startup.py [-n 5]
+
+Each measurement is of a fresh interpreter importing xia2.Handlers.Phil and
+merging a little user PHIL, as a process started for each sweep would; the
+fastest of n runs is reported, without the cache and with a cache filled by
+a first run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+STARTUP = """\
+from xia2.Handlers.Phil import PhilIndex
+PhilIndex.update("xia2.settings.resolution.d_min=1.5")
+PhilIndex.get_python_object()
+"""
+
+
+def start(cache_home, use_cache):
+    env = dict(os.environ, XDG_CACHE_HOME=cache_home)
+    env.pop("XIA2_PHIL_CACHE", None)
+    if use_cache:
+        env["XIA2_PHIL_CACHE"] = "1"
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", STARTUP], env=env, check=True)
+    return time.perf_counter() - t0
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("-n", type=int, default=5, help="processes to start")
+    options = parser.parse_args(args)
+
+    cache_home = tempfile.mkdtemp()
+    try:
+        uncached = [start(cache_home, use_cache=False) for _ in range(options.n)]
+        start(cache_home, use_cache=True)
+        cached = [start(cache_home, use_cache=True) for _ in range(options.n)]
+    finally:
+        shutil.rmtree(cache_home, ignore_errors=True)
+
+    print("No cache      %8.3fs" % min(uncached))
+    print("Filled cache  %8.3fs" % min(cached))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,93 @@
+"""
+Measure reading the image headers of some sweeps for xia2.setup serially
+against reading them in chunks on a pool of threads, as _get_sweeps() does
+with read_all_image_headers=True.
+
+    python benchmarks/setup_header_reading.py "/path/to/image_#####.cbf" \\
+        [more templates] [--nthreads 1,4,16] [--chunk-size 500] [--repeat 3]
+
+For each number of threads (1 meaning the serial read) the wall clock and
+CPU time of the fastest of repeat reads are reported. Reading headers is
+partly waiting on the filesystem and partly python holding the GIL, so the
+threads only help as far as the first: a CPU time close to the wall clock
+time for the serial read means there is little for them to gain. The first
+read of all also takes the images into the filesystem cache, so is reported
+separately.
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import time
+
+from dxtbx.sequence_filenames import locate_files_matching_template_string
+
+from xia2.Schema import join_image_headers, read_image_headers
+
+
+def read_serially(paths):
+    return {template: read_image_headers(p) for template, p in paths.items()}
+
+
+def read_in_chunks(paths, nthreads, chunk_size):
+    with concurrent.futures.ThreadPoolExecutor(nthreads) as pool:
+        futures = {
+            template: [
+                pool.submit(read_image_headers, p[i : i + chunk_size])
+                for i in range(0, len(p), chunk_size)
+            ]
+            for template, p in paths.items()
+        }
+        return {
+            template: join_image_headers([f.result() for f in chunks])
+            for template, chunks in futures.items()
+        }
+
+
+def timed(function, *args):
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = function(*args)
+    return time.perf_counter() - wall, time.process_time() - cpu, result
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("templates", nargs="+")
+    parser.add_argument("--nthreads", default="1,4,16")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    options = parser.parse_args(args)
+
+    paths = {
+        template: sorted(locate_files_matching_template_string(template))
+        for template in options.templates
+    }
+    n_images = sum(len(p) for p in paths.values())
+    print("%d images in %d templates" % (n_images, len(paths)))
+
+    wall, cpu, expected = timed(read_serially, paths)
+    print("First read (serial)  %7.2fs wall %7.2fs CPU" % (wall, cpu))
+
+    for nthreads in (int(n) for n in options.nthreads.split(",")):
+        times = []
+        for _ in range(options.repeat):
+            if nthreads == 1:
+                wall, cpu, result = timed(read_serially, paths)
+            else:
+                wall, cpu, result = timed(
+                    read_in_chunks, paths, nthreads, options.chunk_size
+                )
+            times.append((wall, cpu))
+        # the sweeps found must not depend on how the headers were read
+        for template, experiments in result.items():
+            assert len(experiments) == len(expected[template]), template
+        wall, cpu = min(times)
+        print(
+            "%2d thread%s           %7.2fs wall %7.2fs CPU %8.0f images/s"
+            % (nthreads, " " if nthreads == 1 else "s", wall, cpu, n_images / wall)
+        )
+
+
+if __name__ == "__main__":
+    run()
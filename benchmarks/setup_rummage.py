@@ -0,0 +1,130 @@
+"""
+Measure how long xia2.setup takes to find the image templates in a tree of
+directories, before any image headers are read, comparing the old walk
+(os.walk, several stat() calls and the template regular expressions for
+every file) with the scandir-based one. The tree is made of empty files.
+
+    python benchmarks/setup_rummage.py [--directories 200] [--templates 5]
+        [--images 200] [--tree /path/to/existing/tree]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from xia2.Applications import xia2setup
+from xia2.Experts.FindImages import image2template_directory
+
+
+def make_tree(root, directories, templates, images):
+    for d in range(directories):
+        directory = os.path.join(root, "visit", "sample_%d" % (d // 10), "d%d" % d)
+        os.makedirs(directory)
+        for t in range(templates):
+            for i in range(1, images + 1):
+                name = "xtal_%d_%d_%05d.cbf" % (d, t + 1, i)
+                open(os.path.join(directory, name), "w").close()
+        for name in ("xia2.txt", "notes.log.1", "SPOT.XDS"):
+            open(os.path.join(directory, name), "w").close()
+
+
+def legacy_find_templates(directories):
+    """xia2setup._rummage as it was, without the header reading."""
+
+    def legacy_is_hdf5_name(filename):
+        return os.path.isfile(filename) and xia2setup._is_hdf5_filename(filename)
+
+    def legacy_is_image_name(filename):
+        if os.path.isfile(filename):
+            name = filename
+            if os.path.split(name)[-1] in xia2setup.XDSFiles:
+                return False
+            for xds_file in "ABSORP", "DECAY", "MODPIX":
+                if os.path.join("scale", xds_file) in name:
+                    return False
+            for exten in xia2setup.known_image_extensions:
+                if name.endswith(exten):
+                    return True
+            end = name.split(".")[-1]
+            if ".log." not in name and len(end) > 1:
+                return True
+            if legacy_is_hdf5_name(name):
+                return True
+        return False
+
+    def legacy_get_template(f):
+        if not legacy_is_image_name(f):
+            return
+        if xia2setup.is_xds_file(f):
+            return
+        os.access(f, os.R_OK)
+        template, directory = image2template_directory(f)
+        return os.path.join(directory, template)
+
+    templates = set()
+    visited = set()
+    for path in directories:
+        for root, dirs, files in os.walk(path, followlinks=True):
+            realpath = os.path.realpath(root)
+            if realpath in visited:
+                continue
+            visited.add(realpath)
+            for f in sorted(files):
+                full_path = os.path.join(root, f)
+                if legacy_is_hdf5_name(full_path):
+                    templates.add(full_path)
+                elif legacy_is_image_name(full_path):
+                    try:
+                        template = legacy_get_template(full_path)
+                    except Exception:
+                        continue
+                    if template is not None:
+                        templates.add(template)
+                elif xia2setup.is_sequence_name(full_path):
+                    pass
+    return templates
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--directories", type=int, default=200)
+    parser.add_argument("--templates", type=int, default=5)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--tree", help="use this tree rather than making one")
+    options = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = options.tree
+        if root is None:
+            root = tmpdir
+            make_tree(root, options.directories, options.templates, options.images)
+            print(
+                "Made %d empty files"
+                % (options.directories * (options.templates * options.images + 3))
+            )
+
+        # make sure neither walk pays for reading the tree into the cache
+        for _ in os.walk(root):
+            pass
+
+        results = {}
+        for label, find_templates in (
+            ("os.walk, stat and regex per file", legacy_find_templates),
+            ("scandir, parallel", xia2setup._find_templates),
+        ):
+            start = time.perf_counter()
+            results[label] = find_templates([root])
+            print(
+                "%-34s %8.3fs, %d templates"
+                % (label, time.perf_counter() - start, len(results[label]))
+            )
+
+        legacy, new = results.values()
+        assert legacy == new, legacy ^ new
+
+
+if __name__ == "__main__":
+    run()
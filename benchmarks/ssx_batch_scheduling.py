@@ -0,0 +1,139 @@
+"""
+Simulate the processing of a serial run by xia2.ssx with njobs parallel
+jobs, with synthetic per-image costs for find_spots, index and integrate,
+comparing batches of equal size (as before) with batches sized as jobs
+become free by the BatchScheduler.
+
+    python benchmarks/ssx_batch_scheduling.py [-n 20000] [--njobs 8]
+        [--batch-size 1000] [--hit-rate 0.3] [--profile flat|ramp|bursts]
+        [--overhead 5] [--seed 0]
+
+Every image is spotfound; hits are indexed, and most of those integrated.
+The hit rate varies along the run according to the profile, and each batch
+costs a fixed overhead (starting the job, loading the models) as well as
+the time for its images. The time taken for the whole run and the fraction
+of it the jobs were busy are reported for each way of cutting batches.
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import math
+import random
+
+from xia2.Modules.SSX.batch_scheduler import BatchScheduler
+
+# seconds per image for each step, on one job
+FIND_SPOTS = 0.05
+INDEX = 0.4
+INTEGRATE = 0.6
+
+
+def hit_rate(profile, fraction, mean):
+    """The hit rate at a fraction of the way through the run."""
+    if profile == "ramp":
+        return 2 * mean * fraction
+    if profile == "bursts":
+        return min(1, 3 * mean) if int(10 * fraction) % 3 == 0 else mean / 3
+    return mean
+
+
+def image_costs(n, profile, mean_hit_rate, seed):
+    rng = random.Random(seed)
+    costs = []
+    for i in range(n):
+        step_times = {"find_spots": FIND_SPOTS * rng.uniform(0.8, 1.2)}
+        if rng.random() < hit_rate(profile, i / n, mean_hit_rate):
+            step_times["index"] = INDEX * rng.expovariate(1)
+            if rng.random() < 0.8:
+                step_times["integrate"] = INTEGRATE * rng.uniform(0.5, 1.5)
+        costs.append(step_times)
+    return costs
+
+
+def simulate(costs, njobs, overhead, next_batch, record=None):
+    """Hand out batches from next_batch() to whichever job is free first,
+    passing each batch to record() once it has finished.
+
+    :return: the time taken for the whole run, and the fraction of it the
+             jobs were busy
+    """
+    jobs = [0.0] * njobs
+    running = []  # (time finished, batch)
+    busy = 0.0
+    for images in iter(next_batch, None):
+        submitted = heapq.heappop(jobs)
+        step_times = {}
+        for image in costs[images[0] : images[1]]:
+            for step, t in image.items():
+                step_times[step] = step_times.get(step, 0) + t
+        finished = submitted + overhead + sum(step_times.values())
+        busy += finished - submitted
+        heapq.heappush(jobs, finished)
+        heapq.heappush(running, (finished, images, submitted, step_times))
+        # the next batch is cut when the next job is free
+        while running and running[0][0] <= jobs[0]:
+            finished, images, submitted, step_times = heapq.heappop(running)
+            if record:
+                record(images, submitted, finished, step_times)
+    for finished, images, submitted, step_times in sorted(running):
+        if record:
+            record(images, submitted, finished, step_times)
+    end = max(jobs)
+    return end, busy / (njobs * end)
+
+
+def equal_batches(n, batch_size):
+    """The batches as cut by setup_main_process."""
+    n_batches = math.floor(n / batch_size)
+    splits = [i * batch_size for i in range(max(1, n_batches))] + [n]
+    return iter(zip(splits[:-1], splits[1:]))
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("-n", type=int, default=20000, help="images in the run")
+    parser.add_argument("--njobs", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--hit-rate", type=float, default=0.3)
+    parser.add_argument(
+        "--profile", choices=("flat", "ramp", "bursts"), default="bursts"
+    )
+    parser.add_argument("--overhead", type=float, default=5, help="seconds/batch")
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args(args)
+
+    costs = image_costs(options.n, options.profile, options.hit_rate, options.seed)
+    total = sum(sum(image.values()) for image in costs)
+    print(
+        "%d images, %.0fs of processing in all, ideally %.0fs across %d jobs"
+        % (options.n, total, total / options.njobs, options.njobs)
+    )
+
+    batches = equal_batches(options.n, options.batch_size)
+    elapsed, utilisation = simulate(
+        costs, options.njobs, options.overhead, lambda: next(batches, None)
+    )
+    n_batches = max(1, math.floor(options.n / options.batch_size))
+    print(
+        "Equal batches     %5d batches %8.0fs  %5.1f%% busy"
+        % (n_batches, elapsed, 100 * utilisation)
+    )
+
+    scheduler = BatchScheduler(options.n, options.njobs, options.batch_size)
+    elapsed, utilisation = simulate(
+        costs,
+        options.njobs,
+        options.overhead,
+        scheduler.next_batch,
+        scheduler.record,
+    )
+    print(
+        "Scheduled batches %5d batches %8.0fs  %5.1f%% busy"
+        % (len(scheduler.batches), elapsed, 100 * utilisation)
+    )
+
+
+if __name__ == "__main__":
+    run()
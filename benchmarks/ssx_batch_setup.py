@@ -0,0 +1,146 @@
+"""
+Compare the setup of the batches for xia2.ssx, and the loading of each batch
+for processing, between copying a slice of imported.expt into each batch
+directory (as before) and recording only the slice of the images to process.
+
+    python benchmarks/ssx_batch_setup.py import/imported.expt
+        [--batch-size 1000] [--repeat 1] [--njobs 1]
+
+With --repeat N, the experiments of the imported data are repeated N times
+(each copy with its own imagesets and scans, as if N times as many images
+had been imported, but sharing the beam and detector models as dials.import
+does), to try out the setup for a large run with a few real images. The time
+taken to set up the batches, the space they take on disk, and the time taken
+to load all the batches for processing across njobs processes (each loading
+its share of batches in turn) are reported for each scheme.
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import copy
+import json
+import math
+import pathlib
+import shutil
+import tempfile
+import time
+import uuid
+
+from dxtbx.serialize import load
+
+from xia2.Modules.SSX.data_integration_standard import (
+    load_batch_experiments,
+    setup_main_process,
+)
+
+
+def repeat_experiments(imported_expts, n, destination):
+    """Write the experiments of imported_expts, repeated n times."""
+    with open(imported_expts) as f:
+        data = json.load(f)
+    experiments = []
+    imagesets = []
+    scans = []
+    for _ in range(n):
+        for expt in data["experiment"]:
+            expt = copy.deepcopy(expt)
+            expt["identifier"] = str(uuid.uuid4())
+            if "imageset" in expt:
+                imagesets.append(data["imageset"][expt["imageset"]])
+                expt["imageset"] = len(imagesets) - 1
+            if "scan" in expt:
+                scans.append(data["scan"][expt["scan"]])
+                expt["scan"] = len(scans) - 1
+            experiments.append(expt)
+    data.update(experiment=experiments, imageset=imagesets, scan=scans)
+    with open(destination, "w") as f:
+        json.dump(data, f)
+
+
+def setup_copies(main_directory, imported_expts, batch_size):
+    """Copy a slice of the imported data into each batch directory, in the
+    same batches as setup_main_process."""
+    expts = load.experiment_list(imported_expts, check_format=True)
+    n_batches = math.floor(len(expts) / batch_size)
+    splits = [i * batch_size for i in range(max(1, n_batches))] + [len(expts)]
+    batch_directories = []
+    for i in range(len(splits) - 1):
+        subdir = main_directory / f"batch_{i + 1}"
+        subdir.mkdir()
+        expts[splits[i] : splits[i + 1]].as_file(subdir / "imported.expt")
+        batch_directories.append(subdir)
+    return batch_directories
+
+
+def disk_usage(batch_directories):
+    return sum(
+        f.stat().st_size
+        for directory in batch_directories
+        for f in directory.iterdir()
+        if f.is_file()
+    )
+
+
+def load_batches(batch_directories, njobs):
+    """The time for njobs processes to load the batches shared among them,
+    each in a fresh process (so with nothing cached to start with)."""
+    shares = [batch_directories[i::njobs] for i in range(njobs)]
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=njobs) as pool:
+        n_images = sum(pool.map(load_share, shares))
+    return time.perf_counter() - start, n_images
+
+
+def load_share(batch_directories):
+    return sum(len(load_batch_experiments(d)) for d in batch_directories)
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("imported_expts", help="the imported.expt of a run")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--njobs", type=int, default=1)
+    options = parser.parse_args(args)
+
+    tmp_dir = pathlib.Path(tempfile.mkdtemp())
+    try:
+        imported_expts = pathlib.Path(options.imported_expts).resolve()
+        if options.repeat > 1:
+            imported_expts = tmp_dir / "imported.expt"
+            repeat_experiments(options.imported_expts, options.repeat, imported_expts)
+        print(
+            "%s: %.1f MB" % (imported_expts.name, imported_expts.stat().st_size / 1e6)
+        )
+
+        for name, setup in (
+            ("Copies of imported.expt", setup_copies),
+            ("Imported data slices", setup_main_process),
+        ):
+            main_directory = tmp_dir / name.split()[0].lower()
+            main_directory.mkdir()
+            start = time.perf_counter()
+            result = setup(main_directory, imported_expts, options.batch_size)
+            setup_time = time.perf_counter() - start
+            # setup_main_process also returns the images per batch
+            batch_directories = result[0] if isinstance(result, tuple) else result
+            load_time, n_images = load_batches(batch_directories, options.njobs)
+            print(
+                "%-24s %5d batches %7.1fs setup %9.2f MB %7.1fs to load %d images"
+                % (
+                    name,
+                    len(batch_directories),
+                    setup_time,
+                    disk_usage(batch_directories) / 1e6,
+                    load_time,
+                    n_images,
+                )
+            )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,61 @@
+"""
+Write images into a directory over time, as a detector would during a serial
+collection, to try out xia2.ssx watch.enable=True on a local machine.
+
+    python benchmarks/ssx_stream_images.py destination --source "path/*.cbf"
+        [-n 1000] [--rate 10] [--prefix image_]
+
+The source images are copied in turn (over and over, if more are asked for
+than there are) to destination/<prefix>NNNNNN<extension>, at rate images per
+second. Each is written under a hidden name first and then renamed, so that
+it appears in full, and the time taken to write them all is reported.
+For example, with the serial data from dials_data:
+
+    python benchmarks/ssx_stream_images.py images --rate 2 \\
+        --source "$DIALS_DATA/cunir_serial/merlin0047_1700*.cbf" &
+    xia2.ssx directory=images watch.enable=True watch.timeout=60 \\
+        reference_geometry=refined.expt space_group=P213 \\
+        unit_cell=96.4,96.4,96.4,90,90,90 batch_size=5
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import itertools
+import os
+import shutil
+import time
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("destination", help="the directory to write images to")
+    parser.add_argument("--source", required=True, help="glob of images to copy")
+    parser.add_argument("-n", type=int, help="images to write (default all)")
+    parser.add_argument("--rate", type=float, default=10, help="images per second")
+    parser.add_argument("--prefix", default="image_")
+    options = parser.parse_args(args)
+
+    sources = sorted(glob.glob(options.source))
+    if not sources:
+        parser.error("no images match %s" % options.source)
+    n = options.n or len(sources)
+    os.makedirs(options.destination, exist_ok=True)
+
+    start = time.perf_counter()
+    for i, source in enumerate(itertools.islice(itertools.cycle(sources), n)):
+        # keep to the rate overall, however long each copy takes
+        delay = start + i / options.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        name = "%s%06d%s" % (options.prefix, i + 1, os.path.splitext(source)[1])
+        tmp_file = os.path.join(options.destination, "." + name)
+        shutil.copyfile(source, tmp_file)
+        os.replace(tmp_file, os.path.join(options.destination, name))
+    elapsed = time.perf_counter() - start
+    print("Wrote %d images in %.1fs, %.1f per second" % (n, elapsed, n / elapsed))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,108 @@
+"""
+Measure the cost of the symmetry lookups made by the scalers - spacegroup
+names to numbers, lattices and pointgroups, and xHM names to old CCP4
+names - working each answer out every time as before, and remembering the
+answers for the life of the process. The old-name lookup needs $CCP4.
+
+    python benchmarks/symmetry_lookup.py [-n 1000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from xia2.Handlers import Syminfo
+from xia2.lib import SymmetryLib
+
+# the sort of names a scaler goes through deciding on the symmetry
+NAMES = [
+    "P 1",
+    "P 1 2 1",
+    "P 1 21 1",
+    "C 1 2 1",
+    "P 2 2 2",
+    "P 21 21 21",
+    "C 2 2 21",
+    "I 2 2 2",
+    "P 4 2 2",
+    "P 41 21 2",
+    "P 43 21 2",
+    "I 4 2 2",
+    "P 3 2 1",
+    "H 3 2",
+    "P 6 2 2",
+    "P 2 3",
+    "I 2 3",
+    "F 4 3 2",
+]
+
+LOOKUPS = [
+    Syminfo.spacegroup_name_to_number,
+    Syminfo.get_lattice,
+    Syminfo.get_pointgroup,
+]
+
+
+def time_lookups(n, remembered):
+    start = time.perf_counter()
+    for _ in range(n):
+        for lookup in LOOKUPS:
+            function = lookup if remembered else lookup.__wrapped__
+            for name in NAMES:
+                function(name)
+        for name in NAMES:
+            number = Syminfo.spacegroup_name_to_number(name)
+            function = Syminfo.spacegroup_number_to_name
+            (function if remembered else function.__wrapped__)(number)
+            function = Syminfo.get_num_symops
+            (function if remembered else function.__wrapped__)(number)
+    return time.perf_counter() - start
+
+
+def time_old_names(n, remembered):
+    start = time.perf_counter()
+    for _ in range(n):
+        for name in NAMES:
+            if not remembered:
+                SymmetryLib._read_syminfo.cache_clear()
+            SymmetryLib.spacegroup_name_xHM_to_old(name)
+    return time.perf_counter() - start
+
+
+def run(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("-n", type=int, default=1000, help="rounds of lookups")
+    options = parser.parse_args(args)
+
+    calls = options.n * len(NAMES) * (len(LOOKUPS) + 2)
+    for remembered in (False, True):
+        elapsed = time_lookups(options.n, remembered)
+        print(
+            "Syminfo, %-10s %8.3fs, %6.2fus per lookup"
+            % (
+                "remembered" if remembered else "every time",
+                elapsed,
+                1e6 * elapsed / calls,
+            )
+        )
+
+    if "CCP4" not in os.environ:
+        print("$CCP4 is not set, skipping old spacegroup names")
+        return
+    calls = options.n * len(NAMES)
+    for remembered in (False, True):
+        elapsed = time_old_names(options.n, remembered)
+        print(
+            "xHM to old, %-10s %8.3fs, %6.2fus per lookup"
+            % (
+                "remembered" if remembered else "every time",
+                elapsed,
+                1e6 * elapsed / calls,
+            )
+        )
+
+
+if __name__ == "__main__":
+    run()
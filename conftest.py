@@ -9,7 +9,9 @@ from __future__ import annotations
 import argparse
 import os
 import re
+import shutil
 import subprocess
+import tempfile
 from pathlib import Path
 
 import pytest
@@ -34,6 +36,18 @@ def pytest_addoption(parser):
     )
 
 
+def pytest_configure(config):
+    """
+    Keep the caches written by xia2 (of image headers, the master PHIL and
+    program results) out of the home directory of whoever runs the tests,
+    including by the xia2 processes the tests start.
+    """
+    os.environ.pop("XIA2_PHIL_CACHE", None)
+    cache_home = tempfile.mkdtemp(prefix="xia2-test-cache-")
+    os.environ["XDG_CACHE_HOME"] = cache_home
+    config.add_cleanup(lambda: shutil.rmtree(cache_home, ignore_errors=True))
+
+
 @pytest.fixture(scope="session")
 def regression_test(request):
     if not request.config.getoption("--regression-full"):
@@ -0,0 +1 @@
+New option ``multiprocessing.cpu_budget``: a number of cores, or Auto for all available, shared by the programs xia2 runs at once. Programs wait for cores to become free. The default, 0, sets no limit, so nothing changes unless the option is set.
@@ -0,0 +1 @@
+Setting ``XIA2CORE_OUTPUT_RETENTION=N`` keeps only the last N lines of each program's output in memory. The full output is still written to the log files.
@@ -0,0 +1 @@
+New option ``xia2.settings.input.header_cache.enable=True``: keep the models read from image headers in a cache under ``$XDG_CACHE_HOME/xia2/headers`` for later runs. Off by default.
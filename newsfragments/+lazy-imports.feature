@@ -0,0 +1 @@
+``xia2 --help``, ``xia2 --version`` and ``xia2.setup --help`` return faster, because dials and the rest of xia2 are now imported only when needed.
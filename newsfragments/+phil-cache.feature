@@ -0,0 +1 @@
+With ``XIA2_PHIL_CACHE=1`` set in the environment, the parsed xia2 master PHIL is kept under ``$XDG_CACHE_HOME/xia2/phil``, so later xia2 processes start faster. Off by default.
@@ -0,0 +1 @@
+New option ``xia2.settings.developmental.profile=True``: sample where xia2 itself spends its time, writing flame graph input for each stage to ``xia2-profile/``. Set the sampling interval with ``profile_interval``, and list in ``profile_stages`` the stages to also run under cProfile.
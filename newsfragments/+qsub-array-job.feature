@@ -0,0 +1 @@
+New option ``multiprocessing.array_job=True``: with ``mode=parallel`` and ``type=qsub``, all the sweeps are submitted as one array job instead of one job each.
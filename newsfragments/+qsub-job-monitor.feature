@@ -0,0 +1 @@
+Jobs submitted with ``qsub`` are watched from a single thread, using one ``qstat`` call per poll for all jobs rather than one call per job every 10 seconds.
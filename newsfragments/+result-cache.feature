@@ -0,0 +1 @@
+New option ``xia2.settings.result_cache.enable=True``: reuse the results of ``dials.find_spots``, ``dials.index`` and ``dials.integrate`` from earlier runs with the same inputs. The new ``xia2.cache`` command lists, prunes and clears the cached results.
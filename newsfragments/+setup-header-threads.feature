@@ -0,0 +1 @@
+``xia2.setup`` with ``read_all_image_headers=True`` reads image headers on a pool of threads, in chunks for large sweeps. Set the pool size with ``input.header_reading.nthreads`` and the chunk size with ``chunk_size``.
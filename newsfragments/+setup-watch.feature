@@ -0,0 +1 @@
+``xia2.setup``: new option ``input.watch.enable=True`` keeps looking for images and rewrites the xinfo file as more sweeps arrive. The new opt-in ``input.scan_index=True`` saves what was found in each directory, so that a later run only lists the directories that have changed.
@@ -0,0 +1 @@
+``xia2.ssx``: new option ``multiprocessing.dynamic_batches=True``: with ``njobs>1``, size each batch when a job is free to take it, so that all the jobs finish together. Off by default.
@@ -0,0 +1 @@
+``xia2.ssx``: batch directories record their slice of the imported images in ``imported_slice.json`` instead of a copy of ``imported.expt``, which saves disk space and setup time for large runs.
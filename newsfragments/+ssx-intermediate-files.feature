@@ -0,0 +1 @@
+``xia2.ssx``: the output of each step is passed to the next step in memory. The new option ``intermediate_files=False`` skips writing ``strong.refl``, ``indexed.expt`` and ``indexed.refl``.
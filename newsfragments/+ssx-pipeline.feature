@@ -0,0 +1 @@
+``xia2.ssx``: new option ``multiprocessing.pipeline.enable=True`` runs spot finding, indexing and integration on separate pools of processes, so that different batches can be at different steps at once.
@@ -0,0 +1 @@
+``xia2.ssx``: new option ``watch.enable=True`` processes images in batches as they are written, for a directory, template or HDF5 master file, until no new images arrive within ``watch.timeout``.
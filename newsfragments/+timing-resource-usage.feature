@@ -0,0 +1 @@
+The timing report gives the CPU efficiency and peak memory of the longest-running programs, and the effective parallelism of the whole run.
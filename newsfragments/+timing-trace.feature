@@ -0,0 +1 @@
+xia2 and ``xia2.ssx`` write ``xia2-trace.json``, a timeline of the programs run, which can be opened in chrome://tracing or ui.perfetto.dev.
@@ -0,0 +1 @@
+New Driver type ``worker`` (``XIA2CORE_DRIVERTYPE=worker``): dials programs run in a pool of long-lived python processes, set by ``XIA2CORE_WORKER_POOL_SIZE`` (default 2), instead of a new process each time.
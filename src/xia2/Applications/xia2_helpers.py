@@ -18,17 +18,78 @@ def process_one_sweep(args):
     args = args[0]
     # stop_after = args.stop_after
 
-    command_line_args = args.command_line_args
-    nproc = args.nproc
-    crystal_id = args.crystal_id
-    wavelength_id = args.wavelength_id
-    sweep_id = args.sweep_id
     failover = args.failover
     driver_type = args.driver_type
 
     default_driver_type = DriverFactory.get_driver_type()
     DriverFactory.set_driver_type(driver_type)
 
+    xia2_integrate, tmpdir = _set_up_sweep(args)
+
+    output = None
+    success = False
+
+    try:
+        xia2_integrate.run()
+        output = get_sweep_output_only(xia2_integrate.get_all_output())
+        success = True
+    except Exception as e:
+        logger.warning("Processing sweep %s failed: %s", args.sweep_id, str(e))
+        if not failover:
+            raise
+    finally:
+        xsweep_dict = _finish_sweep(args, tmpdir, success)
+        DriverFactory.set_driver_type(default_driver_type)
+        return success, output, xsweep_dict
+
+
+def process_sweeps_as_array_job(jobs):
+    """Process the sweeps described by jobs (as for process_one_sweep) as
+    the tasks of a single queue array job, rather than submitting one job
+    per sweep. Sweeps are finished off as their tasks complete. Returns a
+    list of (success, output, xsweep_dict) in the same order as jobs."""
+
+    from xia2.Driver.QSubDriver import run_array_job
+
+    curdir = os.path.abspath(os.curdir)
+
+    sweeps = []
+    for (args,) in jobs:
+        xia2_integrate, tmpdir = _set_up_sweep(args, driver_type="qsub")
+        xia2_integrate.set_up()
+        xia2_integrate.start()
+        sweeps.append((args, xia2_integrate, tmpdir))
+
+    results = [None] * len(sweeps)
+
+    def sweep_finished(index, xia2_integrate):
+        args, _, tmpdir = sweeps[index]
+        output = None
+        success = False
+        try:
+            xia2_integrate.close_wait()
+            xia2_integrate.check_output()
+            output = get_sweep_output_only(xia2_integrate.get_all_output())
+            success = True
+        except Exception as e:
+            logger.warning("Processing sweep %s failed: %s", args.sweep_id, str(e))
+            if not args.failover:
+                raise
+        finally:
+            results[index] = success, output, _finish_sweep(args, tmpdir, success)
+
+    run_array_job([s[1] for s in sweeps], curdir, callback=sweep_finished)
+    return results
+
+
+def _set_up_sweep(args, driver_type=None):
+    """Create the xia2.integrate wrapper to process one sweep in a
+    temporary directory, returning the wrapper and the directory."""
+
+    command_line_args = list(args.command_line_args)
+    nproc = args.nproc
+    sweep_id = args.sweep_id
+
     curdir = os.path.abspath(os.curdir)
 
     if "-xinfo" in command_line_args:
@@ -36,7 +97,7 @@ def process_one_sweep(args):
         del command_line_args[idx + 1]
         del command_line_args[idx]
 
-    xia2_integrate = XIA2Integrate()
+    xia2_integrate = XIA2Integrate(driver_type)
 
     # import tempfile
     # tmpdir = tempfile.mkdtemp(dir=curdir)
@@ -44,7 +105,7 @@ def process_one_sweep(args):
     tmpdir = os.path.join(curdir, str(uuid.uuid4()))
     os.makedirs(tmpdir)
     xia2_integrate.set_working_directory(tmpdir)
-    xia2_integrate.add_command_line_args(args.command_line_args)
+    xia2_integrate.add_command_line_args(command_line_args)
     xia2_integrate.set_phil_file(os.path.join(curdir, "xia2-working.phil"))
     xia2_integrate.add_command_line_args(["sweep.id=%s" % sweep_id])
     xia2_integrate.set_nproc(nproc)
@@ -52,54 +113,54 @@ def process_one_sweep(args):
     xia2_integrate.set_mp_mode("serial")
     auto_logfiler(xia2_integrate)
 
+    return xia2_integrate, tmpdir
+
+
+def _finish_sweep(args, tmpdir, success):
+    """Move the results of processing one sweep from tmpdir into place,
+    returning the serialised sweep if processing was successful."""
+
+    from xia2.Schema.XProject import XProject
+
+    crystal_id = args.crystal_id
+    wavelength_id = args.wavelength_id
+    sweep_id = args.sweep_id
+
+    curdir = os.path.abspath(os.curdir)
     sweep_tmp_dir = os.path.join(tmpdir, crystal_id, wavelength_id, sweep_id)
     sweep_target_dir = os.path.join(curdir, crystal_id, wavelength_id, sweep_id)
 
-    output = None
-    success = False
     xsweep_dict = None
 
-    try:
-        xia2_integrate.run()
-        output = get_sweep_output_only(xia2_integrate.get_all_output())
-        success = True
-    except Exception as e:
-        logger.warning("Processing sweep %s failed: %s", sweep_id, str(e))
-        if not failover:
-            raise
-    finally:
-        from xia2.Schema.XProject import XProject
-
-        xia2_json = os.path.join(tmpdir, "xia2.json")
-        json_files = glob.glob(os.path.join(sweep_tmp_dir, "*", "*.json"))
-        json_files.extend(glob.glob(os.path.join(sweep_tmp_dir, "*", "*.expt")))
-        if os.path.exists(xia2_json):
-            json_files.append(xia2_json)
+    xia2_json = os.path.join(tmpdir, "xia2.json")
+    json_files = glob.glob(os.path.join(sweep_tmp_dir, "*", "*.json"))
+    json_files.extend(glob.glob(os.path.join(sweep_tmp_dir, "*", "*.expt")))
+    if os.path.exists(xia2_json):
+        json_files.append(xia2_json)
 
-        import fileinput
+    import fileinput
 
-        for line in fileinput.FileInput(files=json_files, inplace=1):
-            line = line.replace(sweep_tmp_dir, sweep_target_dir)
-            print(line)
+    for line in fileinput.FileInput(files=json_files, inplace=1):
+        line = line.replace(sweep_tmp_dir, sweep_target_dir)
+        print(line)
 
-        if os.path.exists(xia2_json):
-            new_json = os.path.join(curdir, "xia2-%s.json" % sweep_id)
+    if os.path.exists(xia2_json):
+        new_json = os.path.join(curdir, "xia2-%s.json" % sweep_id)
 
-            shutil.copyfile(xia2_json, new_json)
+        shutil.copyfile(xia2_json, new_json)
 
-        move_output_folder(sweep_tmp_dir, sweep_target_dir)
+    move_output_folder(sweep_tmp_dir, sweep_target_dir)
 
-        if success:
-            xinfo = XProject.from_json(new_json)
-            xcryst = list(xinfo.get_crystals().values())[0]
-            xsweep = xcryst.get_xwavelength(wavelength_id).get_sweeps()[0]
-            xsweep_dict = xsweep.to_dict()
+    if success:
+        xinfo = XProject.from_json(new_json)
+        xcryst = list(xinfo.get_crystals().values())[0]
+        xsweep = xcryst.get_xwavelength(wavelength_id).get_sweeps()[0]
+        xsweep_dict = xsweep.to_dict()
 
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    if os.path.exists(tmpdir):
         shutil.rmtree(tmpdir, ignore_errors=True)
-        if os.path.exists(tmpdir):
-            shutil.rmtree(tmpdir, ignore_errors=True)
-        DriverFactory.set_driver_type(default_driver_type)
-        return success, output, xsweep_dict
+    return xsweep_dict
 
 
 def get_sweep_output_only(all_output):
@@ -5,21 +5,27 @@
 
 from __future__ import annotations
 
-import collections
+import concurrent.futures
 import logging
 import os
-import sys
+import time
 import traceback
 
 import h5py
 
-from libtbx import easy_mp
+from libtbx import Auto
 
 from xia2.Applications.xia2setup_helpers import get_sweep
-from xia2.Experts.FindImages import image2template_directory
+from xia2.Applications.xia2setup_index import ScanIndex, directory_stat, image_ranges
+from xia2.Experts.FindImages import image2template, image2template_directory
 from xia2.Handlers.CommandLine import CommandLine
 from xia2.Handlers.Phil import PhilIndex
-from xia2.Schema import imageset_cache
+from xia2.Schema import (
+    image_header_chunks,
+    imageset_cache,
+    join_image_headers,
+    read_image_headers,
+)
 from xia2.Wrappers.XDS.XDSFiles import XDSFiles
 
 logger = logging.getLogger("xia2.Applications.xia2setup")
@@ -66,6 +72,8 @@ xds_file_names = [
     "GAIN",
 ]
 
+_known_image_extensions = tuple(known_image_extensions)
+
 known_sequence_extensions = ["seq"]
 
 known_hdf5_extensions = [".h5", ".nxs"]
@@ -76,46 +84,43 @@ target_template = None
 
 
 def is_sequence_name(file):
-    if os.path.isfile(file):
-        if file.split(".")[-1] in known_sequence_extensions:
-            return True
+    return os.path.isfile(file) and _is_sequence_filename(file)
+
 
-    return False
+def _is_sequence_filename(file):
+    return file.split(".")[-1] in known_sequence_extensions
 
 
 def is_image_name(filename):
-    if os.path.isfile(filename):
+    return os.path.isfile(filename) and _is_image_filename(filename)
 
-        if os.path.split(filename)[-1] in XDSFiles:
-            return False
 
-        for xds_file in "ABSORP", "DECAY", "MODPIX":
-            if os.path.join("scale", xds_file) in filename:
-                return False
+def _is_image_filename(filename):
+    """Check the name (only) of a file to see if it could be an image."""
 
-        for exten in known_image_extensions:
-            if filename.endswith(exten):
-                return True
+    if os.path.split(filename)[-1] in XDSFiles:
+        return False
 
-        end = filename.split(".")[-1]
-        try:
-            if ".log." not in filename and len(end) > 1:
-                return True
-        except Exception:
-            pass
+    for xds_file in "ABSORP", "DECAY", "MODPIX":
+        if os.path.join("scale", xds_file) in filename:
+            return False
 
-        if is_hdf5_name(filename):
-            return True
+    if filename.endswith(_known_image_extensions):
+        return True
 
-    return False
+    end = filename.split(".")[-1]
+    if ".log." not in filename and len(end) > 1:
+        return True
+
+    return _is_hdf5_filename(filename)
 
 
 def is_hdf5_name(filename):
-    if os.path.isfile(filename):
-        if os.path.splitext(filename)[-1] in known_hdf5_extensions:
-            return True
+    return os.path.isfile(filename) and _is_hdf5_filename(filename)
+
 
-    return False
+def _is_hdf5_filename(filename):
+    return os.path.splitext(filename)[-1] in known_hdf5_extensions
 
 
 def is_xds_file(f):
@@ -190,14 +195,43 @@ def parse_sequence(sequence_file):
 
 
 def visit(directory, files):
-    files.sort()
-
-    templates = set()
-
-    for f in files:
-        full_path = os.path.join(directory, f)
+    """Find the templates of the images in directory, where files is a list
+    of the names of the entries in it, or of os.DirEntry objects from
+    os.scandir() - which saves a stat() for each."""
+
+    images, sequences = _visit(directory, files)
+    for sequence in sequences:
+        parse_sequence(sequence)
+    return {
+        template
+        for template in images
+        if not target_template or template in target_template
+    }
+
+
+def _visit(directory, files):
+    """Find the images in directory, returning the templates found with the
+    ranges of image numbers for each (None for HDF5 files) and the names of
+    any sequence files."""
+
+    images = {}
+    image_names = []
+    sequences = []
+
+    for f in sorted(files, key=lambda f: getattr(f, "name", f)):
+        if isinstance(f, os.DirEntry):
+            full_path = f.path
+            try:
+                if not f.is_file():
+                    continue
+            except OSError:
+                continue
+        else:
+            full_path = os.path.join(directory, f)
+            if not os.path.isfile(full_path):
+                continue
 
-        if is_hdf5_name(full_path):
+        if _is_hdf5_filename(full_path):
             from dxtbx.format import Registry
 
             format_class = Registry.get_format_class_for_file(full_path)
@@ -208,22 +242,65 @@ def visit(directory, files):
                 continue
             elif format_class.is_abstract():
                 continue
-            templates.add(full_path)
+            images[full_path] = None
+
+        elif _is_image_filename(full_path):
+            if not is_xds_file(full_path):
+                image_names.append(os.path.basename(full_path))
+
+        elif _is_sequence_filename(full_path):
+            sequences.append(full_path)
+
+    directory = os.path.abspath(directory)
+    for template, numbers in _image_templates(image_names).items():
+        images[os.path.join(directory, template)] = image_ranges(numbers)
+
+    return images, sequences
+
+
+def _image_templates(names):
+    """Work out the templates for a list of image file names, returning the
+    image numbers found for each. Names which are the same but for the
+    values of their digits share the position of the image number, so the
+    template regular expressions are only run for one name of each such
+    shape."""
 
-        elif is_image_name(full_path):
+    templates = {}
+    number_positions = {}
+    for name in names:
+        if "#" in name:
+            shape = None
+        else:
+            shape = name.translate(_digits_to_hashes)
+        if shape is None or shape not in number_positions:
             try:
-                template = get_template(full_path)
+                template = image2template(name)
             except Exception as e:
                 logger.debug("Exception B: %s" % str(e))
                 logger.debug(traceback.format_exc())
-                continue
+                template = None
+            position = None
+            if template is not None and "#" in template:
+                position = (
+                    template.index("#"),
+                    template.index("#") + template.count("#"),
+                )
+            if shape is not None:
+                number_positions[shape] = position
             if template is not None:
-                templates.add(template)
+                numbers = templates.setdefault(template, [])
+                if position is not None and shape is not None:
+                    numbers.append(int(name[slice(*position)]))
+            continue
+        position = number_positions[shape]
+        if position is not None:
+            start, end = position
+            template = name[:start] + "#" * (end - start) + name[end:]
+            templates.setdefault(template, []).append(int(name[start:end]))
+    return templates
 
-        elif is_sequence_name(full_path):
-            parse_sequence(full_path)
 
-    return templates
+_digits_to_hashes = str.maketrans("0123456789", "#" * 10)
 
 
 def _linked_hdf5_data_files(h5_file):
@@ -574,62 +651,251 @@ def _write_sweeps(sweeps, out):
 
 
 def _get_sweeps(templates):
-    params = PhilIndex.get_python_object()
-    mp_params = params.xia2.settings.multiprocessing
-    nproc = mp_params.nproc
-
-    if params.xia2.settings.read_all_image_headers and nproc > 1:
-        method = "multiprocessing"
-
-        # If xia2 was a proper cctbx module, then we wouldn't have to do this
-        # FIXME xia2 is now a proper cctbx module ;o)
-
-        python_path = 'PYTHONPATH="%s"' % ":".join(sys.path)
-        qsub_command = "qsub -v %s -V" % python_path
-
-        args = [(template,) for template in templates]
-        results_list = easy_mp.parallel_map(
-            get_sweep,
-            args,
-            processes=nproc,
-            method=method,
-            qsub_command=qsub_command,
-            asynchronous=True,
-            preserve_order=True,
-            preserve_exception_message=True,
-        )
-
+    settings = PhilIndex.get_python_object().xia2.settings
+    nproc = settings.multiprocessing.nproc
+    reading = settings.input.header_reading
+    # reading headers is mostly waiting on the filesystem, so use more
+    # threads than there are cores
+    nthreads = reading.nthreads
+    if nthreads is Auto:
+        nthreads = min(32, 4 * nproc)
+
+    if settings.read_all_image_headers and nthreads > 1:
+        results = _read_sweeps(templates, nthreads, reading.chunk_size)
     else:
-        results_list = [get_sweep((template,)) for template in templates]
-
-    known_sweeps = {}
-    for template, sweeplist in zip(templates, results_list):
-        if sweeplist is not None:
-            known_sweeps[template] = sweeplist
-            for sweep in sweeplist:
-                imageset = sweep.get_imageset()
-                if template not in imageset_cache:
-                    imageset_cache[template] = collections.OrderedDict()
-                imageset_cache[template][
-                    imageset.get_scan().get_image_range()[0]
-                ] = imageset
-    return known_sweeps
-
-
-def _rummage(directories):
-    """Walk through the directories looking for sweeps."""
-    templates = set()
+        results = {template: get_sweep((template,)) for template in templates}
+
+    return {
+        template: sweeplist
+        for template, sweeplist in results.items()
+        if sweeplist is not None
+    }
+
+
+def _read_sweeps(templates, nthreads, chunk_size):
+    """Read the headers of the images of each template on a pool of threads,
+    big templates a chunk of images at a time so that one does not hold up
+    the rest, and make up the sweeps from them here."""
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(nthreads) as pool:
+        chunks = {}
+        whole = {}
+        for template in templates:
+            try:
+                template_chunks = image_header_chunks(template, chunk_size)
+            except Exception as e:
+                logger.debug(f"Exception C: {e} ({template})")
+                logger.debug(traceback.format_exc())
+                results[template] = None
+                continue
+            if template_chunks and len(template_chunks) > 1:
+                chunks[template] = [
+                    pool.submit(read_image_headers, chunk) for chunk in template_chunks
+                ]
+            else:
+                whole[template] = pool.submit(get_sweep, (template,))
+
+        for template, futures in chunks.items():
+            try:
+                experiments = join_image_headers([f.result() for f in futures])
+            except Exception as e:
+                logger.debug(f"Exception C: {e} ({template})")
+                logger.debug(traceback.format_exc())
+                results[template] = None
+                continue
+            results[template] = get_sweep((template,), experiments=experiments)
+
+        for template, future in whole.items():
+            results[template] = future.result()
+
+    return results
+
+
+def _scan_directory(path, index=None):
+    """List one directory, returning the images found in it, as from
+    _visit(), and the subdirectories to look in next - or what the scan
+    index recorded for it, if it has not changed since."""
+
+    if index is not None:
+        entry = index.lookup(path)
+        if entry is not None:
+            for sequence in entry["sequences"]:
+                parse_sequence(sequence)
+            return entry["images"], [
+                os.path.join(path, name) for name in entry["subdirectories"]
+            ]
+
+    stat = directory_stat(path)
+    listed = time.time()
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError as e:
+        logger.debug("Could not read directory %s: %s", path, e)
+        return {}, []
+
+    files = []
+    subdirectories = []
+    for entry in entries:
+        try:
+            is_directory = entry.is_dir()
+        except OSError:
+            continue
+        if is_directory:
+            subdirectories.append(entry.name)
+        else:
+            files.append(entry)
+    images, sequences = _visit(path, files)
+    for sequence in sequences:
+        parse_sequence(sequence)
+    if index is not None:
+        index.update(path, stat, listed, images, subdirectories, sequences)
+    return images, [os.path.join(path, name) for name in subdirectories]
+
+
+def _find_templates(directories):
+    """Walk through the directories looking for image templates."""
+    return set(_find_images(directories))
+
+
+def _find_images(directories, index=None):
+    """Walk through the directories looking for images, listing independent
+    subdirectories in parallel, and return the templates found with the
+    ranges of image numbers for each. Directories recorded in the index are
+    only listed again if they have changed since."""
+    images = {}
     visited = set()
-    for path in directories:
-        for root, dirs, files in os.walk(path, followlinks=True):
-            realpath = os.path.realpath(root)
+
+    def unvisited(paths):
+        for path in paths:
+            realpath = os.path.realpath(path)
             if realpath in visited:
                 # safety-check to avoid recursively symbolic links
                 continue
             visited.add(realpath)
-            templates.update(visit(root, files))
+            yield path
+
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        pending = {
+            pool.submit(_scan_directory, p, index) for p in unvisited(directories)
+        }
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                found, subdirectories = future.result()
+                images.update(found)
+                pending.update(
+                    pool.submit(_scan_directory, p, index)
+                    for p in unvisited(sorted(subdirectories))
+                )
+
+    if index is not None:
+        index.save()
+    return images
+
 
-    return _get_sweeps(templates)
+def _file_stat(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _write_xinfo_file(filename, sweeps):
+    """Write the xinfo file for sweeps in place of filename, so that anyone
+    reading it sees the old or the new version, returning False (and leaving
+    filename alone) if none of the sweeps are suitable."""
+
+    tmp_file = filename + ".tmp"
+    try:
+        with open(tmp_file, "w") as fout:
+            _write_sweeps(sweeps, fout)
+    except AssertionError as e:
+        logger.debug("Not writing %s: %s", filename, e)
+        os.remove(tmp_file)
+        return False
+    os.replace(tmp_file, filename)
+    return True
+
+
+def _watch(filename, find_images, watch):
+    """
+    Keep looking for images, rewriting the xinfo file whenever more sweeps
+    are complete - that is, when no more images of them have arrived for
+    watch.settle seconds - until no images have arrived at all for
+    watch.timeout seconds. Only the headers of the sweeps which are new or
+    have changed are read each time.
+
+    :param filename: the xinfo file to write
+    :param find_images: a function returning the templates found with their
+                        image ranges, as from _find_images()
+    :param watch: the xia2.settings.input.watch parameters
+    """
+
+    changes = {}  # template: (what was found, when that last changed)
+    sweeps = {}  # template: (what was found, the sweeps read)
+    written = None
+    last_change = time.time()
+
+    logger.info("Watching for images, interval %.0fs", watch.interval)
+    try:
+        while True:
+            now = time.time()
+            found = {}
+            for template, ranges in find_images().items():
+                # sweeps in one file are complete once the file stops changing
+                found[template] = _file_stat(template) if ranges is None else ranges
+            for template, state in found.items():
+                if template not in changes or changes[template][0] != state:
+                    changes[template] = (state, now)
+                    last_change = now
+            for template in set(changes) - set(found):
+                del changes[template]
+                sweeps.pop(template, None)
+
+            complete = {
+                template: state
+                for template, (state, changed) in changes.items()
+                if now - changed >= watch.settle
+            }
+            to_read = {
+                template
+                for template, state in complete.items()
+                if template not in sweeps or sweeps[template][0] != state
+            }
+            if to_read:
+                for template in to_read:
+                    # or the sweeps read before the template grew are used
+                    imageset_cache.pop(template, None)
+                read = _get_sweeps(to_read)
+                for template in to_read:
+                    sweeps[template] = (complete[template], read.get(template))
+
+            known = {
+                template: sweeps[template][1]
+                for template in complete
+                if sweeps[template][1]
+            }
+            state = {template: complete[template] for template in known}
+            if known and state != written and _write_xinfo_file(filename, known):
+                written = state
+                logger.info("Wrote %s with %d image templates", filename, len(known))
+
+            if now - last_change >= max(watch.timeout, watch.settle):
+                logger.info(
+                    "No new images for %.0fs, stopped watching", now - last_change
+                )
+                break
+            time.sleep(watch.interval)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching")
+
+    if written is None:
+        raise RuntimeError("no complete sweeps found while watching for images")
 
 
 def write_xinfo(filename, directories, template=None, hdf5_master_files=None):
@@ -651,21 +917,39 @@ def write_xinfo(filename, directories, template=None, hdf5_master_files=None):
         if "File exists" not in str(e):
             raise
 
+    index = None
+    if settings.input.scan_index:
+        index = ScanIndex(os.path.join(directory, "scan-index.json"))
+
     # if we have given a template and directory on the command line, just
     # look there (i.e. not in the subdirectories)
 
     if CommandLine.get_template() and CommandLine.get_directory():
         # xia2 image=$(dials.data get -q x4wide)/X4_wide_M1S4_2_0001.cbf
-        templates = set()
-        for directory in CommandLine.get_directory():
-            templates.update(visit(directory, os.listdir(directory)))
-        sweeps = _get_sweeps(templates)
+        def find_images():
+            images = {}
+            for directory in CommandLine.get_directory():
+                images.update(_scan_directory(directory)[0])
+            return {
+                template: ranges
+                for template, ranges in images.items()
+                if not target_template or template in target_template
+            }
+
     elif hdf5_master_files is not None:
         # xia2 image=$(dials.data get -q vmxi_thaumatin)/image_15799_master.h5
-        sweeps = _get_sweeps(hdf5_master_files)
+        def find_images():
+            return dict.fromkeys(hdf5_master_files)
+
     else:
         # xia2 $(dials.data get -q x4wide)
-        sweeps = _rummage(directories)
+        def find_images():
+            return _find_images(directories, index=index)
+
+    if settings.input.watch.enable:
+        _watch(filename, find_images, settings.input.watch)
+        return
 
+    sweeps = _get_sweeps(list(find_images()))
     with open(filename, "w") as fout:
         _write_sweeps(sweeps, fout)
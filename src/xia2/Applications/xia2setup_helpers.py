@@ -7,15 +7,14 @@ import traceback
 from xia2.Schema.Sweep import SweepFactory
 
 
-# this must be defined in a separate file from xia2setup.py to be
-# compatible with easy_mp.parallel_map with method="sge" when
-# xia2setup.py is run as the __main__ program.
-def get_sweep(args):
+# read the sweeps of one template, from the image headers in experiments if
+# these have been read already, returning None if that fails
+def get_sweep(args, experiments=None):
     assert len(args) == 1
     directory, template = os.path.split(args[0])
 
     try:
-        sweeplist = SweepFactory(template, directory)
+        sweeplist = SweepFactory(template, directory, experiments=experiments)
 
     except Exception as e:
         logger = logging.getLogger("xia2.Applications.xia2setup_helpers")
@@ -0,0 +1,133 @@
+# A persistent index of what xia2.setup found in each directory it searched
+# for images - the templates, the ranges of image numbers for each and the
+# subdirectories - so that running it again (as a beamline pipeline will,
+# while data are still being written) only lists again the directories
+# which have changed since. Entries are validated against the modification
+# time of the directory, which changes whenever a file is added to or
+# removed from it.
+
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger("xia2.Applications.xia2setup_index")
+
+# bump this whenever the format of the index changes
+INDEX_VERSION = 1
+
+# a directory modified this close to being listed may have been modified
+# again within the resolution of its timestamp, so is not trusted
+RACY_INTERVAL = 2
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns]
+
+
+def image_ranges(numbers):
+    """Compress a collection of image numbers to a sorted list of
+    [first, last] ranges of consecutive numbers."""
+
+    ranges = []
+    for number in sorted(set(numbers)):
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ranges
+
+
+class ScanIndex:
+    """The directories searched by xia2.setup, keyed on their real path,
+    each with the stat of the directory when it was listed and what was
+    found in it."""
+
+    def __init__(self, filename):
+        self._filename = filename
+        self._directories = {}
+        self._visited = {}
+        try:
+            with open(filename) as fh:
+                index = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if index.get("version") == INDEX_VERSION:
+            self._directories = index["directories"]
+
+    def get_filename(self):
+        return self._filename
+
+    def lookup(self, path):
+        """Return what was found in the directory path when it was last
+        listed, or None if it has changed since (or was never listed)."""
+
+        realpath = os.path.realpath(path)
+        entry = self._directories.get(realpath)
+        if entry is None:
+            return None
+        if _stat(realpath) != entry["stat"]:
+            logger.debug("Directory %s has changed since it was indexed", path)
+            return None
+        if entry["stat"][1] / 1e9 > entry["listed"] - RACY_INTERVAL:
+            return None
+        self._visited[realpath] = entry
+        return entry
+
+    def update(self, path, stat, listed, images, subdirectories, sequences=()):
+        """
+        Record what was found in the directory path.
+
+        :param stat: the stat of the directory from before it was listed
+        :param listed: the time at which the directory was listed
+        :param images: the templates found, each with its image ranges (or
+                       None for a file holding a whole sweep, such as HDF5)
+        :param subdirectories: the subdirectories found
+        :param sequences: the sequence files found
+        """
+
+        if stat is None:
+            return
+        self._visited[os.path.realpath(path)] = {
+            "stat": stat,
+            "listed": listed,
+            "images": images,
+            "subdirectories": sorted(subdirectories),
+            "sequences": sorted(sequences),
+        }
+
+    def save(self):
+        """Write out the entries for the directories looked up or updated
+        since the index was read or last saved, dropping any others."""
+
+        self._directories, self._visited = self._visited, {}
+        try:
+            os.makedirs(os.path.dirname(self._filename), exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(
+                dir=os.path.dirname(self._filename), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as fh:
+                json.dump(
+                    {
+                        "version": INDEX_VERSION,
+                        "saved": time.time(),
+                        "directories": self._directories,
+                    },
+                    fh,
+                )
+            os.replace(tmp_file, self._filename)
+        except OSError as e:
+            logger.debug("Could not write scan index %s: %s", self._filename, e)
+
+
+def directory_stat(path):
+    """The stat of path as recorded in the index."""
+    return _stat(os.path.realpath(path))
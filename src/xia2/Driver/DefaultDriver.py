@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+import collections
+import io
 import logging
 import os
 import signal
 import time
 
+import xia2.Driver.cpu_budget
+import xia2.Driver.profiler
 import xia2.Driver.timing
 from xia2.Driver.DriverHelper import (
     error_abrt,
@@ -47,18 +51,31 @@ class DefaultDriver:
         # usually small
         self._standard_input_records = []
 
-        # this will be bigger but that is ok...
+        # this will be bigger but that is ok... unless a retention limit
+        # is set, in which case only the tail is kept in memory and the
+        # full output is read back from the log file on demand
+        self._output_retention = None
         self._standard_output_records = []
+        self._log_output_end = 0
 
         # optional - possibly useful if using a batch submission
-        # system or wanting to describe better what the job is doing
+        # system or wanting to describe better what the job is doing,
+        # and needed for the results of the job to be cached
         self._input_files = []
+        self._output_files = []
 
         self._scratch_directories = []
 
         self._log_file = None
         self._log_file_name = None
 
+        # flush the log file at most every _log_flush_interval seconds or
+        # every _log_flush_size characters, whichever comes first
+        self._log_flush_interval = 1.0
+        self._log_flush_size = 65536
+        self._log_unflushed = 0
+        self._log_last_flush = time.time()
+
         self._task = None
 
         self._finished = False
@@ -72,12 +89,21 @@ class DefaultDriver:
         self._xpid = 0
 
         self._cpu_threads = 1
+        self._cpu_budget_token = None
+        self._cpu_budget_wait = 0.0
+        self._profiler_token = None
+
+        # resources used by the program, as DriverHelper.rusage_to_dict(),
+        # filled in by implementations which can find out
+        self._rusage = None
 
         self._runtime_log = {"object initialization": time.time()}
 
     def __del__(self):
         # the destructor - close the log file etc.
 
+        self._release_cpu_threads()
+
         if self._log_file is not None:
             self._log_file.flush()
             self._log_file.close()
@@ -93,6 +119,62 @@ class DefaultDriver:
     def set_cpu_threads(self, cpu_threads):
         self._cpu_threads = cpu_threads
 
+    def _acquire_cpu_threads(self):
+        """Take the cores this program will use from the process-wide
+        budget, waiting for them if need be - implementations call this
+        just before starting the program. Until the cores are released
+        the profiler attributes time to the program."""
+
+        if self._profiler_token is None and self._executable:
+            self._profiler_token = xia2.Driver.profiler.enter(
+                os.path.basename(self._executable)
+            )
+        if self._cpu_budget_token is not None:
+            return
+        start = time.time()
+        self._cpu_budget_token = xia2.Driver.cpu_budget.acquire(self._cpu_threads)
+        self._cpu_budget_wait = time.time() - start
+
+    def _release_cpu_threads(self):
+        """Give back the cores taken by _acquire_cpu_threads."""
+
+        token, self._cpu_budget_token = self._cpu_budget_token, None
+        xia2.Driver.cpu_budget.release(token)
+        token, self._profiler_token = self._profiler_token, None
+        xia2.Driver.profiler.leave(token)
+
+    def set_output_retention(self, lines):
+        """Keep at most this many lines of standard output in memory, or
+        all of it if lines is None. With a limit set get_all_output() reads
+        the full output back from the log file, so a log file should be
+        set with write_log_file()."""
+
+        if lines is not None:
+            # close_wait() shows the last 50 lines in the debug output
+            lines = max(lines, 50)
+        self._output_retention = lines
+        self._standard_output_records = self._new_output_records(
+            self._standard_output_records
+        )
+
+    def get_output_retention(self):
+        return self._output_retention
+
+    def _new_output_records(self, records=()):
+        if self._output_retention is None:
+            return list(records)
+        return collections.deque(records, maxlen=self._output_retention)
+
+    def set_log_flush_policy(self, interval=None, size=None):
+        """Set how often the log file is flushed while the child program is
+        running: after interval seconds or size characters of output,
+        whichever comes first. Set either to 0 to flush on every line."""
+
+        if interval is not None:
+            self._log_flush_interval = interval
+        if size is not None:
+            self._log_flush_size = size
+
     def _check_executable(self, executable):
         """Pass this on to executable_exists."""
 
@@ -132,6 +214,23 @@ class DefaultDriver:
         if directory not in self._scratch_directories:
             self._scratch_directories.append(directory)
 
+    def add_input_file(self, filename):
+        """Declare a file read by the program."""
+        if filename not in self._input_files:
+            self._input_files.append(filename)
+
+    def get_input_files(self):
+        return self._input_files
+
+    def add_output_file(self, filename):
+        """Declare a file written by the program - only programs which
+        declare all of their outputs can have their results cached."""
+        if filename not in self._output_files:
+            self._output_files.append(filename)
+
+    def get_output_files(self):
+        return self._output_files
+
     def set_task(self, task):
         """Set a helpful record about what the task is doing."""
 
@@ -188,13 +287,15 @@ class DefaultDriver:
         """Reset the output things."""
 
         self._standard_input_records = []
-        self._standard_output_records = []
+        self._standard_output_records = self._new_output_records()
+        self._log_output_end = 0
 
         self._command_line = []
 
         # optional - possibly useful if using a batch submission
         # system or wanting to describe better what the job is doing
         self._input_files = []
+        self._output_files = []
         self._scratch_directories = []
         if self._log_file is not None:
             self._log_file.flush()
@@ -247,7 +348,7 @@ class DefaultDriver:
         # only look for errors in the last 30 lines of the standard
         # output - if something went wrong, it went wrong in there...
 
-        self.check_for_error_text(self._standard_output_records[-30:])
+        self.check_for_error_text(self.get_output_tail(30))
         # next check the status
 
         self.check_return_code()
@@ -321,7 +422,12 @@ class DefaultDriver:
         # this method should be overridden by the implementation
         # of the Driver
 
-        self._input(record)
+        try:
+            self._input(record)
+        except Exception:
+            # the wrapper may never get as far as close_wait()
+            self._release_cpu_threads()
+            raise
 
     def _output(self):
         """Pass record from the child programs standard output."""
@@ -338,12 +444,17 @@ class DefaultDriver:
 
         if self._log_file is not None:
             self._log_file.write(record)
-
-            # FIXME 07/NOV/06 I have noticed that sometimes
-            # information is missed from the log files - perhaps
-            # flushing here will help??
-
-            self._log_file.flush()
+            self._log_unflushed += len(record)
+
+            # flushing on every line costs a syscall per line for chatty
+            # programs, so only flush when the policy says so or the
+            # program has finished
+            if (
+                not record
+                or self._log_unflushed >= self._log_flush_size
+                or time.time() - self._log_last_flush >= self._log_flush_interval
+            ):
+                self.flush_log_file()
 
         # presume if there is no output that the program has finished
         if not record:
@@ -353,6 +464,14 @@ class DefaultDriver:
 
         return record
 
+    def flush_log_file(self):
+        """Flush any pending output to the log file."""
+
+        if self._log_file is not None and self._log_unflushed:
+            self._log_file.flush()
+        self._log_unflushed = 0
+        self._log_last_flush = time.time()
+
     def finished(self):
         """Check if the program has finished."""
 
@@ -371,6 +490,7 @@ class DefaultDriver:
         if self._standard_output_records:
             for s in self._standard_output_records:
                 self._log_file.write(s)
+        self._log_output_end = self._log_file.tell()
 
         self._log_file_name = self._log_file.name
 
@@ -382,10 +502,40 @@ class DefaultDriver:
 
         return ""
 
+    def get_output_tail(self, lines):
+        """Return the last few lines of the output of the job, without
+        touching the log file."""
+
+        if self._output_retention is None:
+            return self._standard_output_records[-lines:]
+        records = self._standard_output_records
+        return [records[j] for j in range(max(0, len(records) - lines), len(records))]
+
     def get_all_output(self):
-        """Return all of the output of the job."""
+        """Return all of the output of the job. If the output retention is
+        limited this is read back from the log file; without one only the
+        lines retained can be returned, which is logged as a warning."""
+
+        if self._output_retention is None:
+            return self._standard_output_records
+        if not self._log_file_name:
+            logger.warning(
+                "Only the last %d lines of the output of %s were kept, "
+                "as there is no log file",
+                self._output_retention,
+                os.path.basename(self._executable or ""),
+            )
+            return list(self._standard_output_records)
 
-        return self._standard_output_records
+        if self._log_file is not None:
+            self._log_file.flush()
+            self._log_output_end = self._log_file.tell()
+        with open(self._log_file_name, "rb") as fh:
+            text = fh.read(self._log_output_end).decode("utf-8", errors="replace")
+        records = io.StringIO(text).readlines()
+        if self._finished:
+            records.append("")
+        return records
 
     def close(self):
         """Close the standard input channel."""
@@ -397,61 +547,80 @@ class DefaultDriver:
         output to stop. Note that the results can still be obtained through
         self.get_all_output()..."""
 
-        self.close()
+        try:
+            self.close()
 
-        while True:
-            line = self.output()
+            while True:
+                line = self.output()
 
-            if not line:
-                break
+                if not line:
+                    break
 
-        endtime = time.time()
-        if self._log_file:
-            # close the existing log file: also add a comment at the end containing the
-            # command-line (replacing working directory & executable path for brevity)
-            command_line = "%s " % os.path.basename(self._executable)
-            for c in self._command_line:
-                command_line += " '%s'" % c.replace(
-                    self._working_directory + os.sep, ""
-                )
-            self._log_file.write("# command line:\n")
-            self._log_file.write("# %s\n" % command_line)
-            if hasattr(self, "_runtime_log") and self._runtime_log:
-                self._log_file.write("#\n# timing information:\n")
-                for k in self._runtime_log:
-                    self._log_file.write(
-                        "#   time since {name}: {time:.1f} seconds\n".format(
-                            name=k, time=endtime - self._runtime_log[k]
-                        )
-                    )
-            self._log_file.close()
-            self._log_file = None
-            with open(self._log_file_name, encoding="latin-1") as fh:
-                lines = fh.readlines()
-            n = min(50, len(lines))
-            logger.debug("Last %i lines of %s:", n, self._log_file_name)
-            for line in lines[-n:]:
-                logger.debug(line.rstrip("\n"))
-        elif hasattr(self, "_runtime_log") and self._runtime_log:
-            if self._executable:
+            endtime = time.time()
+            if self._log_file:
+                # close the existing log file: also add a comment at the end containing the
+                # command-line (replacing working directory & executable path for brevity)
                 command_line = "%s " % os.path.basename(self._executable)
                 for c in self._command_line:
                     command_line += " '%s'" % c.replace(
                         self._working_directory + os.sep, ""
                     )
-            else:
-                command_line = "(unknown)"
-        if self._runtime_log:
-            xia2.Driver.timing.record(
-                {
+                trailer = ["# command line:\n", "# %s\n" % command_line]
+                if hasattr(self, "_runtime_log") and self._runtime_log:
+                    trailer.append("#\n# timing information:\n")
+                    for k in self._runtime_log:
+                        trailer.append(
+                            "#   time since {name}: {time:.1f} seconds\n".format(
+                                name=k, time=endtime - self._runtime_log[k]
+                            )
+                        )
+                self._log_output_end = self._log_file.tell()
+                self._log_file.writelines(trailer)
+                self._log_file.close()
+                self._log_file = None
+                # the tail of the output is still in memory, so there is no
+                # need to read the log file back in
+                lines = "".join(self.get_output_tail(50)).splitlines(keepends=True)
+                lines.extend("".join(trailer).splitlines(keepends=True))
+                n = min(50, len(lines))
+                logger.debug("Last %i lines of %s:", n, self._log_file_name)
+                for line in lines[-n:]:
+                    logger.debug(line.rstrip("\n"))
+            elif hasattr(self, "_runtime_log") and self._runtime_log:
+                if self._executable:
+                    command_line = "%s " % os.path.basename(self._executable)
+                    for c in self._command_line:
+                        command_line += " '%s'" % c.replace(
+                            self._working_directory + os.sep, ""
+                        )
+                else:
+                    command_line = "(unknown)"
+            self.cleanup()
+
+            if self._runtime_log:
+                timing = {
                     "command": command_line.strip(),
                     "time_end": endtime,
                     "time_start": min(self._runtime_log.values()),
                     "details": self._runtime_log,
+                    "working_directory": self._working_directory,
+                    "cpu_threads": self._cpu_threads,
+                    "cpu_wait": self._cpu_budget_wait,
                 }
-            )
-
-        self.cleanup()
+                if self._rusage:
+                    timing["rusage"] = self._rusage
+                    wall_time = endtime - self._runtime_log.get(
+                        "process start", timing["time_start"]
+                    )
+                    if wall_time > 0:
+                        timing["parallelism"] = (
+                            self._rusage["user_time"] + self._rusage["system_time"]
+                        ) / wall_time
+                xia2.Driver.timing.record(timing)
+        finally:
+            # give the cores back however the program ended, or later jobs
+            # could wait for them for ever
+            self._release_cpu_threads()
 
     def kill(self):
         """Kill the child process."""
@@ -2,21 +2,25 @@ from __future__ import annotations
 
 import os
 
+import xia2.Driver.result_cache
 from xia2.Driver.InteractiveDriver import InteractiveDriver
 from xia2.Driver.QSubDriver import QSubDriver
 from xia2.Driver.ScriptDriver import ScriptDriver
 from xia2.Driver.SimpleDriver import SimpleDriver
+from xia2.Driver.WorkerDriver import WorkerDriver
 
 
 class _DriverFactory:
     def __init__(self):
         self._driver_type = "simple"
+        self._output_retention = None
 
         self._implemented_types = [
             "simple",
             "script",
             "interactive",
             "qsub",
+            "worker",
         ]
 
         # should probably write a message or something explaining
@@ -25,6 +29,9 @@ class _DriverFactory:
         if "XIA2CORE_DRIVERTYPE" in os.environ:
             self.set_driver_type(os.environ["XIA2CORE_DRIVERTYPE"])
 
+        if "XIA2CORE_OUTPUT_RETENTION" in os.environ:
+            self.set_output_retention(int(os.environ["XIA2CORE_OUTPUT_RETENTION"]))
+
     def set_driver_type(self, driver_type):
         """Set the kind of driver this factory should produce."""
         if driver_type not in self._implemented_types:
@@ -35,6 +42,15 @@ class _DriverFactory:
     def get_driver_type(self):
         return self._driver_type
 
+    def set_output_retention(self, lines):
+        """Set how many lines of standard output new Driver instances keep
+        in memory: None for all of it, otherwise the rest is only kept in
+        the log file."""
+        self._output_retention = lines
+
+    def get_output_retention(self):
+        return self._output_retention
+
     def Driver(self, driver_type=None):
         """Create a new Driver instance, optionally providing the
         type of Driver we want."""
@@ -47,9 +63,17 @@ class _DriverFactory:
             "script": ScriptDriver,
             "interactive": InteractiveDriver,
             "qsub": QSubDriver,
+            "worker": WorkerDriver,
         }.get(driver_type)
         if driver_class:
-            return driver_class()
+            if xia2.Driver.result_cache.get_cache() is not None:
+                driver_class = xia2.Driver.result_cache.cached_driver_class(
+                    driver_class
+                )
+            driver = driver_class()
+            if self._output_retention is not None:
+                driver.set_output_retention(self._output_retention)
+            return driver
 
         raise RuntimeError('Driver class "%s" unknown' % driver_type)
 
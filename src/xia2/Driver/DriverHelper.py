@@ -5,6 +5,8 @@ import random
 import signal
 import stat
 import string
+import subprocess
+import sys
 
 
 def script_writer(
@@ -115,6 +117,84 @@ def script_writer(
         )
 
 
+# cache of merged environments, keyed on the working environment - each
+# entry remembers the os.environ it was built from so that changes made
+# to os.environ since are picked up
+
+_environment_cache: dict = {}
+
+
+def merge_environment(working_environment, exclusive=()):
+    """Return the environment for a child process: os.environ with the
+    values in working_environment (a dictionary of lists) prepended to, or
+    for the names in exclusive replacing, the existing values. Returns None
+    if there is nothing to add, i.e. just inherit the environment."""
+
+    if not working_environment:
+        return None
+
+    key = (
+        tuple((name, tuple(values)) for name, values in working_environment.items()),
+        frozenset(exclusive),
+    )
+    current = dict(os.environ)
+    cached = _environment_cache.get(key)
+    if cached and cached[0] == current:
+        return cached[1]
+
+    environment = dict(current)
+    for name, values in working_environment.items():
+        added = os.pathsep.join(values)
+        if name in environment and name not in exclusive:
+            environment[name] = f"{added}{os.pathsep}{environment[name]}"
+        else:
+            environment[name] = added
+
+    _environment_cache[key] = (current, environment)
+    return environment
+
+
+def rusage_to_dict(rusage):
+    """Pick the interesting fields out of a resource.struct_rusage, with
+    the peak resident set size in bytes on every platform."""
+
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    max_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return {
+        "user_time": rusage.ru_utime,
+        "system_time": rusage.ru_stime,
+        "max_rss": max_rss,
+        "block_input": rusage.ru_inblock,
+        "block_output": rusage.ru_oublock,
+        "voluntary_context_switches": rusage.ru_nvcsw,
+        "involuntary_context_switches": rusage.ru_nivcsw,
+    }
+
+
+def wait_for_process(process):
+    """Wait for a subprocess.Popen object to finish, collecting the resources
+    used by the process (and any children it waited for) where the platform
+    can tell us.
+
+    :return: a tuple of the exit status and a dictionary from rusage_to_dict,
+             or None if the resource usage is not available
+    """
+    if not hasattr(os, "wait4") or process.returncode is not None:
+        return process.wait(), None
+
+    try:
+        pid, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # someone else has reaped the process already
+        return process.wait(), None
+
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, rusage_to_dict(rusage)
+
+
 # implementatin of the kill_process method - which takes a subprocess.Popen
 # object...
 
@@ -269,16 +349,41 @@ def error_python_traceback(records):
         raise Sorry(error_messages[0])
 
 
-executable_exists_cache: dict[str, str] = {}
+# process-wide cache of executable lookups, keyed on (executable, PATH), and
+# of the output of running those executables to find out their versions -
+# both are dropped whenever PATH changes
+
+_executable_cache: dict[tuple[str, str], str] = {}
+_executable_probe_cache: dict[tuple[str, tuple[str, ...]], bytes] = {}
+_executable_cache_path = None
+
+
+def clear_executable_cache():
+    """Forget all cached executable lookups and version probes."""
+
+    global _executable_cache_path
+    _executable_cache.clear()
+    _executable_probe_cache.clear()
+    _executable_cache_path = None
 
 
 def executable_exists(executable):
     """Search the PATH for this executable, return "" if it is not
     found, full path otherwise. Caveat Emptor."""
 
-    if executable in executable_exists_cache:
-        return executable_exists_cache[executable]
+    global _executable_cache_path
+    path = os.environ.get("PATH", "")
+    if path != _executable_cache_path:
+        clear_executable_cache()
+        _executable_cache_path = path
 
+    key = (executable, path)
+    if key not in _executable_cache:
+        _executable_cache[key] = _find_executable(executable, path)
+    return _executable_cache[key]
+
+
+def _find_executable(executable, path):
     if os.name == "nt":
         if not executable.split(".")[-1] in ["exe", "bat"]:
             executable_files = ["%s.bat" % executable, "%s.exe" % executable]
@@ -303,18 +408,44 @@ def executable_exists(executable):
 
     # then search the path if it is not an absolute path
 
-    path = os.environ["PATH"].split(os.pathsep)
-
-    for directory in path:
+    for directory in path.split(os.pathsep):
         for file in executable_files:
-            if os.path.exists(os.path.join(directory, file)):
-                if not os.path.isdir(os.path.join(directory, file)):
-                    executable_exists_cache[executable] = os.path.join(directory, file)
-                    return os.path.join(directory, file)
+            candidate = os.path.join(directory, file)
+            # one stat per candidate rather than exists() then isdir()
+            try:
+                mode = os.stat(candidate).st_mode
+            except OSError:
+                continue
+            if not stat.S_ISDIR(mode):
+                return candidate
 
     return ""
 
 
+def probe_executable(executable, arguments=()):
+    """Run executable (found through executable_exists) with the given
+    arguments and no input, and return its standard output as bytes, or
+    None if the executable could not be found or run. The output is cached
+    for the resolved executable, e.g. to find out the program version."""
+
+    full_path = executable_exists(executable)
+    if not full_path:
+        return None
+
+    key = (full_path, tuple(arguments))
+    if key not in _executable_probe_cache:
+        try:
+            result = subprocess.run(
+                [full_path, *arguments],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+            )
+        except OSError:
+            return None
+        _executable_probe_cache[key] = result.stdout
+    return _executable_probe_cache[key]
+
+
 def generate_random_name():
     """Generate a random name to use as a handle for a job."""
 
@@ -21,6 +21,7 @@ class InteractiveDriver(DefaultDriver):
         for c in self._command_line:
             command_line.append(c)
 
+        self._acquire_cpu_threads()
         self._popen = subprocess.Popen(
             command_line,
             bufsize=1,
@@ -79,6 +80,7 @@ class InteractiveDriver(DefaultDriver):
 
     def kill(self):
         kill_process(self._popen)
+        self._release_cpu_threads()
 
 
 if __name__ == "__main__":
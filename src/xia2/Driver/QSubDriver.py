@@ -1,18 +1,23 @@
 from __future__ import annotations
 
+import functools
+import logging
 import os
+import queue
 import shlex
 import subprocess
-import time
+import threading
 
 from xia2.Driver.DefaultDriver import DefaultDriver
-from xia2.Driver.DriverHelper import script_writer
-from xia2.Handlers.Phil import PhilIndex
+from xia2.Driver.DriverHelper import generate_random_name, script_writer
 
-# Now depend on Phil scope from xia2...
+logger = logging.getLogger("xia2.Driver.QSubDriver")
 
 
 def get_qsub_command():
+    # Now depend on Phil scope from xia2...
+    from xia2.Handlers.Phil import PhilIndex
+
     params = PhilIndex.get_python_object()
     mp_params = params.xia2.settings.multiprocessing
     if mp_params.qsub_command:
@@ -20,6 +25,201 @@ def get_qsub_command():
     return None
 
 
+class JobMonitor:
+    """Watch all outstanding queue jobs from a single background thread.
+
+    A job is finished once the .xstatus file written at the end of its
+    script appears, or once it is no longer listed by qstat. qstat is run
+    once per poll for all jobs, and the poll interval backs off from
+    min_interval to max_interval while nothing changes."""
+
+    def __init__(self, min_interval=0.5, max_interval=10.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._condition = threading.Condition()
+        self._jobs = {}
+        self._thread = None
+        self._new_jobs = False
+
+    def wait(self, job_id, xstatus_file=None):
+        """Block until the given job has finished."""
+
+        finished = threading.Event()
+        self.watch(job_id, xstatus_file, finished.set)
+        finished.wait()
+
+    def watch(self, job_id, xstatus_file, callback):
+        """Call callback() from the monitor thread once the job has
+        finished. Several tasks of one array job may be watched, each
+        with their own .xstatus file."""
+
+        with self._condition:
+            self._jobs[object()] = (job_id, xstatus_file, callback)
+            self._new_jobs = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._monitor, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _monitor(self):
+        interval = self.min_interval
+        while True:
+            with self._condition:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                jobs = dict(self._jobs)
+                self._new_jobs = False
+
+            done = {
+                key
+                for key, (_, xstatus_file, _) in jobs.items()
+                if xstatus_file and os.path.exists(xstatus_file)
+            }
+            if len(done) < len(jobs):
+                queued = self._queued_jobs()
+                if queued is not None:
+                    done.update(
+                        key for key, job in jobs.items() if job[0] not in queued
+                    )
+
+            with self._condition:
+                for key in done:
+                    self._jobs.pop(key)[2]()
+                if done or self._new_jobs:
+                    interval = self.min_interval
+                else:
+                    interval = min(2 * interval, self.max_interval)
+                if self._jobs and not self._new_jobs:
+                    self._condition.wait(interval)
+
+    def _queued_jobs(self):
+        """Return the ids of all jobs known to the queue, or None if the
+        queue could not be asked."""
+
+        try:
+            result = subprocess.run(
+                ["qstat"],
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                universal_newlines=True,
+            )
+        except OSError as e:
+            logger.debug("Could not run qstat: %s", e)
+            return None
+        if result.returncode:
+            logger.debug("qstat failed: %s", result.stderr.strip())
+            return None
+
+        queued = set()
+        for record in result.stdout.split("\n"):
+            tokens = record.split()
+            if tokens:
+                # job ids may be qualified with the server name
+                queued.add(tokens[0].split(".")[0])
+        return queued
+
+
+job_monitor = JobMonitor()
+
+
+def submit_job(script, working_directory, cpu_threads=1, extra_args=None):
+    """Submit script to the queue from working_directory and return the
+    job id."""
+
+    qsub_command = get_qsub_command()
+    if not qsub_command:
+        qsub_command = "qsub"
+
+    command = shlex.split(qsub_command) + ["-V", "-cwd"]
+    if cpu_threads > 1:
+        command += ["-pe", "smp", "%d" % cpu_threads]
+    if extra_args:
+        command += extra_args
+    pipe = subprocess.Popen(
+        command + [script],
+        cwd=working_directory,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+    # this will get all of the output as a tuple (stdout, stderr)
+    stdout, stderr = pipe.communicate()
+
+    # check the standard error
+    if stderr:
+        # something probably went wrong
+        if "error opening" in stderr:
+            raise RuntimeError(
+                'executable "%s" does not exist'
+                % stdout.split("\n")[0].split(":")[0].replace("error opening ", "")
+            )
+
+    # probably everything is ok then
+
+    # the job id etc go to the standard output - for array jobs this looks
+    # like "Your job-array 1234.1-10:1 (...) has been submitted"
+
+    for record in stdout.split("\n"):
+        if "Your job" in record:
+            return record.split()[2].split(".")[0]
+
+    raise RuntimeError("could not submit %s: %s" % (script, (stderr or stdout).strip()))
+
+
+def run_array_job(drivers, working_directory, callback=None, name=None):
+    """Run a number of QSubDriver instances, which have been started and
+    given their input, as the tasks of a single array job submitted from
+    working_directory. As each task finishes callback(index, driver) is
+    called, at which point close_wait() can be used on the driver as
+    usual."""
+
+    if not drivers:
+        return
+
+    name = name or "A%s" % generate_random_name()
+    jobs = os.path.join(working_directory, "jobs")
+    os.makedirs(jobs, exist_ok=True)
+
+    # the shared manifest has the working directory and script for each
+    # task, one line per task
+    xstatus_files = []
+    with open(os.path.join(jobs, "%s.manifest" % name), "w") as manifest:
+        for driver in drivers:
+            script_name = driver.write_script()
+            directory = driver.get_working_directory()
+            manifest.write("%s\t%s.sh\n" % (directory, script_name))
+            xstatus_files.append(driver._xstatus_file(script_name))
+
+    with open(os.path.join(jobs, "%s.sh" % name), "w") as script:
+        script.write("#!/bin/bash\n\n")
+        script.write(
+            "IFS=$'\\t' read -r directory task_script "
+            '< <(sed -n "${SGE_TASK_ID}p" jobs/%s.manifest)\n' % name
+        )
+        script.write('cd "$directory" && bash "$task_script"\n')
+
+    job_id = submit_job(
+        "jobs/%s.sh" % name,
+        working_directory,
+        max(driver._cpu_threads for driver in drivers),
+        ["-t", "1-%d" % len(drivers)],
+    )
+
+    finished = queue.Queue()
+    for index, xstatus_file in enumerate(xstatus_files):
+        job_monitor.watch(job_id, xstatus_file, functools.partial(finished.put, index))
+
+    for _ in drivers:
+        index = finished.get()
+        drivers[index].collect_output(
+            working_directory, "%s.sh" % name, "%s.%d" % (job_id, index + 1)
+        )
+        if callback:
+            callback(index, drivers[index])
+
+
 class QSubDriver(DefaultDriver):
     def __init__(self):
         if os.name != "posix":
@@ -77,6 +277,35 @@ class QSubDriver(DefaultDriver):
         where the script itself gets written and run, and the output
         file channel opened when the process has finished..."""
 
+        if self._output_file is not None:
+            # already run as part of an array job
+            return
+
+        script_name = self.write_script()
+
+        # this will return almost instantly, once the job is in
+        # the queue
+
+        job_id = submit_job(
+            "%s.sh" % script_name, self._working_directory, self._cpu_threads
+        )
+
+        # now wait for the job to finish - either the .xstatus file appears
+        # or the job drops out of qstat
+
+        job_monitor.wait(job_id, self._xstatus_file(script_name))
+
+        self.collect_output(
+            self._working_directory, "%s.sh" % self._script_name, job_id
+        )
+
+    def _xstatus_file(self, script_name):
+        return os.path.join(self._working_directory, "%s.xstatus" % script_name)
+
+    def write_script(self):
+        """Write the script to run this job, returning its name relative
+        to the working directory (without the .sh extension)."""
+
         script_name = os.path.join("jobs", self._script_name)
 
         try:
@@ -94,6 +323,11 @@ class QSubDriver(DefaultDriver):
                 "LD_LIBRARY_PATH"
             ].split(os.pathsep)
 
+        # a stale .xstatus file would look like the job has already finished
+        xstatus_file = self._xstatus_file(script_name)
+        if os.path.exists(xstatus_file):
+            os.remove(xstatus_file)
+
         script_writer(
             self._working_directory,
             script_name,
@@ -103,75 +337,11 @@ class QSubDriver(DefaultDriver):
             self._script_standard_input,
         )
 
-        # this will return almost instantly, once the job is in
-        # the queue
-
-        qsub_command = get_qsub_command()
-        if not qsub_command:
-            qsub_command = "qsub"
-
-        qsub_command = shlex.split(qsub_command)
-        if self._cpu_threads > 1:
-            pipe = subprocess.Popen(
-                qsub_command
-                + [
-                    "-V",
-                    "-cwd",
-                    "-pe",
-                    "smp",
-                    "%d" % self._cpu_threads,
-                    "%s.sh" % script_name,
-                ],
-                cwd=self._working_directory,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-        else:
-            pipe = subprocess.Popen(
-                qsub_command + ["-V", "-cwd", "%s.sh" % script_name],
-                cwd=self._working_directory,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-
-        # this will get all of the output as a tuple (stdout, stderr)
-        stdout, stderr = pipe.communicate()
-
-        # check the standard error
-        if stderr:
-            # something probably went wrong
-            if "error opening" in stderr:
-                raise RuntimeError(
-                    'executable "%s" does not exist'
-                    % stdout.split("\n")[0].split(":")[0].replace("error opening ", "")
-                )
-
-        # probably everything is ok then
-
-        # the job id etc go to the standard output
+        return script_name
 
-        for record in stdout.split("\n"):
-            if "Your job" in record:
-                job_id = record.split()[2]
-
-        # now have a while loop watching this job id via qstat -j
-
-        while True:
-            pipe = subprocess.Popen(
-                ["qstat", "-j", "%s" % job_id],
-                cwd=self._working_directory,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-
-            stdout, stderr = pipe.communicate()
-
-            if "Following jobs do not exist" in stderr:
-                # then the job has finished
-                break
-
-            # sleep for 10 seconds
-            time.sleep(10)
+    def collect_output(self, sge_directory, sge_name, job_id):
+        """Check up on a finished job, which Grid Engine ran as sge_name
+        from sge_directory, and set up for reading its standard output."""
 
         # the following files may have some interesting contents - despite
         # the fact that all of the output was supposed to be piped to
@@ -181,21 +351,10 @@ class QSubDriver(DefaultDriver):
         # the output is simply piped > not 2>&1 - which means that the
         # standard error output will appear below...
 
-        sge_stdout = os.path.join(
-            self._working_directory, f"{self._script_name}.sh.o{job_id}"
-        )
-
-        sge_stderr = os.path.join(
-            self._working_directory, f"{self._script_name}.sh.e{job_id}"
-        )
-
-        sge_pstdout = os.path.join(
-            self._working_directory, f"{self._script_name}.sh.po{job_id}"
-        )
-
-        sge_pstderr = os.path.join(
-            self._working_directory, f"{self._script_name}.sh.pe{job_id}"
-        )
+        sge_stdout = os.path.join(sge_directory, f"{sge_name}.o{job_id}")
+        sge_stderr = os.path.join(sge_directory, f"{sge_name}.e{job_id}")
+        sge_pstdout = os.path.join(sge_directory, f"{sge_name}.po{job_id}")
+        sge_pstderr = os.path.join(sge_directory, f"{sge_name}.pe{job_id}")
 
         # check the standard error file for any indications that
         # something went wrong running this job...
@@ -210,7 +369,7 @@ class QSubDriver(DefaultDriver):
 
         # set this up for reading the "standard output" of the job.
         self._output_file = open(
-            os.path.join(self._working_directory, "%s.xout" % script_name)
+            os.path.join(self._working_directory, "jobs", "%s.xout" % self._script_name)
         )
 
         # at this stage I should delete the sge specific files defined
@@ -4,7 +4,7 @@ import os
 import subprocess
 
 from xia2.Driver.DefaultDriver import DefaultDriver
-from xia2.Driver.DriverHelper import script_writer
+from xia2.Driver.DriverHelper import script_writer, wait_for_process
 
 
 class ScriptDriver(DefaultDriver):
@@ -74,17 +74,23 @@ class ScriptDriver(DefaultDriver):
             self._script_standard_input,
         )
 
-        if os.name == "posix":
-            pipe = subprocess.Popen(
-                ["bash", "%s.sh" % self._script_name], cwd=self._working_directory
-            )
-
-        else:
-            pipe = subprocess.Popen(
-                ["%s.bat" % self._script_name], cwd=self._working_directory, shell=True
-            )
-
-        self._script_status = pipe.wait()
+        self._acquire_cpu_threads()
+        try:
+            if os.name == "posix":
+                pipe = subprocess.Popen(
+                    ["bash", "%s.sh" % self._script_name], cwd=self._working_directory
+                )
+
+            else:
+                pipe = subprocess.Popen(
+                    ["%s.bat" % self._script_name],
+                    cwd=self._working_directory,
+                    shell=True,
+                )
+
+            self._script_status, self._rusage = wait_for_process(pipe)
+        finally:
+            self._release_cpu_threads()
 
         # at this stage I should read the .xstatus file to determine if the
         # process has indeed finished - though it should have done...
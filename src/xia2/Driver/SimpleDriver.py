@@ -1,54 +1,144 @@
 from __future__ import annotations
 
-import copy
+import codecs
+import errno
+import io
+import locale
 import os
+import queue
 import subprocess
+import threading
 import time
 
 from xia2.Driver.DefaultDriver import DefaultDriver
-from xia2.Driver.DriverHelper import kill_process
+from xia2.Driver.DriverHelper import (
+    kill_process,
+    merge_environment,
+    wait_for_process,
+)
+
+
+class OutputPump:
+    """Drain the standard output of a child process on a background thread.
+
+    The pipe is read in large chunks so that a chatty program never blocks
+    on a full pipe and the parent does not pay a syscall per line. Chunks
+    are only split into lines as they are consumed through readline()."""
+
+    def __init__(self, stream, chunk_size=65536, encoding=None):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._encoding = encoding or locale.getpreferredencoding(False)
+        self._blocks = queue.SimpleQueue()
+        self._current = io.StringIO()
+        self._eof = False
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self._encoding)(errors="replace"),
+            translate=True,
+        )
+        fd = self._stream.fileno()
+        pending = ""
+        try:
+            while True:
+                chunk = os.read(fd, self._chunk_size)
+                if not chunk:
+                    break
+                pending += decoder.decode(chunk)
+                # only hand over complete lines, keep the remainder back
+                end = pending.rfind("\n") + 1
+                if end:
+                    self._blocks.put(pending[:end])
+                    pending = pending[end:]
+        except OSError:
+            pass
+        finally:
+            pending += decoder.decode(b"", final=True)
+            if pending:
+                self._blocks.put(pending)
+            self._blocks.put(None)
+
+    def ready(self):
+        """Return True if readline() can return without blocking."""
+
+        if self._eof:
+            return True
+        position = self._current.tell()
+        if self._current.read(1):
+            self._current.seek(position)
+            return True
+        return not self._blocks.empty()
+
+    def readline(self):
+        """Return the next line of output, or "" once the child has
+        closed its standard output."""
+
+        while not self._eof:
+            line = self._current.readline()
+            if line:
+                return line
+            block = self._blocks.get()
+            if block is None:
+                self._eof = True
+            else:
+                self._current = io.StringIO(block)
+        return ""
+
+    def close(self):
+        self._thread.join()
+        self._stream.close()
 
 
 class SimpleDriver(DefaultDriver):
+    # run the program through /bin/sh rather than directly - costs an extra
+    # fork/exec per program, only needed for executables without a #! line
+    _use_shell = False
+
     def __init__(self):
         super().__init__()
 
         self._popen = None
         self._popen_status = None
+        self._pump = None
 
     def start(self):
         if self._executable is None:
             raise RuntimeError("no executable is set.")
 
-        if os.name == "nt":
-            # pass in CL as a list of tokens
-            command_line = []
-            command_line.append(self._executable)
-            for c in self._command_line:
-                command_line.append(c)
-        else:
-            # now pass in the command line as a string and allow the
-            # shell to parse it - note well though that the tokens
-            # on the command line are quoted..
-
-            command_line = self._executable
-            for c in self._command_line:
-                command_line += " '%s'" % c
-
-        environment = copy.deepcopy(os.environ)
-
-        for name in self._working_environment:
-            added = self._working_environment[name][0]
-            for value in self._working_environment[name][1:]:
-                added += f"{os.pathsep}{value}"
-
-            if name in environment and name not in self._working_environment_exclusive:
-                environment[name] = f"{added}{os.pathsep}{environment[name]}"
-            else:
-                environment[name] = added
+        command_line = [self._executable] + list(self._command_line)
+        # on Windows the shell is needed to run .bat files
+        shell = os.name == "nt" or self._use_shell
+
+        environment = merge_environment(
+            self._working_environment, self._working_environment_exclusive
+        )
 
+        self._acquire_cpu_threads()
         self._runtime_log["process start"] = time.time()
-        self._popen = subprocess.Popen(
+        try:
+            try:
+                self._popen = self._popen_command(command_line, environment, shell)
+            except OSError as e:
+                if shell or e.errno != errno.ENOEXEC:
+                    raise
+                # not a binary or a script with a #! line: let the shell run it
+                self._popen = self._popen_command(command_line, environment, True)
+        except Exception:
+            self._release_cpu_threads()
+            raise
+        self._popen_status = None
+        self._pump = OutputPump(self._popen.stdout)
+
+    def _popen_command(self, command_line, environment, shell):
+        if shell and os.name != "nt":
+            # pass in the command line as a string and allow the shell to
+            # parse it - note well though that the tokens are quoted..
+            command_line = " ".join("'%s'" % c for c in command_line)
+
+        return subprocess.Popen(
             command_line,
             bufsize=1,
             stdin=subprocess.PIPE,
@@ -57,9 +147,8 @@ class SimpleDriver(DefaultDriver):
             cwd=self._working_directory,
             universal_newlines=True,
             env=environment,
-            shell=True,
+            shell=shell,
         )
-        self._popen_status = None
 
     def _input(self, record):
         if not self.check():
@@ -76,9 +165,11 @@ class SimpleDriver(DefaultDriver):
             raise  # unexpected error
 
     def _output(self):
-        # need to put some kind of timeout facility on this...
+        # about to wait for the child - make sure the log is up to date
+        if not self._pump.ready():
+            self.flush_log_file()
 
-        return self._popen.stdout.readline()
+        return self._pump.readline()
 
     def _status(self):
         # get the return status of the process
@@ -98,8 +189,14 @@ class SimpleDriver(DefaultDriver):
         self._popen.stdin.close()
 
     def cleanup(self):
-        self._popen_status = self._popen.poll()
+        if self._pump:
+            self._pump.close()
+            self._pump = None
+        # the standard output is closed, so the child is on its way out -
+        # wait for it rather than polling, which could lose the exit code
+        self._popen_status, self._rusage = wait_for_process(self._popen)
         self._popen = None
 
     def kill(self):
         kill_process(self._popen)
+        self._release_cpu_threads()
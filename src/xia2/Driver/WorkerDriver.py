@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import atexit
+import importlib
+import importlib.metadata
+import importlib.util
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from xia2.Driver.DriverHelper import merge_environment, rusage_to_dict
+from xia2.Driver.SimpleDriver import SimpleDriver
+
+logger = logging.getLogger("xia2.Driver.WorkerDriver")
+
+# modules imported by every worker before it takes on any jobs - this is
+# where the time goes when starting a new dials program
+_warm_up_modules = (
+    "dials.array_family.flex",
+    "dials.util.options",
+    "dials.util.log",
+    "dxtbx.model.experiment_list",
+)
+
+# entry points registered explicitly, as "module:function" by program name
+_registered_entry_points: dict[str, str] = {}
+_entry_point_cache: dict[str, str | None] = {}
+
+
+def register_entry_point(name, entry_point):
+    """Run the program name in a worker by calling entry_point, given as
+    "module:function", rather than in a new process."""
+
+    _registered_entry_points[name] = entry_point
+    _entry_point_cache.pop(name, None)
+
+
+def find_entry_point(executable):
+    """Return the "module:function" which the program executable runs, if
+    it can be run in a worker, otherwise None."""
+
+    name = os.path.basename(executable)
+    if name in _registered_entry_points:
+        return _registered_entry_points[name]
+    if name not in _entry_point_cache:
+        _entry_point_cache[name] = _find_dials_entry_point(name)
+    return _entry_point_cache[name]
+
+
+def _find_dials_entry_point(name):
+    if not name.startswith("dials."):
+        return None
+
+    entry_points = importlib.metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        console_scripts = entry_points.select(group="console_scripts")
+    else:
+        console_scripts = entry_points.get("console_scripts", [])
+    for entry_point in console_scripts:
+        if entry_point.name == name:
+            return entry_point.value
+
+    # libtbx dispatchers: dials.foo runs dials.command_line.foo.run()
+    module = "dials.command_line.%s" % name[len("dials.") :]
+    try:
+        if importlib.util.find_spec(module) is not None:
+            return "%s:run" % module
+    except ImportError:
+        pass
+    return None
+
+
+class _Worker:
+    """A long-lived python interpreter which runs programs in-process. Jobs
+    are sent, and results returned, as JSON over a pair of pipes."""
+
+    def __init__(self):
+        requests_read, self._requests = os.pipe()
+        self._responses, responses_write = os.pipe()
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "xia2.Driver.WorkerDriver",
+                str(requests_read),
+                str(responses_write),
+            ],
+            stdin=subprocess.DEVNULL,
+            pass_fds=(requests_read, responses_write),
+        )
+        os.close(requests_read)
+        os.close(responses_write)
+        self._requests = os.fdopen(self._requests, "w")
+        self._responses = os.fdopen(self._responses, "r")
+        self.jobs = 0
+
+    def run(self, job):
+        self.jobs += 1
+        self._requests.write(json.dumps(job) + "\n")
+        self._requests.flush()
+        response = self._responses.readline()
+        if not response:
+            raise RuntimeError("worker process %d died" % self._process.pid)
+        return json.loads(response)
+
+    def alive(self):
+        return self._process.poll() is None
+
+    def close(self):
+        try:
+            self._requests.close()
+            self._process.wait(timeout=10)
+        except Exception:
+            self._process.kill()
+        self._responses.close()
+
+
+class WorkerPool:
+    """A pool of warm worker interpreters. Workers are started on demand up
+    to size, and replaced after max_jobs jobs to limit the build-up of state
+    from the programs run in them."""
+
+    def __init__(self, size=2, max_jobs=50):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._condition = threading.Condition()
+        self._idle = []
+        self._busy = 0
+
+    def run(self, job):
+        """Run a job on a worker, blocking until it is done. Returns a
+        dictionary with the exit status of the program and, where known,
+        the resources it used."""
+
+        with self._condition:
+            while not self._idle and self._busy >= self.size:
+                self._condition.wait()
+            worker = self._idle.pop() if self._idle else None
+            self._busy += 1
+
+        try:
+            if worker is None or not worker.alive():
+                worker = _Worker()
+            result = worker.run(job)
+        except Exception:
+            if worker is not None:
+                worker.close()
+            worker = None
+            raise
+        finally:
+            if worker is not None and worker.jobs >= self.max_jobs:
+                worker.close()
+                worker = None
+            with self._condition:
+                self._busy -= 1
+                if worker is not None:
+                    self._idle.append(worker)
+                self._condition.notify()
+        return result
+
+    def shutdown(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+worker_pool = WorkerPool(size=int(os.environ.get("XIA2CORE_WORKER_POOL_SIZE", 2)))
+atexit.register(worker_pool.shutdown)
+
+
+class WorkerDriver(SimpleDriver):
+    """Run dials programs in a pool of warm python interpreters, which have
+    already paid the cost of importing dials, rather than starting a new
+    process for each. Anything which is not a python entry point is run
+    as a normal subprocess."""
+
+    def __init__(self):
+        super().__init__()
+
+        self._entry_point = None
+        self._worker_input = []
+        self._worker_status = None
+        self._output_file = None
+        self._output_file_name = None
+
+    def start(self):
+        if self._executable is None:
+            raise RuntimeError("no executable is set.")
+
+        self._entry_point = find_entry_point(self._executable)
+        if self._entry_point is None:
+            return super().start()
+
+        self._acquire_cpu_threads()
+        self._runtime_log["process start"] = time.time()
+        self._worker_input = []
+        self._worker_status = None
+
+    def check(self):
+        if self._entry_point:
+            return True
+        return super().check()
+
+    def _input(self, record):
+        if not self._entry_point:
+            return super()._input(record)
+        self._worker_input.append(record)
+
+    def _output(self):
+        if not self._entry_point:
+            return super()._output()
+        return self._output_file.readline()
+
+    def _status(self):
+        if not self._entry_point:
+            return super()._status()
+        return self._worker_status
+
+    def close(self):
+        """Hand the job to a worker and wait for it - the output can be read
+        once it has finished."""
+
+        if not self._entry_point:
+            return super().close()
+
+        fd, self._output_file_name = tempfile.mkstemp(prefix="xia2-worker-")
+        os.close(fd)
+        result = worker_pool.run(
+            {
+                "entry_point": self._entry_point,
+                "argv": [os.path.basename(self._executable)] + self._command_line,
+                "cwd": self._working_directory,
+                "environment": merge_environment(
+                    self._working_environment, self._working_environment_exclusive
+                ),
+                "stdin": "".join(self._worker_input),
+                "output": self._output_file_name,
+            }
+        )
+        self._worker_status = result["status"]
+        self._rusage = result.get("rusage")
+        self._output_file = open(
+            self._output_file_name, encoding="utf-8", errors="replace"
+        )
+
+    def cleanup(self):
+        if not self._entry_point:
+            return super().cleanup()
+        self._output_file.close()
+        self._output_file = None
+        os.remove(self._output_file_name)
+
+    def kill(self):
+        """A job run in a worker cannot be killed part way through: it is only
+        handed to the worker by close(), which waits for it to finish. Until
+        then there is nothing to kill, so the job is dropped and its cores
+        given back."""
+
+        if not self._entry_point:
+            return super().kill()
+        self._worker_input = []
+        self._release_cpu_threads()
+
+
+def _run_job(job):
+    """Run one job in this (worker) process, making it look to the program
+    as though it had a process of its own: the working directory, argv,
+    environment, standard input, logging and the standard output/error
+    file descriptors are all set up for the job and restored afterwards.
+    Returns the exit status and the resources used by the job, if known."""
+
+    module, function = job["entry_point"].split(":")
+
+    cwd = os.getcwd()
+    argv = sys.argv
+    stdin = sys.stdin
+    environment = dict(os.environ)
+    loggers = _logger_state()
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+    usage_before = _resource_usage()
+    output_fd = os.open(job["output"], os.O_WRONLY | os.O_TRUNC)
+    os.dup2(output_fd, 1)
+    os.dup2(output_fd, 2)
+    os.close(output_fd)
+
+    try:
+        os.chdir(job["cwd"])
+        if job["environment"] is not None:
+            os.environ.clear()
+            os.environ.update(job["environment"])
+        sys.argv = job["argv"]
+        sys.stdin = io.StringIO(job["stdin"])
+        status = getattr(importlib.import_module(module), function)()
+        if not isinstance(status, int):
+            status = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _restore_logger_state(loggers)
+        sys.stdin = stdin
+        sys.argv = argv
+        # the program may have changed os.environ whether or not the job did
+        os.environ.clear()
+        os.environ.update(environment)
+        os.chdir(cwd)
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+
+    rusage = None
+    if usage_before:
+        # the peak memory use is of the worker as a whole, not just this job
+        rusage = _resource_usage()
+        for key in rusage:
+            if key != "max_rss":
+                rusage[key] -= usage_before[key]
+    return status, rusage
+
+
+def _all_loggers():
+    return [logging.getLogger()] + [
+        logger
+        for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+
+
+def _logger_state():
+    """The handlers, level and propagation of the root logger and of every
+    logger created so far (the programs add handlers to "dials", "xia2" and
+    others, not only to the root logger)."""
+
+    return {
+        logger.name: (list(logger.handlers), logger.level, logger.propagate)
+        for logger in _all_loggers()
+    }
+
+
+def _restore_logger_state(state):
+    """Put the loggers back as they were in state, closing the handlers added
+    since - and removing those of the loggers created since."""
+
+    for logger in _all_loggers():
+        handlers, level, propagate = state.get(logger.name, ([], logging.NOTSET, True))
+        for handler in logger.handlers:
+            if handler not in handlers:
+                handler.close()
+        logger.handlers = handlers
+        logger.setLevel(level)
+        logger.propagate = propagate
+
+
+def _resource_usage():
+    """The resources used so far by this process and its finished children,
+    or None on platforms without the resource module."""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    own = rusage_to_dict(resource.getrusage(resource.RUSAGE_SELF))
+    children = rusage_to_dict(resource.getrusage(resource.RUSAGE_CHILDREN))
+    for key in own:
+        if key == "max_rss":
+            own[key] = max(own[key], children[key])
+        else:
+            own[key] += children[key]
+    return own
+
+
+def _worker_main(requests_fd, responses_fd):
+    for module in _warm_up_modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+    with os.fdopen(requests_fd) as requests, os.fdopen(responses_fd, "w") as responses:
+        for request in requests:
+            status, rusage = _run_job(json.loads(request))
+            responses.write(json.dumps({"status": status, "rusage": rusage}) + "\n")
+            responses.flush()
+
+
+if __name__ == "__main__":
+    _worker_main(int(sys.argv[1]), int(sys.argv[2]))
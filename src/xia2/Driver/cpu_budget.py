@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import collections
+import threading
+
+# A process-wide budget of CPU cores shared between all of the programs run
+# through Driver instances: each program takes the number of threads it was
+# given with set_cpu_threads() from the budget when it starts, and gives
+# them back once it has finished. Programs which do not fit wait, first come
+# first served, so running jobs concurrently never oversubscribes the
+# machine. With no budget set (the default) nothing ever waits.
+
+_condition = threading.Condition()
+_cores = None
+_in_use = 0
+_queue = collections.deque()
+_holders = collections.Counter()
+
+
+def set_cores(cores):
+    """Set the number of cores in the budget, or None for no limit."""
+    global _cores
+    with _condition:
+        _cores = cores
+        _condition.notify_all()
+
+
+def get_cores():
+    return _cores
+
+
+def in_use():
+    """The number of cores currently taken from the budget."""
+    return _in_use
+
+
+def acquire(threads):
+    """
+    Take threads cores from the budget, waiting until they are available.
+    Requests for more than the whole budget are granted the whole budget.
+    A thread which already holds cores is never made to wait, as it may be
+    driving one program while starting another.
+
+    :param threads: the number of cores wanted
+    :return: a token to pass to release(), or None if there is no budget
+    """
+    global _in_use
+    with _condition:
+        if _cores is None:
+            return None
+        threads = max(1, min(threads, _cores))
+        thread = threading.get_ident()
+        if not _holders[thread]:
+            ticket = object()
+            _queue.append(ticket)
+            while _queue[0] is not ticket or _in_use + threads > (_cores or 0):
+                if _cores is None:
+                    break
+                _condition.wait()
+            _queue.remove(ticket)
+        _in_use += threads
+        _holders[thread] += 1
+        _condition.notify_all()
+        return threads, thread
+
+
+def release(token):
+    """Give back the cores taken by acquire()."""
+    global _in_use
+    if token is None:
+        return
+    threads, thread = token
+    with _condition:
+        _in_use -= threads
+        _holders[thread] -= 1
+        if not _holders[thread]:
+            del _holders[thread]
+        _condition.notify_all()
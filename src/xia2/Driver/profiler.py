@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+
+logger = logging.getLogger("xia2.Driver.profiler")
+
+# A sampling profiler for the time xia2 spends in python: while it is
+# running the stack of every thread is sampled at a fixed interval, and each
+# sample is attributed to the stage the thread was in at the time - the
+# innermost timing.record_step() section or Driver program, or "xia2
+# thinking time" outside of any of them. The samples are written out in the
+# folded stack format understood by flamegraph.pl, speedscope and friends.
+
+THINKING_TIME = "xia2 thinking time"
+
+# the stages each thread is currently in, innermost last
+_stages = collections.defaultdict(list)
+
+_sampler = None
+_cprofile_stages = frozenset()
+_cprofiles = {}
+_cprofile_active = set()
+
+
+def enter(name):
+    """Mark the calling thread as having entered the stage name.
+
+    :return: a token to pass to leave()
+    """
+    thread = threading.get_ident()
+    _stages[thread].append(name)
+    return thread, name
+
+
+def leave(token):
+    """Mark the stage entered with enter() as finished."""
+    if token is None:
+        return
+    thread, name = token
+    stages = _stages.get(thread)
+    if stages and name in stages:
+        # remove the innermost instance of the stage
+        del stages[len(stages) - 1 - stages[::-1].index(name)]
+        if not stages:
+            _stages.pop(thread, None)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Attribute everything in this context to the stage name, also running
+    cProfile over it if the stage was named when the profiler was started."""
+
+    token = enter(name)
+    profile = None
+    thread = threading.get_ident()
+    if name in _cprofile_stages and thread not in _cprofile_active:
+        profile = _cprofiles.setdefault(name, cProfile.Profile())
+        _cprofile_active.add(thread)
+        profile.enable()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            _cprofile_active.discard(thread)
+        leave(token)
+
+
+def current_stage(thread):
+    """The stages the given thread is in, outermost first."""
+    return tuple(_stages.get(thread, ()))
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name="xia2-profiler", daemon=True)
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread, frame in sys._current_frames().items():
+                if thread == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.reverse()
+                stages = current_stage(thread) or (THINKING_TIME,)
+                self.samples[stages, tuple(stack)] += 1
+            self.sample_count += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return "{}:{}".format(frame.f_globals.get("__name__", "?"), name)
+
+
+def start(interval=0.01, cprofile_stages=()):
+    """
+    Start sampling the python stacks of this process.
+
+    :param interval: the time between samples, in seconds
+    :param cprofile_stages: names of stages to also run cProfile over
+    """
+    global _sampler, _cprofile_stages
+    if _sampler is not None:
+        return
+    _cprofile_stages = frozenset(cprofile_stages or ())
+    _sampler = _Sampler(interval)
+    _sampler.start()
+    logger.debug("Started sampling profiler with interval %.3fs", interval)
+
+
+def running():
+    return _sampler is not None
+
+
+def stop(directory="xia2-profile"):
+    """
+    Stop the profiler, if it is running, and write out what it found: one
+    folded stack file per stage, all.folded with the stage names as the
+    outermost frames, and a .prof file for each stage run under cProfile.
+
+    :param directory: where to write the profile
+    """
+    global _sampler, _cprofile_stages
+    if _sampler is None:
+        return
+    sampler, _sampler = _sampler, None
+    sampler.stop()
+    _cprofile_stages = frozenset()
+
+    os.makedirs(directory, exist_ok=True)
+    by_stage = collections.defaultdict(collections.Counter)
+    for (stages, stack), count in sampler.samples.items():
+        by_stage[stages[-1]][stack] += count
+
+    with open(os.path.join(directory, "all.folded"), "w") as fh:
+        for (stages, stack), count in sorted(sampler.samples.items()):
+            fh.write("%s %d\n" % (_fold(stages + stack), count))
+    for name, samples in by_stage.items():
+        with open(os.path.join(directory, _file_name(name, ".folded")), "w") as fh:
+            for stack, count in sorted(samples.items()):
+                fh.write("%s %d\n" % (_fold(stack), count))
+
+    for name, profile in _cprofiles.items():
+        profile.dump_stats(os.path.join(directory, _file_name(name, ".prof")))
+    _cprofiles.clear()
+
+    total = sum(sampler.samples.values()) or 1
+    logger.debug(
+        "Profile of %d samples written to %s; samples by stage:",
+        sampler.sample_count,
+        directory,
+    )
+    stage_totals = sorted(
+        ((sum(samples.values()), name) for name, samples in by_stage.items()),
+        reverse=True,
+    )
+    for count, name in stage_totals[:20]:
+        logger.debug(
+            "%6.1fs %5.1f%% %s", count * sampler.interval, 100 * count / total, name
+        )
+
+
+def _fold(frames):
+    # semicolons separate frames, and a space the count, in the folded format
+    return ";".join(frame.replace(";", ",").replace(" ", "_") for frame in frames)
+
+
+def _file_name(name, extension):
+    return re.sub(r"[^\w.+-]+", "_", name).strip("_")[:100] + extension
@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from xia2.Driver.DriverHelper import executable_exists
+
+logger = logging.getLogger("xia2.Driver.result_cache")
+
+# An opt-in cache of the results of running programs through Driver
+# instances. A program is only cached if it declares all of its output files
+# with add_output_file(); the cache key is made from the identity of the
+# executable, the command line, the standard input, the environment and the
+# content of the declared input files, with the paths of those files (and of
+# the working directory) replaced by placeholders so that the same job run
+# from another directory, or writing to differently-numbered files, is still
+# recognised. On a hit the output files are copied into place and the
+# standard output of the original run is played back, without starting the
+# program at all. Results whose output files mention the paths of the
+# original run are not kept, as they would be wrong once restored elsewhere.
+
+# bump this whenever the format of the entries changes
+CACHE_VERSION = 1
+
+_cache = None
+
+# content digests of input files, keyed on (path, size, mtime)
+_digests = {}
+
+
+def default_directory():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "xia2", "results")
+
+
+def set_cache(cache):
+    """Set the ResultCache used by Driver instances created from now on, or
+    None to stop caching results."""
+    global _cache
+    _cache = cache
+
+
+def get_cache():
+    return _cache
+
+
+def file_digest(filename):
+    st = os.stat(filename)
+    key = (os.path.realpath(filename), st.st_size, st.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(filename, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(block)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def _program_version(name):
+    """The version of the software package providing program name, where it
+    can be found cheaply - libtbx dispatchers do not change between dials
+    releases, so the executable alone does not identify the version."""
+    try:
+        if name.startswith("dials."):
+            import dials.util.version
+
+            return dials.util.version.dials_version()
+        if name.startswith("xia2."):
+            import xia2.XIA2Version
+
+            return xia2.XIA2Version.Version
+    except ImportError:
+        pass
+    return None
+
+
+def _mentions(filename, paths):
+    """Whether the file filename contains any of paths."""
+    needles = [path.encode() for path in paths]
+    overlap = max(len(needle) for needle in needles) - 1
+    tail = b""
+    with open(filename, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            data = tail + block
+            if any(needle in data for needle in needles):
+                return True
+            tail = data[-overlap:] if overlap else b""
+    return False
+
+
+class ResultCache:
+    """A directory of cached program results, one subdirectory per entry,
+    with the least recently used entries removed once the cache grows beyond
+    max_size bytes."""
+
+    def __init__(self, directory=None, max_size=20 * 1024**3):
+        self._directory = directory or default_directory()
+        self._max_size = max_size
+
+    def get_directory(self):
+        return self._directory
+
+    def describe(self, driver):
+        """Everything about the job driver will run which affects its results,
+        as a dictionary, and the digest of that used to find the entry."""
+
+        working_directory = driver.get_working_directory()
+
+        def absolute(filename):
+            return os.path.normpath(os.path.join(working_directory, filename))
+
+        inputs = [absolute(f) for f in driver.get_input_files()]
+        outputs = [absolute(f) for f in driver.get_output_files()]
+        replacements = []
+        for placeholder, files in (("input", inputs), ("output", outputs)):
+            for n, filename in enumerate(files):
+                tag = "{%s%d}" % (placeholder, n)
+                replacements.append((filename, tag))
+                replacements.append((os.path.relpath(filename, working_directory), tag))
+        replacements.append((working_directory + os.sep, ""))
+        replacements.sort(key=lambda r: len(r[0]), reverse=True)
+
+        def normalise(text):
+            for original, placeholder in replacements:
+                text = text.replace(original, placeholder)
+            return text
+
+        executable = driver.get_executable()
+        resolved = executable_exists(executable) or executable
+        try:
+            st = os.stat(resolved)
+            executable_stat = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            executable_stat = None
+
+        description = {
+            "version": CACHE_VERSION,
+            "executable": {
+                "name": os.path.basename(executable),
+                "path": resolved,
+                "stat": executable_stat,
+                "version": _program_version(os.path.basename(executable)),
+            },
+            "command_line": [normalise(c) for c in driver.get_command_line()],
+            "input": [normalise(r) for r in driver._standard_input_records],
+            "environment": {
+                name: [normalise(v) for v in values]
+                for name, values in sorted(driver._working_environment.items())
+            },
+            "environment_exclusive": sorted(driver._working_environment_exclusive),
+            "input_files": [file_digest(f) for f in inputs],
+            "output_files": len(outputs),
+        }
+        digest = hashlib.sha256(
+            json.dumps(description, sort_keys=True).encode()
+        ).hexdigest()
+        return description, digest
+
+    def _entry_directory(self, digest):
+        return os.path.join(self._directory, digest[:2], digest)
+
+    def lookup(self, digest):
+        """Return the entry for digest, or None if there is no complete one."""
+
+        entry_directory = self._entry_directory(digest)
+        entry_file = os.path.join(entry_directory, "entry.json")
+        try:
+            with open(entry_file) as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        for n in range(len(entry["outputs"])):
+            if not os.path.isfile(os.path.join(entry_directory, "files", str(n))):
+                return None
+
+        # mark the entry as recently used
+        try:
+            os.utime(entry_file)
+        except OSError:
+            pass
+        entry["directory"] = entry_directory
+        return entry
+
+    def restore(self, entry, output_files, working_directory):
+        """Copy the output files of a cached entry into place, and return the
+        standard output of the original run with its paths replaced by the
+        ones for this run."""
+
+        output_files = [
+            os.path.normpath(os.path.join(working_directory, f)) for f in output_files
+        ]
+        for n, filename in enumerate(output_files):
+            shutil.copyfile(os.path.join(entry["directory"], "files", str(n)), filename)
+
+        replacements = []
+        for original, filename in zip(entry["outputs"], output_files):
+            if original != filename:
+                replacements.append((original, filename))
+                replacements.append(
+                    (os.path.basename(original), os.path.basename(filename))
+                )
+        if entry["working_directory"] != working_directory:
+            replacements.append((entry["working_directory"], working_directory))
+        replacements.sort(key=lambda r: len(r[0]), reverse=True)
+
+        with open(
+            os.path.join(entry["directory"], "output.txt"), encoding="utf-8"
+        ) as fh:
+            output = fh.read()
+        for original, replacement in replacements:
+            output = output.replace(original, replacement)
+        return io.StringIO(output).readlines()
+
+    def store(self, digest, description, driver, status, output):
+        """Add the results of a finished job to the cache."""
+
+        working_directory = driver.get_working_directory()
+        outputs = [
+            os.path.normpath(os.path.join(working_directory, f))
+            for f in driver.get_output_files()
+        ]
+        if not all(os.path.isfile(f) for f in outputs):
+            return
+        paths = [working_directory] + [
+            os.path.normpath(os.path.join(working_directory, f))
+            for f in driver.get_input_files()
+        ]
+        try:
+            if any(_mentions(f, paths) for f in outputs):
+                logger.debug(
+                    "Not caching %s, its output files contain paths",
+                    driver.get_executable(),
+                )
+                return
+        except OSError:
+            return
+
+        entry_directory = self._entry_directory(digest)
+        try:
+            os.makedirs(os.path.dirname(entry_directory), exist_ok=True)
+            tmp_directory = tempfile.mkdtemp(
+                dir=os.path.dirname(entry_directory), suffix=".tmp"
+            )
+            os.mkdir(os.path.join(tmp_directory, "files"))
+            size = 0
+            for n, filename in enumerate(outputs):
+                shutil.copyfile(filename, os.path.join(tmp_directory, "files", str(n)))
+                size += os.path.getsize(filename)
+            with open(
+                os.path.join(tmp_directory, "output.txt"), "w", encoding="utf-8"
+            ) as fh:
+                fh.writelines(output)
+                size += fh.tell()
+            with open(os.path.join(tmp_directory, "entry.json"), "w") as fh:
+                json.dump(
+                    {
+                        "key": description,
+                        "command": " ".join(
+                            [os.path.basename(driver.get_executable())]
+                            + description["command_line"]
+                        ),
+                        "status": status,
+                        "outputs": outputs,
+                        "working_directory": working_directory,
+                        "size": size,
+                        "created": time.time(),
+                    },
+                    fh,
+                )
+            try:
+                os.rename(tmp_directory, entry_directory)
+            except OSError:
+                # someone else stored the same result in the meantime
+                shutil.rmtree(tmp_directory, ignore_errors=True)
+        except OSError as e:
+            logger.debug("Could not write to result cache: %s", e)
+            return
+        self.prune()
+
+    def entries(self):
+        """All complete entries in the cache, least recently used first, each
+        with its directory and last_used time added."""
+
+        entries = []
+        try:
+            with os.scandir(self._directory) as subdirectories:
+                for subdirectory in subdirectories:
+                    if not subdirectory.is_dir():
+                        continue
+                    with os.scandir(subdirectory.path) as it:
+                        for entry_directory in it:
+                            entry_file = os.path.join(
+                                entry_directory.path, "entry.json"
+                            )
+                            try:
+                                with open(entry_file) as fh:
+                                    entry = json.load(fh)
+                                entry["last_used"] = os.stat(entry_file).st_mtime
+                            except (OSError, ValueError):
+                                continue
+                            entry["directory"] = entry_directory.path
+                            entries.append(entry)
+        except OSError:
+            pass
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def remove(self, entry):
+        shutil.rmtree(entry["directory"], ignore_errors=True)
+
+    def prune(self, max_size=None):
+        """Remove the least recently used entries until the cache fits in
+        max_size bytes (by default the size the cache was created with).
+
+        :return: the entries removed
+        """
+
+        if max_size is None:
+            max_size = self._max_size
+        entries = self.entries()
+        total = sum(entry["size"] for entry in entries)
+        removed = []
+        while total > max_size and entries:
+            entry = entries.pop(0)
+            self.remove(entry)
+            total -= entry["size"]
+            removed.append(entry)
+        return removed
+
+
+class ResultCacheMixin:
+    """Put in front of a Driver class to look up the results of the program
+    in the cache before running it. The start of the program is put off until
+    close(), when the whole of its standard input is known."""
+
+    def __init__(self):
+        super().__init__()
+        self._cache_state = None
+        self._cache_key = None
+        self._cached_output = None
+        self._cached_status = None
+
+    def start(self):
+        self._cache_state = None
+        if get_cache() is None or not self.get_output_files():
+            return super().start()
+        if self._executable is None:
+            raise RuntimeError("no executable is set.")
+        self._cache_state = "deferred"
+        self._runtime_log["process start"] = time.time()
+
+    def _input(self, record):
+        if self._cache_state != "deferred":
+            return super()._input(record)
+
+    def close(self):
+        if self._cache_state != "deferred":
+            return super().close()
+
+        cache = get_cache()
+        entry = None
+        try:
+            self._cache_key = cache.describe(self)
+            entry = cache.lookup(self._cache_key[1])
+            if entry is not None:
+                self._cached_output = iter(
+                    cache.restore(
+                        entry, self.get_output_files(), self.get_working_directory()
+                    )
+                )
+        except OSError as e:
+            logger.debug("Result cache lookup failed: %s", e)
+            entry = None
+
+        if entry is not None:
+            logger.debug(
+                "Using cached results for %s from %s",
+                self._executable,
+                entry["directory"],
+            )
+            self._cache_state = "hit"
+            self._cached_status = entry["status"]
+            return
+
+        # not in the cache, so run the program after all
+        self._cache_state = "miss"
+        super().start()
+        for record in self._standard_input_records:
+            super()._input(record)
+        return super().close()
+
+    def check(self):
+        if self._cache_state in ("deferred", "hit"):
+            return True
+        return super().check()
+
+    def _output(self):
+        if self._cache_state != "hit":
+            return super()._output()
+        return next(self._cached_output, "")
+
+    def _status(self):
+        if self._cache_state != "hit":
+            return super()._status()
+        return self._cached_status
+
+    def close_wait(self):
+        super().close_wait()
+        if self._cache_state == "miss" and self._cache_key and self.status() == 0:
+            description, digest = self._cache_key
+            output = [record for record in self.get_all_output() if record]
+            get_cache().store(digest, description, self, self.status(), output)
+
+    def cleanup(self):
+        if self._cache_state != "hit":
+            return super().cleanup()
+
+    def kill(self):
+        if self._cache_state not in ("deferred", "hit"):
+            return super().kill()
+
+
+_cached_driver_classes = {}
+
+
+def cached_driver_class(driver_class):
+    """The Driver class driver_class with ResultCacheMixin in front of it."""
+    if driver_class not in _cached_driver_classes:
+        _cached_driver_classes[driver_class] = type(
+            driver_class.__name__, (ResultCacheMixin, driver_class), {}
+        )
+    return _cached_driver_classes[driver_class]
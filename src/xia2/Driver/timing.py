@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import contextlib
+import json
+import os
 import time
 
+import xia2.Driver.profiler
+
 _timing_db = []
 
 
@@ -14,6 +18,11 @@ def record(timing_information):
        {"command": "command line string",
         "time_start": unix epoch timestamp,
         "time_end": unix epoch timestamp}
+       optionally with "cpu_threads", the number of cores the program was
+       given, "cpu_wait", the seconds spent waiting for those cores,
+       "rusage", the resources used by the program in the format of
+       xia2.Driver.DriverHelper.rusage_to_dict(), and "parallelism", the
+       CPU time used per second of wall time
     """
     _timing_db.append(timing_information)
 
@@ -31,9 +40,14 @@ def record_step(name):
     :param name: section name for timing purposes, will usually be
                  shortened to the first word.
     """
-    timing = {"command": name, "time_start": time.time()}
+    timing = {
+        "command": name,
+        "time_start": time.time(),
+        "working_directory": os.getcwd(),
+    }
     try:
-        yield
+        with xia2.Driver.profiler.stage(name):
+            yield
     finally:
         timing["time_end"] = time.time()
         record(timing)
@@ -48,6 +62,17 @@ def report():
     return visualise_db(_timing_db)
 
 
+def write_trace(filename="xia2-trace.json"):
+    """
+    Write all recorded program executions to a file in the trace event
+    format, which can be opened in chrome://tracing or ui.perfetto.dev
+
+    :param filename: the name of the file to write
+    """
+    with open(filename, "w") as fh:
+        json.dump(trace_db(_timing_db), fh, indent=1)
+
+
 def reset():
     """
     Remove all records from the global database
@@ -190,10 +215,186 @@ def visualise_db(timing_db):
     timing_by_time = sorted(
         timing_db + thinking_breaks, key=lambda x: x["runtime"], reverse=True
     )
+    # show how well each program used the cores it was given, and its peak
+    # memory use, where the resource usage was recorded
+    with_usage = any(t.get("rusage") for t in timing_by_time[0:10])
     for t in timing_by_time[0:10]:
         output.append(
-            "{t[runtime]:{time_width}.1f}s: {t[index_readable]:>{index_width_add}} {t[command]}".format(
-                t=t, index_width_add=index_width + 1, time_width=time_width
+            "{t[runtime]:{time_width}.1f}s: {t[index_readable]:>{index_width_add}} {usage}{t[command]}".format(
+                t=t,
+                index_width_add=index_width + 1,
+                time_width=time_width,
+                usage=_resource_columns(t) if with_usage else "",
             )
         )
+
+    # time spent waiting for cores from the CPU budget before starting
+    cpu_waits = [t["cpu_wait"] for t in timing_db if t.get("cpu_wait", 0) >= 0.1]
+    if cpu_waits:
+        output.append("")
+        output.append(
+            "Waited for CPU cores before starting %d programs: %.1fs in total, %.1fs at most"
+            % (len(cpu_waits), sum(cpu_waits), max(cpu_waits))
+        )
+
+    cpu_time = sum(
+        t["rusage"]["user_time"] + t["rusage"]["system_time"]
+        for t in timing_db
+        if t.get("rusage")
+    )
+    if cpu_time and total_runtime > 0:
+        output.append("")
+        output.append(
+            "Programs used %.1fs of CPU time in %.1fs: effective parallelism %.1fx"
+            % (cpu_time, total_runtime, cpu_time / total_runtime)
+        )
     return output
+
+
+def _resource_columns(t):
+    """Format the CPU efficiency and peak memory use of a timing record as
+    fixed-width columns, left blank if they were not recorded."""
+
+    if not t.get("rusage") or "parallelism" not in t:
+        return " " * 21
+    efficiency = t["parallelism"] / max(1, t.get("cpu_threads") or 1)
+    return "{parallelism:5.1f}x {efficiency:4.0%} {memory:>7}  ".format(
+        parallelism=t["parallelism"],
+        efficiency=efficiency,
+        memory=readable_size(t["rusage"]["max_rss"]),
+    )
+
+
+def readable_size(size):
+    """A size in bytes as a short human readable string, e.g. 1.5MB."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024
+    return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+
+
+def trace_db(timing_db):
+    """
+    Convert a list of timestamps to the trace event format, with one track
+    for each program or step running at the same time, and a separate track
+    for the significant periods of xia2 thinking time in between.
+
+    :param timing_db: A list of dictionaries, in the format described in
+                      record()
+    :return: A dictionary which can be written out as JSON
+    """
+    events = [
+        {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "xia2"}},
+    ]
+    if not timing_db:
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    relative_start_time = min(t["time_start"] for t in timing_db)
+
+    def microseconds(timestamp):
+        return round((timestamp - relative_start_time) * 1e6)
+
+    # put each record on the first track which is free by the time it starts
+    tracks = []
+    for t in sorted(timing_db, key=lambda t: (t["time_start"], -t["time_end"])):
+        for track, track_end in enumerate(tracks):
+            if track_end <= t["time_start"]:
+                break
+        else:
+            track = len(tracks)
+            tracks.append(None)
+        tracks[track] = t["time_end"]
+
+        args = {
+            key: t[key]
+            for key in (
+                "command",
+                "working_directory",
+                "cpu_threads",
+                "cpu_wait",
+                "parallelism",
+                "rusage",
+            )
+            if t.get(key) is not None
+        }
+        if t.get("details"):
+            args["details"] = {
+                name: timestamp - relative_start_time
+                for name, timestamp in t["details"].items()
+            }
+        events.append(
+            {
+                "name": t["command"].split(" ")[0],
+                "cat": "program" if "details" in t else "step",
+                "ph": "X",
+                "pid": 1,
+                "tid": track + 1,
+                "ts": microseconds(t["time_start"]),
+                "dur": microseconds(t["time_end"]) - microseconds(t["time_start"]),
+                "args": args,
+            }
+        )
+
+    for track in range(len(tracks)):
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": track + 1,
+                "args": {"name": "slot %d" % (track + 1)},
+            }
+        )
+
+    thinking_time = _thinking_time(timing_db)
+    if thinking_time:
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": 0,
+                "args": {"name": "xia2 thinking time"},
+            }
+        )
+    for start, end in thinking_time:
+        events.append(
+            {
+                "name": "xia2 thinking time",
+                "cat": "thinking",
+                "ph": "X",
+                "pid": 1,
+                "tid": 0,
+                "ts": microseconds(start),
+                "dur": microseconds(end) - microseconds(start),
+                "args": {},
+            }
+        )
+
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {"time_start": relative_start_time},
+    }
+
+
+def _thinking_time(timing_db):
+    """Find the periods when nothing was recorded as running which are
+    significant by the same measure as in visualise_db()."""
+
+    intervals = sorted((t["time_start"], t["time_end"]) for t in timing_db)
+    total_runtime = max(end for _, end in intervals) - intervals[0][0]
+    top_10_runtime = sorted((end - start for start, end in intervals), reverse=True)[
+        0:10
+    ][-1]
+    significant_thinking_break = min(total_runtime * 0.005, top_10_runtime)
+
+    gaps = []
+    running_until = intervals[0][1]
+    for start, end in intervals[1:]:
+        thinking_time = start - running_until
+        if thinking_time > 0 and thinking_time >= significant_thinking_break:
+            gaps.append((running_until, start))
+        running_until = max(running_until, end)
+    return gaps
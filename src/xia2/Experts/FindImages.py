@@ -8,11 +8,16 @@
 
 from __future__ import annotations
 
+import bisect
+import collections
+import itertools
 import logging
 import math
 import os
 import re
 import string
+import threading
+import time
 
 logger = logging.getLogger("xia2.Experts.FindImages")
 
@@ -102,34 +107,80 @@ def image2template_directory(filename):
     return template, directory
 
 
+# the sorted listings of recently searched directories, with the stat of
+# each directory when it was listed
+_listings = collections.OrderedDict()
+_listings_lock = threading.Lock()
+_MAX_LISTINGS = 32
+_RACY_INTERVAL = 2
+
+
+def _directory_listing(directory):
+    """The sorted names of the entries in directory, only listing it again if
+    it has changed since it was last listed."""
+
+    directory = os.path.abspath(directory)
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return sorted(os.listdir(directory))
+    stat = (st.st_ino, st.st_mtime_ns)
+
+    with _listings_lock:
+        listing = _listings.get(directory)
+        if listing is not None and listing[0] == stat:
+            _listings.move_to_end(directory)
+            return listing[1]
+
+    listed = time.time()
+    names = sorted(os.listdir(directory))
+    # a directory modified just before it was listed may be modified again
+    # without its modification time changing, so is not remembered
+    if st.st_mtime_ns / 1e9 < listed - _RACY_INTERVAL:
+        with _listings_lock:
+            _listings[directory] = (stat, names)
+            _listings.move_to_end(directory)
+            while len(_listings) > _MAX_LISTINGS:
+                _listings.popitem(last=False)
+    return names
+
+
 def find_matching_images(template, directory):
     """Find images which match the input template in the directory
     provided."""
 
-    files = os.listdir(directory)
+    files = _directory_listing(directory)
 
-    # to turn the template to a regular expression want to replace
-    # however many #'s with EXACTLY the same number of [0-9] tokens,
-    # e.g. ### -> ([0-9]{3})
+    length = template.count("#")
+    start = template.find("#" * length)
 
-    # change 30/may/2008 - now escape the template in this search to cope with
-    # file templates with special characters in them, such as "+" -
-    # fix to a problem reported by Joel B.
+    if start < 0:
+        # the #'s are not all together, so this is not a template
+        return []
 
-    length = template.count("#")
-    regexp_text = re.escape(template).replace("\\#" * length, "([0-9]{%d})" % length)
-    regexp = re.compile(regexp_text)
+    # names are matched as by the regular expression for the template with
+    # however many #'s replaced by EXACTLY the same number of [0-9] tokens,
+    # e.g. ### -> ([0-9]{3}), matched at the start of the name - but as the
+    # listing is sorted only the names starting with the text before the
+    # #'s need to be looked at
 
-    # FIXME there are faster ways of determining this - by generating the lists
-    # of possible images. That said, the code for this is now in dxtbx...
+    prefix = template[:start]
+    suffix = template[start + length :]
+    end = start + length
 
     images = []
 
-    for f in files:
-        match = regexp.match(f)
-
-        if match:
-            images.append(int(match.group(1)))
+    for f in itertools.islice(files, bisect.bisect_left(files, prefix), None):
+        if not f.startswith(prefix):
+            break
+        digits = f[start:end]
+        if (
+            len(digits) == length
+            and digits.isascii()
+            and digits.isdigit()
+            and f.startswith(suffix, end)
+        ):
+            images.append(int(digits))
 
     images.sort()
 
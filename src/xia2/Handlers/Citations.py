@@ -1,10 +1,9 @@
 from __future__ import annotations
 
+import functools
 import itertools
 import pathlib
 
-import yaml
-
 
 class _Citations:
     """A class to track citations."""
@@ -12,11 +11,16 @@ class _Citations:
     def __init__(self):
         self._cited = []
 
+    @functools.cached_property
+    def _citations(self):
+        # read when first needed, rather than whenever xia2 is imported
+        import yaml
+
         citations_yaml = (
             pathlib.Path(__file__).parent.parent / "Data" / "citations.yaml"
         )
-        self._citations = yaml.safe_load(citations_yaml.read_text())
-        for citation_list in self._citations.values():
+        citations = yaml.safe_load(citations_yaml.read_text())
+        for citation_list in citations.values():
             for citation_data in citation_list:
                 if "acta" not in citation_data:
                     # construct Acta style reference if necessary
@@ -31,6 +35,7 @@ class _Citations:
                         citation_data["url"] = bibtex_data["url"]
                     elif "doi" in bibtex_data:
                         citation_data["url"] = "https://doi.org/" + bibtex_data["doi"]
+        return citations
 
     def cite(self, program):
         """Cite a given program."""
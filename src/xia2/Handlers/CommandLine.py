@@ -20,6 +20,9 @@ from dials.util import Sorry
 from dials.util.mp import available_cores
 from dxtbx.serialize import load
 
+import xia2.Driver.cpu_budget
+import xia2.Driver.profiler
+import xia2.Driver.result_cache
 from xia2.Experts.FindImages import image2template_directory
 from xia2.Handlers.Flags import Flags
 from xia2.Handlers.Phil import PhilIndex
@@ -261,6 +264,27 @@ class _CommandLine:
         if mp_params.nproc > 1 and os.name == "nt":
             raise Sorry("nproc > 1 is not supported on Windows.")  # #191
 
+        if mp_params.cpu_budget is Auto:
+            xia2.Driver.cpu_budget.set_cores(available_cores())
+        elif mp_params.cpu_budget:
+            xia2.Driver.cpu_budget.set_cores(mp_params.cpu_budget)
+
+        result_cache = params.xia2.settings.result_cache
+        if result_cache.enable:
+            xia2.Driver.result_cache.set_cache(
+                xia2.Driver.result_cache.ResultCache(
+                    directory=result_cache.directory,
+                    max_size=result_cache.max_size * 1024 * 1024,
+                )
+            )
+
+        developmental = params.xia2.settings.developmental
+        if developmental.profile:
+            xia2.Driver.profiler.start(
+                interval=developmental.profile_interval,
+                cprofile_stages=developmental.profile_stages,
+            )
+
         if params.xia2.settings.indexer is not None:
             add_preference("indexer", params.xia2.settings.indexer)
         if params.xia2.settings.refiner is not None:
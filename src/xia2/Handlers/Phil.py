@@ -12,11 +12,20 @@
 
 from __future__ import annotations
 
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import tempfile
+from importlib import metadata
+
 from iotbx.phil import parse
 from libtbx.phil import interface
 
-master_phil = parse(
-    """
+logger = logging.getLogger("xia2.Handlers.Phil")
+
+master_phil_str = """
 general
   .short_caption = "General settings"
 {
@@ -755,9 +764,66 @@ xia2.settings
       .help = "Minimum oscillation range of a sweep for inclusion in processing."
       .short_caption = "Minimum oscillation range"
       .expert_level = 1
+    scan_index = False
+      .type = bool
+      .help = "Remember what was found in each directory searched for images, " \
+              "in <crystal>/setup/scan-index.json, so that when run again only " \
+              "the directories which have changed since are listed again."
+      .short_caption = "Keep an index of the image directories"
+      .expert_level = 2
+    watch
+      .short_caption = "Watch for new images"
+      .expert_level = 2
+    {
+      enable = False
+        .type = bool
+        .help = "Keep looking for new images while they are being written, " \
+                "rewriting the xinfo file as more sweeps are complete."
+      interval = 10
+        .type = float(value_min=0)
+        .help = "Time between looking for new images, in seconds"
+      settle = 60
+        .type = float(value_min=0)
+        .help = "A sweep is complete once no more images of it have arrived " \
+                "for this many seconds"
+      timeout = 600
+        .type = float(value_min=0)
+        .help = "Stop watching once no new images have arrived for this many " \
+                "seconds"
+    }
     include scope dials.util.options.tolerance_phil_scope
     include scope dials.util.options.geometry_phil_scope
     include scope dials.util.options.format_phil_scope
+    header_cache
+      .short_caption = "Image header cache"
+      .expert_level = 2
+    {
+      enable = False
+        .type = bool
+        .help = "Keep the models read from image headers on disk, so that they " \
+                "need not be read again by later xia2 jobs on the same images."
+      directory = None
+        .type = path
+        .help = "Where to keep the cache, by default $XDG_CACHE_HOME/xia2/headers"
+      max_size = 256
+        .type = int(value_min=1)
+        .help = "Maximum size of the cache in MB, least recently used entries " \
+                "are removed first"
+    }
+    header_reading
+      .short_caption = "Image header reading"
+      .expert_level = 2
+    {
+      nthreads = Auto
+        .type = int(value_min=1)
+        .help = "The number of threads reading image headers at once, with " \
+                "read_all_image_headers=True. Auto for four per processor, " \
+                "up to 32."
+      chunk_size = 500
+        .type = int(value_min=1)
+        .help = "The headers of the images of larger sweeps are read this " \
+                "many images at a time, in parallel."
+    }
 
   }
   sweep
@@ -913,6 +979,35 @@ xia2.settings
     detector_id = None
       .type = str
       .help = "Override detector serial number information"
+    profile = False
+      .type = bool
+      .help = "Sample the python stacks of xia2 while it runs, and write " \
+              "flame graph input (folded stacks) for each processing stage " \
+              "to xia2-profile/"
+    profile_interval = 0.01
+      .type = float(value_min=0.001)
+      .help = "Seconds between profile samples"
+    profile_stages = None
+      .type = strings
+      .help = "Also run cProfile over the named stages, e.g. xia2.report"
+  }
+  result_cache
+    .short_caption = "Program result cache"
+    .expert_level = 2
+  {
+    enable = False
+      .type = bool
+      .help = "Keep the results of programs which declare their input and " \
+              "output files, and reuse them when the same program is run " \
+              "again on identical inputs, e.g. when rerunning xia2 after a " \
+              "late failure. Use xia2.cache to inspect or prune the cache."
+    directory = None
+      .type = path
+      .help = "Where to keep the cache, by default $XDG_CACHE_HOME/xia2/results"
+    max_size = 20480
+      .type = int(value_min=1)
+      .help = "Maximum size of the cache in MB, least recently used entries " \
+              "are removed first"
   }
   multi_sweep_indexing = Auto
     .type = bool
@@ -1016,6 +1111,19 @@ xia2.settings
       .type = str
       .help = "The command to use to submit qsub jobs"
       .expert_level = 1
+    cpu_budget = 0
+      .type = int(value_min=0)
+      .help = "The number of cores that programs run by xia2 may use at once," \
+              " in total: programs which would exceed this wait for others" \
+              " to finish. Auto for all available cores, 0 for no limit." \
+              " With a budget set, the per-sweep pointless steps of XDS" \
+              " scaling are run side by side, even with njob=1."
+      .expert_level = 2
+    array_job = False
+      .type = bool
+      .help = "In parallel mode with type=qsub, submit all sweeps as the" \
+              " tasks of a single array job rather than as one job per sweep."
+      .expert_level = 1
   }
   report
     .expert_level = 1
@@ -1043,14 +1151,10 @@ xia2.settings
     }
   }
 }
-""",
-    process_includes=True,
-)
+"""
 
 # override default resolution parameters
-master_phil = master_phil.fetch(
-    source=parse(
-        """\
+resolution_defaults_str = """\
 xia2.settings {
   resolution {
     isigma = None
@@ -1058,8 +1162,104 @@ xia2.settings {
   }
 }
 """
+
+# Parsing the master scope means importing the dials modules it includes
+# scopes from, which takes a second or more at the start of every xia2
+# process. With $XIA2_PHIL_CACHE set, the parsed scope (with the includes
+# expanded) is kept on disk and reused by any later process with the same
+# versions of xia2, dials and dxtbx and the same included modules.
+
+
+def _module_file(module):
+    """The file of a module, found without importing it or its package."""
+    package, _, rest = module.partition(".")
+    try:
+        spec = importlib.util.find_spec(package)
+    except (ImportError, ValueError):
+        return None
+    if not spec or not spec.submodule_search_locations:
+        return None
+    for location in spec.submodule_search_locations:
+        path = os.path.join(location, *rest.split(".")) if rest else location
+        for filename in (path + ".py", os.path.join(path, "__init__.py")):
+            if os.path.isfile(filename):
+                return filename
+    return None
+
+
+def _cache_key():
+    """A key for the cached master scope, or None if it cannot be told when
+    the cached scope would be out of date."""
+
+    try:
+        versions = [metadata.version(p) for p in ("xia2", "dials", "dxtbx")]
+    except metadata.PackageNotFoundError:
+        return None
+    # an editable install keeps its version while the code changes under it,
+    # so also key on the modules scopes are included from and on the libtbx
+    # and iotbx PHIL parsers (cctbx is often built without any metadata)
+    modules = re.findall(r"include scope (\w+(?:\.\w+)*)\.\w+", master_phil_str)
+    for module in sorted(set(modules)) + ["libtbx.phil", "iotbx.phil"]:
+        filename = _module_file(module)
+        if filename is None:
+            return None
+        st = os.stat(filename)
+        versions.append(f"{module} {st.st_size} {st.st_mtime_ns}")
+    digest = hashlib.sha256("\n".join(versions).encode())
+    digest.update(master_phil_str.encode())
+    digest.update(resolution_defaults_str.encode())
+    return digest.hexdigest()[:32]
+
+
+def cache_directory():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
     )
-)
+    return os.path.join(cache_home, "xia2", "phil")
+
+
+def _write_cache(filename, phil_str):
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(filename), suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(phil_str)
+        os.replace(tmp_file, filename)
+    except OSError as e:
+        logger.debug("Could not write master PHIL cache %s: %s", filename, e)
+
+
+def load_master_phil(use_cache=None):
+    """Parse the master scope, or read it from the cache if it is there.
+    By default the cache is only used with $XIA2_PHIL_CACHE set."""
+
+    if use_cache is None:
+        use_cache = bool(os.environ.get("XIA2_PHIL_CACHE"))
+    filename = None
+    key = _cache_key() if use_cache else None
+    if key:
+        filename = os.path.join(cache_directory(), key + ".phil")
+        try:
+            with open(filename) as fh:
+                return parse(fh.read())
+        except OSError:
+            pass
+        except Exception as e:
+            logger.debug("Could not read master PHIL cache %s: %s", filename, e)
+
+    phil = parse(master_phil_str, process_includes=True)
+    phil = phil.fetch(source=parse(resolution_defaults_str))
+    if filename:
+        # only keep the scope if it comes back from the cache unchanged
+        phil_str = phil.as_str(attributes_level=3)
+        if parse(phil_str).as_str(attributes_level=3) == phil_str:
+            _write_cache(filename, phil_str)
+        else:
+            logger.debug("Master PHIL does not survive a round trip, not cached")
+    return phil
+
+
+master_phil = load_master_phil()
 
 PhilIndex = interface.index(master_phil=master_phil)
 
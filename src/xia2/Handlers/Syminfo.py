@@ -1,8 +1,13 @@
-# A collection of functions relating to spacegroup symmetry information
+# A collection of functions relating to spacegroup symmetry information.
+#
+# The answers are remembered for the life of the process, as the scalers ask
+# the same questions about the same few spacegroups over and over, and
+# working them out with cctbx each time is slow by comparison.
 
 
 from __future__ import annotations
 
+import functools
 import re
 
 from cctbx import sgtbx
@@ -11,6 +16,7 @@ from cctbx.sgtbx.bravais_types import bravais_lattice
 _int_re = re.compile("^[0-9]*$")
 
 
+@functools.lru_cache(maxsize=None)
 def get_pointgroup(name):
     """Get the pointgroup for this spacegroup, e.g. P422 for P43212."""
     space_group = sgtbx.space_group_info(name).group()
@@ -20,6 +26,7 @@ def get_pointgroup(name):
     return point_group.type().lookup_symbol().replace(" ", "")
 
 
+@functools.lru_cache(maxsize=None)
 def get_lattice(name):
     """Get the lattice for a named spacegroup."""
 
@@ -53,11 +60,13 @@ def get_lattice(name):
     return str(lattice)
 
 
+@functools.lru_cache(maxsize=None)
 def spacegroup_number_to_name(spacegroup_number):
     """Return the name of this spacegroup."""
     return sgtbx.space_group_info(spacegroup_number).type().lookup_symbol()
 
 
+@functools.lru_cache(maxsize=None)
 def spacegroup_name_to_number(spacegroup):
     """Return the number corresponding to this spacegroup."""
 
@@ -72,6 +81,7 @@ def spacegroup_name_to_number(spacegroup):
     return sgtbx.space_group_info(str(spacegroup)).type().number()
 
 
+@functools.lru_cache(maxsize=None)
 def get_num_symops(spacegroup_number):
     """Get the number of symmetry operations that spacegroup
     number has."""
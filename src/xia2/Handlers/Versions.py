@@ -2,12 +2,12 @@ from __future__ import annotations
 
 import functools
 import re
-import subprocess
 from collections.abc import Mapping
 
 import dials.util.version
 
 import xia2.XIA2Version
+from xia2.Driver.DriverHelper import probe_executable
 
 
 class _Versions(Mapping):
@@ -40,43 +40,25 @@ def get_xia2_version():
     return xia2.XIA2Version.Version
 
 
-@functools.lru_cache(maxsize=None)
 def get_xds_version():
-    try:
-        result = subprocess.run(
-            ["xds"],
-            stdin=subprocess.DEVNULL,
-            capture_output=True,
-        )
-    except OSError:
-        pass
-    version = re.search(rb"BUILT=([0-9]+)\)", result.stdout)
+    output = probe_executable("xds")
+    version = output and re.search(rb"BUILT=([0-9]+)\)", output)
     if version:
         return int(version.groups()[0])
     return None
 
 
-@functools.lru_cache(maxsize=None)
 def get_aimless_version():
-    result = subprocess.run(
-        ["aimless", "--no-input"],
-        stdin=subprocess.DEVNULL,
-        capture_output=True,
-    )
-    version = re.search(rb"version\s\d+\.\d+\.\d+", result.stdout)
+    output = probe_executable("aimless", ["--no-input"])
+    version = output and re.search(rb"version\s\d+\.\d+\.\d+", output)
     if version:
         return version.group().decode("utf-8").split(" ")[1]
     return None
 
 
-@functools.lru_cache(maxsize=None)
 def get_pointless_version():
-    result = subprocess.run(
-        ["pointless"],
-        stdin=subprocess.DEVNULL,
-        capture_output=True,
-    )
-    version = re.search(rb"version\s\d+\.\d+\.\d+", result.stdout)
+    output = probe_executable("pointless")
+    version = output and re.search(rb"version\s\d+\.\d+\.\d+", output)
     if version:
         return version.group().decode("utf-8").split(" ")[1]
     return None
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# The sizing of the batches of images processed in parallel by xia2.ssx.
+# With equal batches, the jobs which finish first sit idle while the last
+# batches (which may hold more hits, so take longer) are processed. Instead
+# the batches are cut as jobs become free, each a share of the images not
+# yet handed out - so large to start with, shrinking towards the end of the
+# run - but never so small that the fixed cost of a batch (starting the job,
+# loading the models) would dominate, judging that and the time an image
+# takes to process from the batches processed so far.
+
+
+@dataclass
+class BatchRecord:
+    start: int
+    end: int
+    submitted: float
+    finished: float
+    step_times: Dict[str, float] = field(default_factory=dict)
+
+
+class BatchScheduler(object):
+
+    """Hands out the images of a run in batches of dynamically chosen size."""
+
+    def __init__(
+        self,
+        n_images: int,
+        njobs: int,
+        max_batch_size: int,
+        max_overhead: float = 0.1,
+        shrink_factor: float = 2,
+        first_image: int = 0,
+    ):
+        """
+        :param n_images: the number of images in the run
+        :param njobs: the number of batches processed at once
+        :param max_batch_size: the largest batch to hand out
+        :param max_overhead: the largest fraction of the time taken by a
+                             batch which should be the fixed cost of a batch
+        :param shrink_factor: each batch is the images remaining divided by
+                              njobs times this
+        :param first_image: the first image to hand out, those before it
+                            having been handed out already
+        """
+        self.n_images = n_images
+        self.njobs = njobs
+        self.max_batch_size = max_batch_size
+        self.max_overhead = max_overhead
+        self.shrink_factor = shrink_factor
+        self.next_image = first_image
+        self.batches: List[BatchRecord] = []
+        self._time_per_image: Optional[float] = None
+        self._time_per_batch = 0.0
+
+    def time_per_image(self) -> Optional[float]:
+        """The time taken to process an image, weighted towards the latest
+        batches, or None before any batch has finished."""
+        return self._time_per_image
+
+    def time_per_batch(self) -> float:
+        """The fixed cost of a batch, weighted towards the latest batches."""
+        return self._time_per_batch
+
+    def next_batch(self) -> Optional[Tuple[int, int]]:
+        """The slice of images in the next batch, or None if all have been
+        handed out."""
+
+        remaining = self.n_images - self.next_image
+        if remaining <= 0:
+            return None
+        min_size = 1
+        if self._time_per_image:
+            min_size = math.ceil(
+                self._time_per_batch
+                * (1 - self.max_overhead)
+                / (self.max_overhead * self._time_per_image)
+            )
+        min_size = min(min_size, self.max_batch_size)
+        size = math.ceil(remaining / (self.shrink_factor * self.njobs))
+        size = min(max(size, min_size), self.max_batch_size)
+        # don't leave a remnant too small to be worth a batch of its own
+        if remaining - size < min_size:
+            size = remaining
+        start = self.next_image
+        self.next_image += size
+        return (start, self.next_image)
+
+    def record(
+        self,
+        images: Tuple[int, int],
+        submitted: float,
+        finished: float,
+        step_times: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """Record the time taken by the batch of images, from submitted to
+        finished, and by each step of its processing - the rest of the time
+        being the fixed cost of the batch."""
+
+        step_times = step_times or {}
+        self.batches.append(
+            BatchRecord(images[0], images[1], submitted, finished, step_times)
+        )
+        n = images[1] - images[0]
+        if not n:
+            return
+        processing = sum(step_times.values()) if step_times else finished - submitted
+        per_image = processing / n
+        per_batch = max(0.0, finished - submitted - processing)
+        if self._time_per_image is None:
+            self._time_per_image = per_image
+            self._time_per_batch = per_batch
+        else:
+            self._time_per_image = 0.5 * (self._time_per_image + per_image)
+            self._time_per_batch = 0.5 * (self._time_per_batch + per_batch)
+
+    def utilisation(self) -> float:
+        """The fraction of the time from the first batch being handed out to
+        the last finishing during which the jobs were busy."""
+
+        if not self.batches:
+            return 0
+        span = max(b.finished for b in self.batches) - min(
+            b.submitted for b in self.batches
+        )
+        if span <= 0:
+            return 1
+        busy = sum(b.finished - b.submitted for b in self.batches)
+        return busy / (self.njobs * span)
+
+    def summary(self) -> dict:
+        n_images = sum(b.end - b.start for b in self.batches)
+        step_times: Dict[str, float] = {}
+        for b in self.batches:
+            for step, t in b.step_times.items():
+                step_times[step] = step_times.get(step, 0) + t
+        return {
+            "njobs": self.njobs,
+            "n_batches": len(self.batches),
+            "n_images": n_images,
+            "utilisation": self.utilisation(),
+            "time_per_image": {
+                step: t / n_images for step, t in step_times.items() if n_images
+            },
+            "batches": [
+                {
+                    "images": [b.start, b.end],
+                    "time": b.finished - b.submitted,
+                    "step_times": b.step_times,
+                }
+                for b in self.batches
+            ],
+        }
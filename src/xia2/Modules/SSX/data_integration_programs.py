@@ -150,8 +150,13 @@ class IntegrationParams:
 def ssx_find_spots(
     working_directory: Path,
     spotfinding_params: SpotfindingParams,
+    experiments: Optional[ExperimentList] = None,
 ) -> flex.reflection_table:
-    if not (working_directory / "imported.expt").is_file():
+    """
+    Find spots on the images imported into the working directory, or on the
+    images of the experiments if given (when imported.expt is not read).
+    """
+    if experiments is None and not (working_directory / "imported.expt").is_file():
         raise ValueError(f"Data has not yet been imported into {working_directory}")
     xia2_logger.notice(banner("Spotfinding"))  # type: ignore
     logfile = "dials.find_spots.log"
@@ -159,7 +164,10 @@ def ssx_find_spots(
         logfile
     ) as dials_logger, record_step("dials.find_spots"):
         # Set up the input
-        imported_expts = load.experiment_list("imported.expt", check_format=True)
+        if experiments is None:
+            imported_expts = load.experiment_list("imported.expt", check_format=True)
+        else:
+            imported_expts = experiments
         xia2_phil = f"""
           input.experiments = imported.expt
           spotfinder.mp.nproc = {spotfinding_params.nproc}
@@ -233,18 +241,33 @@ def clusters_from_experiments(
 def ssx_index(
     working_directory: Path,
     indexing_params: IndexingParams,
+    experiments: Optional[ExperimentList] = None,
+    reflections: Optional[flex.reflection_table] = None,
 ) -> Tuple[ExperimentList, flex.reflection_table, dict]:
-    if not (working_directory / "imported.expt").is_file():
+    """
+    Index the spots found in the working directory, or the experiments and
+    strong reflections if given (when imported.expt and strong.refl are not
+    read).
+    """
+    if experiments is None and not (working_directory / "imported.expt").is_file():
         raise ValueError(f"Data has not yet been imported into {working_directory}")
-    if not (working_directory / "strong.refl").is_file():
+    if reflections is None and not (working_directory / "strong.refl").is_file():
         raise ValueError(f"Unable to find spotfinding results in {working_directory}")
     xia2_logger.notice(banner("Indexing"))  # type: ignore
     with run_in_directory(working_directory):
         logfile = "dials.ssx_index.log"
         with log_to_file(logfile) as dials_logger, record_step("dials.ssx_index"):
             # Set up the input and log it to the dials log file
-            strong_refl = flex.reflection_table.from_file("strong.refl")
-            imported_expts = load.experiment_list("imported.expt", check_format=False)
+            if reflections is None:
+                strong_refl = flex.reflection_table.from_file("strong.refl")
+            else:
+                strong_refl = reflections
+            if experiments is None:
+                imported_expts = load.experiment_list(
+                    "imported.expt", check_format=False
+                )
+            else:
+                imported_expts = experiments
             xia2_phil = f"""
             input.experiments = imported.expt
             input.reflections = strong.refl
@@ -410,9 +433,17 @@ def run_refinement(
 
 
 def ssx_integrate(
-    working_directory: Path, integration_params: IntegrationParams
+    working_directory: Path,
+    integration_params: IntegrationParams,
+    experiments: Optional[ExperimentList] = None,
+    reflections: Optional[flex.reflection_table] = None,
 ) -> dict:
-    if not (
+    """
+    Integrate the indexing results in the working directory, or the indexed
+    experiments and reflections if given (when indexed.expt and indexed.refl
+    are not read).
+    """
+    if (experiments is None or reflections is None) and not (
         (working_directory / "indexed.expt").is_file()
         and (working_directory / "indexed.refl").is_file()
     ):
@@ -423,10 +454,11 @@ def ssx_integrate(
         logfile = "dials.ssx_integrate.log"
         with log_to_file(logfile) as dials_logger, record_step("dials.ssx_integrate"):
             # Set up the input and log it to the dials log file
-            indexed_refl = flex.reflection_table.from_file(
-                "indexed.refl"
-            ).split_by_experiment_id()
-            indexed_expts = load.experiment_list("indexed.expt", check_format=True)
+            if reflections is None or experiments is None:
+                reflections = flex.reflection_table.from_file("indexed.refl")
+                experiments = load.experiment_list("indexed.expt", check_format=True)
+            indexed_refl = reflections.split_by_experiment_id()
+            indexed_expts = experiments
 
             xia2_phil = f"""
                 nproc={integration_params.nproc}
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import collections
+import concurrent.futures
+import copy
 import functools
 import json
 import logging
@@ -7,8 +10,9 @@ import math
 import os
 import pathlib
 import subprocess
+import time
 from dataclasses import asdict, dataclass, field
-from typing import List, Optional, Tuple
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
 
@@ -22,6 +26,7 @@ from dxtbx.serialize import load
 from xia2.Driver.timing import record_step
 from xia2.Handlers.Files import FileHandler
 from xia2.Handlers.Streams import banner
+from xia2.Modules.SSX.batch_scheduler import BatchScheduler
 from xia2.Modules.SSX.data_integration_programs import (
     IndexingParams,
     IntegrationParams,
@@ -51,6 +56,21 @@ class FileInput:
     import_phil: Optional[pathlib.Path] = None
 
 
+@dataclass
+class WatchParams:
+    interval: float = 10
+    settle: float = 5
+    timeout: float = 600
+
+
+@dataclass
+class PipelineParams:
+    find_spots_njobs: int = 1
+    index_njobs: int = 1
+    integrate_njobs: int = 1
+    queue_size: int = 2
+
+
 @dataclass
 class AlgorithmParams:
     assess_images_to_use: Optional[Tuple[int, int]] = None
@@ -63,23 +83,117 @@ class AlgorithmParams:
     njobs: int = 1
     multiprocessing_method: str = "multiprocessing"
     enable_live_reporting: bool = False
+    intermediate_files: bool = True
+    dynamic_batches: bool = False
+    pipeline: Optional[PipelineParams] = None
+    watch: Optional[WatchParams] = None
 
 
-def process_batch(
+STEPS = ("find_spots", "index", "integrate")
+
+# Each batch directory holds the slice of the imported data it covers, in
+# imported_slice.json, rather than its own copy of the models in imported.expt
+# (which for a large run means as many copies of the beam and detector models
+# as batches). The imported data are read in, with the format checks, once in
+# each process however many batches it goes on to process, and kept until
+# forget_imported_experiments() is called once the batches are processed.
+# Each batch gets its own deep copy of its slice, so that nothing a batch
+# does to its models or imagesets reaches the next.
+IMPORTED_SLICE = "imported_slice.json"
+
+
+@functools.lru_cache(maxsize=1)
+def _load_imported_experiments(imported_expts: str, mtime_ns: int) -> ExperimentList:
+    return load.experiment_list(imported_expts, check_format=True)
+
+
+def forget_imported_experiments() -> None:
+    """Drop the imported data kept for loading the batches."""
+    _load_imported_experiments.cache_clear()
+
+
+def write_imported_slice(
     working_directory: pathlib.Path,
-    spotfinding_params: SpotfindingParams,
-    indexing_params: IndexingParams,
-    integration_params: IntegrationParams,
-    options: AlgorithmParams,
-) -> dict:
-    """Run find_spots, index and integrate in the working directory."""
-    number = working_directory.name.split("_")[-1]
-    xia2_logger.notice(banner(f"Processing batch {number}"))  # type: ignore
-    data = {
+    imported_expts: pathlib.Path,
+    images: Tuple[int, int],
+) -> None:
+    """Record the slice of the imported data to process in the directory."""
+    output = {"input": os.fspath(imported_expts.resolve()), "slice": list(images)}
+    with (working_directory / IMPORTED_SLICE).open(mode="w") as f:
+        json.dump(output, f, indent=2)
+
+
+def load_batch_experiments(working_directory: pathlib.Path) -> ExperimentList:
+    """
+    The imported experiments for the batch in the working directory, from
+    the slice of the imported data recorded there, or else imported.expt.
+    """
+    slice_file = working_directory / IMPORTED_SLICE
+    if not slice_file.is_file():
+        return load.experiment_list(
+            working_directory / "imported.expt", check_format=True
+        )
+    with slice_file.open(mode="r") as f:
+        imported = json.load(f)
+    expts = _load_imported_experiments(
+        imported["input"], os.stat(imported["input"]).st_mtime_ns
+    )
+    start, end = imported["slice"]
+    return copy.deepcopy(expts[start:end])
+
+
+@dataclass
+class BatchResults:
+
+    """The experiments and reflections passed from one step to the next when
+    the steps for a batch are run in the same process, rather than written to
+    the batch directory and read back in."""
+
+    imported_expts: Optional[ExperimentList] = None
+    strong: Optional[flex.reflection_table] = None
+    indexed_expts: Optional[ExperimentList] = None
+    indexed_refl: Optional[flex.reflection_table] = None
+    writes: List[concurrent.futures.Future] = field(default_factory=list)
+
+
+def _dump_experiments(data: dict, filename: pathlib.Path) -> None:
+    # as ExperimentList.as_file(), from the dictionary of the experiments
+    with filename.open(mode="w") as f:
+        json.dump(data, f, indent=2)
+
+
+def batch_summary_data(working_directory: pathlib.Path) -> dict:
+    return {
         "n_images_indexed": None,
         "n_cryst_integrated": None,
         "directory": str(working_directory),
+        "step_times": {},
     }
+
+
+def process_batch_step(
+    step: str,
+    working_directory: pathlib.Path,
+    data: dict,
+    spotfinding_params: SpotfindingParams,
+    indexing_params: IndexingParams,
+    integration_params: IntegrationParams,
+    options: AlgorithmParams,
+    results: Optional[BatchResults] = None,
+    writer: Optional[concurrent.futures.Executor] = None,
+) -> bool:
+    """
+    Run one of find_spots, index or integrate in the working directory,
+    adding to the summary data for the batch.
+
+    If results are given, the step takes the output of the previous step from
+    them where it is there (else from the files in the working directory) and
+    leaves its own output in them; the output is then only written to the
+    working directory if options.intermediate_files, by the writer if given.
+    Without results, the output is always written, for the next step to read.
+
+    Returns False if there is nothing for the next step to do.
+    """
     if options.enable_live_reporting:
         nuggets_dir = working_directory / "nuggets"
         if not nuggets_dir.is_dir():
@@ -87,34 +201,120 @@ def process_batch(
         indexing_params.output_nuggets_dir = nuggets_dir
         integration_params.output_nuggets_dir = nuggets_dir
 
-    if "find_spots" in options.steps:
-        strong = ssx_find_spots(working_directory, spotfinding_params)
-        strong.as_file(working_directory / "strong.refl")
-
-    summary: dict = {}
-    integration_summary: dict = {}
-
-    if "index" in options.steps:
-        expt, refl, summary = ssx_index(working_directory, indexing_params)
+    def save(output, filename: str) -> None:
+        if results is None:
+            output.as_file(working_directory / filename)
+        elif options.intermediate_files:
+            if writer is None:
+                output.as_file(working_directory / filename)
+            elif isinstance(output, flex.reflection_table):
+                # the next step may add columns to the table as it is written
+                future = writer.submit(
+                    output.copy().as_file, working_directory / filename
+                )
+                results.writes.append(future)
+            else:
+                # likewise the next step may refine the models, so only the
+                # dictionary taken from them now is written in the background
+                future = writer.submit(
+                    _dump_experiments, output.to_dict(), working_directory / filename
+                )
+                results.writes.append(future)
+
+    start = time.perf_counter()
+    if step == "find_spots":
+        imported_expts = load_batch_experiments(working_directory)
+        strong = ssx_find_spots(working_directory, spotfinding_params, imported_expts)
+        if results is not None:
+            results.imported_expts, results.strong = imported_expts, strong
+        save(strong, "strong.refl")
+        data["step_times"]["find_spots"] = time.perf_counter() - start
+
+    elif step == "index":
+        if results is None:
+            expt, refl, summary = ssx_index(
+                working_directory,
+                indexing_params,
+                load_batch_experiments(working_directory),
+            )
+        else:
+            if results.imported_expts is None:
+                results.imported_expts = load_batch_experiments(working_directory)
+            expt, refl, summary = ssx_index(
+                working_directory,
+                indexing_params,
+                results.imported_expts,
+                results.strong,
+            )
+            # the strong spots are not needed from here on
+            results.strong = None
+            results.indexed_expts, results.indexed_refl = expt, refl
         large_clusters = summary["large_clusters"]
         data["n_images_indexed"] = summary["n_images_indexed"]
-        expt.as_file(working_directory / "indexed.expt")
-        refl.as_file(working_directory / "indexed.refl")
+        save(expt, "indexed.expt")
+        save(refl, "indexed.refl")
+        data["step_times"]["index"] = time.perf_counter() - start
         if large_clusters:
             xia2_logger.info(f"{condensed_unit_cell_info(large_clusters)}")
         if not (expt and refl):
             xia2_logger.warning(
                 f"No images successfully indexed in {str(working_directory)}"
             )
-            return data
-    if "integrate" in options.steps:
-        integration_summary = ssx_integrate(working_directory, integration_params)
+            return False
+
+    elif step == "integrate":
+        if results is None:
+            integration_summary = ssx_integrate(working_directory, integration_params)
+        else:
+            integration_summary = ssx_integrate(
+                working_directory,
+                integration_params,
+                results.indexed_expts,
+                results.indexed_refl,
+            )
+        data["step_times"]["integrate"] = time.perf_counter() - start
         large_clusters = integration_summary["large_clusters"]
         if large_clusters:
             xia2_logger.info(f"{condensed_unit_cell_info(large_clusters)}")
         data["n_cryst_integrated"] = integration_summary["n_cryst_integrated"]
         data["DataFiles"] = integration_summary["DataFiles"]
 
+    return True
+
+
+def process_batch(
+    working_directory: pathlib.Path,
+    spotfinding_params: SpotfindingParams,
+    indexing_params: IndexingParams,
+    integration_params: IntegrationParams,
+    options: AlgorithmParams,
+) -> dict:
+    """
+    Run find_spots, index and integrate in the working directory, passing the
+    output of each step straight to the next, while the intermediate files
+    are written in the background.
+    """
+    number = working_directory.name.split("_")[-1]
+    xia2_logger.notice(banner(f"Processing batch {number}"))  # type: ignore
+    data = batch_summary_data(working_directory)
+    results = BatchResults()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as writer:
+        for step in STEPS:
+            if step in options.steps and not process_batch_step(
+                step,
+                working_directory,
+                data,
+                spotfinding_params,
+                indexing_params,
+                integration_params,
+                options,
+                results,
+                writer,
+            ):
+                break
+    # raise any error from writing the files
+    for future in results.writes:
+        future.result()
     return data
 
 
@@ -125,11 +325,11 @@ def setup_main_process(
 ) -> Tuple[List[pathlib.Path], dict]:
     """
     Slice data from the imported data according to the batch size,
-    saving each into its own subdirectory for batch processing.
+    recording each slice in its own subdirectory for batch processing.
     """
-    expts = load.experiment_list(imported_expts, check_format=True)
-    n_batches = math.floor(len(expts) / batch_size)
-    splits = [i * batch_size for i in range(max(1, n_batches))] + [len(expts)]
+    n_images = len(load.experiment_list(imported_expts, check_format=False))
+    n_batches = math.floor(n_images / batch_size)
+    splits = [i * batch_size for i in range(max(1, n_batches))] + [n_images]
     # make sure last batch has at least the batch size
     template = functools.partial(
         "batch_{index:0{fmt:d}d}".format, fmt=len(str(n_batches))
@@ -140,9 +340,7 @@ def setup_main_process(
         subdir = main_directory / template(index=i + 1)
         if not subdir.is_dir():
             pathlib.Path.mkdir(subdir)
-            # now copy file and run
-        sub_expt = expts[splits[i] : splits[i + 1]]
-        sub_expt.as_file(subdir / "imported.expt")
+        write_imported_slice(subdir, imported_expts, (splits[i], splits[i + 1]))
         batch_directories.append(subdir)
         setup_data["images_per_batch"][str(subdir)] = splits[i + 1] - splits[i]
     return batch_directories, setup_data
@@ -161,11 +359,18 @@ def inspect_existing_batch_directories(
         name = dir_.name
         dirs_list.append(dir_)
         numbers.append(int(name.split("_")[-1]))
-        if not (dir_ / "imported.expt").is_file():
-            raise ValueError("Unable to find imported.expt in existing batch directory")
-        n_images.append(
-            len(load.experiment_list(dir_ / "imported.expt", check_format=False))
-        )
+        if (dir_ / IMPORTED_SLICE).is_file():
+            with (dir_ / IMPORTED_SLICE).open(mode="r") as f:
+                start, end = json.load(f)["slice"]
+            n_images.append(end - start)
+        elif (dir_ / "imported.expt").is_file():
+            n_images.append(
+                len(load.experiment_list(dir_ / "imported.expt", check_format=False))
+            )
+        else:
+            raise ValueError(
+                "Unable to find imported data slice in existing batch directory"
+            )
     if not dirs_list:
         raise ValueError("Unable to find any batch_* directories")
     order = np.argsort(np.array(numbers))
@@ -176,6 +381,29 @@ def inspect_existing_batch_directories(
     return batch_directories, setup_data
 
 
+def images_cut_into_batches(batch_directories: List[pathlib.Path]) -> Optional[int]:
+    """
+    The number of images, from the start of the imported data, covered by
+    the slices recorded in the batch directories - fewer than were imported
+    if a run cutting the batches as it went stopped early - or None if the
+    batches hold their own imported.expt, so cover all the images imported.
+    """
+    slices = []
+    for directory in batch_directories:
+        if not (directory / IMPORTED_SLICE).is_file():
+            return None
+        with (directory / IMPORTED_SLICE).open(mode="r") as f:
+            slices.append(json.load(f)["slice"])
+    end = 0
+    for start, stop in sorted(slices):
+        if start != end:
+            raise ValueError(
+                f"Existing batch directories skip images {end + 1} to {start}"
+            )
+        end = stop
+    return end
+
+
 class NoMoreImages(Exception):
     pass
 
@@ -347,7 +575,9 @@ def assess_crystal_parameters_from_images(
     # now run find spots and index
     strong = ssx_find_spots(working_directory, spotfinding_params)
     strong.as_file(working_directory / "strong.refl")
-    expts, __, summary = ssx_index(working_directory, indexing_params)
+    expts, __, summary = ssx_index(
+        working_directory, indexing_params, reflections=strong
+    )
     success_per_image = summary["success_per_image"]
 
     if expts:
@@ -391,7 +621,9 @@ def cumulative_assess_crystal_parameters(
             break
         strong = ssx_find_spots(working_directory, spotfinding_params)
         strong.as_file(working_directory / "strong.refl")
-        expts, _, summary_this = ssx_index(working_directory, indexing_params)
+        expts, _, summary_this = ssx_index(
+            working_directory, indexing_params, reflections=strong
+        )
         n_xtal += len(expts)
         xia2_logger.info(f"Indexed {n_xtal} crystals in total")
         all_expts.extend(expts)
@@ -457,7 +689,9 @@ def determine_reference_geometry_from_images(
 
     strong = ssx_find_spots(working_directory, spotfinding_params)
     strong.as_file(working_directory / "strong.refl")
-    expts, refl, summary = ssx_index(working_directory, indexing_params)
+    expts, refl, summary = ssx_index(
+        working_directory, indexing_params, reflections=strong
+    )
     success_per_image = summary["success_per_image"]
 
     if expts:
@@ -514,7 +748,9 @@ def cumulative_determine_reference_geometry(
             break
         strong = ssx_find_spots(working_directory, spotfinding_params)
         strong.as_file(working_directory / "strong.refl")
-        expts, refl, summary_this = ssx_index(working_directory, indexing_params)
+        expts, refl, summary_this = ssx_index(
+            working_directory, indexing_params, reflections=strong
+        )
         n_xtal += len(expts)
         xia2_logger.info(f"Indexed {n_xtal} crystals in total")
         if refl.size():
@@ -583,6 +819,162 @@ class ProcessBatch(object):
         return summary_data
 
 
+class ProcessBatchStep(object):
+
+    """Runs one step of process_batch, for a stage of the pipeline"""
+
+    def __init__(
+        self,
+        step: str,
+        spotfinding_params: SpotfindingParams,
+        indexing_params: IndexingParams,
+        integration_params: IntegrationParams,
+        options: AlgorithmParams,
+    ):
+        self.step = step
+        self.spotfinding_params = spotfinding_params
+        self.indexing_params = indexing_params
+        self.integration_params = integration_params
+        self.options = options
+
+    def __call__(self, data: dict) -> Tuple[dict, bool]:
+        directory = pathlib.Path(data["directory"])
+        number = directory.name.split("_")[-1]
+        with redirect_xia2_logger() as iostream:
+            xia2_logger.notice(banner(f"Batch {number}: {self.step}"))  # type: ignore
+            carry_on = process_batch_step(
+                self.step,
+                directory,
+                data,
+                self.spotfinding_params,
+                self.indexing_params,
+                self.integration_params,
+                self.options,
+            )
+            s = iostream.getvalue()
+        xia2_logger.info(s)
+        return data, carry_on
+
+
+class ProgressReport(object):
+
+    """Cumulative totals of the images processed, indexed and integrated."""
+
+    def __init__(self, images_per_batch: dict):
+        self.images_per_batch = images_per_batch
+        self.cumulative_images: int = 0
+        self.cumulative_images_indexed: int = 0
+        self.cumulative_crystals_integrated: int = 0
+
+    def add(self, summary_data: dict) -> None:
+        self.cumulative_images += self.images_per_batch[summary_data["directory"]]
+        xia2_logger.info(
+            f"Cumulative number of images processed: {self.cumulative_images}"
+        )
+        if summary_data["n_images_indexed"] is not None:
+            self.cumulative_images_indexed += summary_data["n_images_indexed"]
+            pc_indexed = self.cumulative_images_indexed * 100 / self.cumulative_images
+            xia2_logger.info(f"Cumulative % of images indexed: {pc_indexed:.2f}%")
+        if summary_data["n_cryst_integrated"] is not None:
+            self.cumulative_crystals_integrated += summary_data["n_cryst_integrated"]
+            xia2_logger.info(
+                f"Total number of integrated crystals: {self.cumulative_crystals_integrated}"
+            )
+
+
+def record_data_files(summary_data: dict) -> None:
+    if "DataFiles" in summary_data:
+        for tag, file in zip(
+            summary_data["DataFiles"]["tags"],
+            summary_data["DataFiles"]["filenames"],
+        ):
+            FileHandler.record_more_data_file(tag, file)
+
+
+def process_batches_pipelined(
+    batch_directories: List[pathlib.Path],
+    spotfinding_params: SpotfindingParams,
+    indexing_params: IndexingParams,
+    integration_params: IntegrationParams,
+    options: AlgorithmParams,
+    callback: Callable[[dict], None],
+) -> None:
+    """
+    Process the batches as a pipeline, with a pool of processes for each
+    step, so that e.g. one batch can be finding spots while another is being
+    indexed. A step only starts on another batch while fewer than
+    options.pipeline.queue_size of the batches it has finished are waiting
+    for the next step (or, with a queue_size of 0, while the next step has
+    no job free), so that no step gets far ahead of the next. callback
+    is called with the summary data of each batch as it leaves the pipeline.
+    """
+    if options.multiprocessing_method != "multiprocessing":
+        # each step has a pool of local processes, not jobs on a cluster
+        raise ValueError(
+            "The processing can only be pipelined with multiprocessing, not "
+            + f"with multiprocessing_method={options.multiprocessing_method}"
+        )
+    pipeline = options.pipeline
+    njobs = {
+        "find_spots": pipeline.find_spots_njobs,
+        "index": pipeline.index_njobs,
+        "integrate": pipeline.integrate_njobs,
+    }
+    steps = [step for step in STEPS if step in options.steps]
+    xia2_logger.info(
+        f"Submitting processing in {len(batch_directories)} batches, with "
+        + ", ".join(f"{njobs[step]} {step} jobs" for step in steps)
+        + f", each with nproc={options.nproc}."
+    )
+    functions = [
+        ProcessBatchStep(
+            step, spotfinding_params, indexing_params, integration_params, options
+        )
+        for step in steps
+    ]
+    # the summary data of the batches waiting for each step
+    waiting: List[collections.deque] = [collections.deque() for _ in steps]
+    waiting[0].extend(batch_summary_data(d) for d in batch_directories)
+    n_running = [0] * len(steps)
+    running: dict = {}  # future: index of the step
+
+    def queue_size(i: int) -> int:
+        if pipeline.queue_size:
+            return pipeline.queue_size
+        # only as many as the jobs of the step free to take them at once
+        return njobs[steps[i]] - n_running[i]
+
+    pools = [
+        concurrent.futures.ProcessPoolExecutor(max_workers=njobs[step])
+        for step in steps
+    ]
+    try:
+        while running or any(waiting):
+            # feed the later steps first, so that batches leave the pipeline
+            # as soon as they can
+            for i in reversed(range(len(steps))):
+                while waiting[i] and n_running[i] < njobs[steps[i]]:
+                    if i + 1 < len(steps) and len(waiting[i + 1]) >= queue_size(i + 1):
+                        break
+                    future = pools[i].submit(functions[i], waiting[i].popleft())
+                    running[future] = i
+                    n_running[i] += 1
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                i = running.pop(future)
+                n_running[i] -= 1
+                data, carry_on = future.result()
+                if carry_on and i + 1 < len(steps):
+                    waiting[i + 1].append(data)
+                else:
+                    callback(data)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
 def process_batches(
     batch_directories: List[pathlib.Path],
     spotfinding_params: SpotfindingParams,
@@ -591,45 +983,22 @@ def process_batches(
     setup_data: dict,
     options: AlgorithmParams,
 ):
-    class ProgressReport(object):
-        def __init__(self):
-            self.cumulative_images: int = 0
-            self.cumulative_images_indexed: int = 0
-            self.cumulative_crystals_integrated: int = 0
-
-        def add(self, summary_data: dict) -> None:
-            self.cumulative_images += setup_data["images_per_batch"][
-                summary_data["directory"]
-            ]
-            xia2_logger.info(
-                f"Cumulative number of images processed: {self.cumulative_images}"
-            )
-            if summary_data["n_images_indexed"] is not None:
-                self.cumulative_images_indexed += summary_data["n_images_indexed"]
-                pc_indexed = (
-                    self.cumulative_images_indexed * 100 / self.cumulative_images
-                )
-                xia2_logger.info(f"Cumulative % of images indexed: {pc_indexed:.2f}%")
-            if summary_data["n_cryst_integrated"] is not None:
-                self.cumulative_crystals_integrated += summary_data[
-                    "n_cryst_integrated"
-                ]
-                xia2_logger.info(
-                    f"Total number of integrated crystals: {self.cumulative_crystals_integrated}"
-                )
-
-    progress = ProgressReport()
+    progress = ProgressReport(setup_data["images_per_batch"])
 
     def process_output(summary_data):
         progress.add(summary_data)
-        if "DataFiles" in summary_data:
-            for tag, file in zip(
-                summary_data["DataFiles"]["tags"],
-                summary_data["DataFiles"]["filenames"],
-            ):
-                FileHandler.record_more_data_file(tag, file)
-
-    if options.njobs > 1:
+        record_data_files(summary_data)
+
+    if options.pipeline:
+        process_batches_pipelined(
+            batch_directories,
+            spotfinding_params,
+            indexing_params,
+            integration_params,
+            options,
+            callback=process_output,
+        )
+    elif options.njobs > 1:
         njobs = min(options.njobs, len(batch_directories))
         xia2_logger.info(
             f"Submitting processing in {len(batch_directories)} batches across {njobs} cores, each with nproc={options.nproc}."
@@ -655,6 +1024,105 @@ def process_batches(
                 options,
             )
             process_output(summary_data)
+        forget_imported_experiments()
+
+
+def process_batches_dynamically(
+    main_directory: pathlib.Path,
+    imported_expts: pathlib.Path,
+    spotfinding_params: SpotfindingParams,
+    indexing_params: IndexingParams,
+    integration_params: IntegrationParams,
+    options: AlgorithmParams,
+    existing_batches: Optional[List[pathlib.Path]] = None,
+) -> List[pathlib.Path]:
+    """
+    Process the imported data in options.njobs parallel processes, slicing
+    off each batch only when a process is free to take it, with the batch
+    size chosen by a BatchScheduler (at most options.batch_size).
+
+    existing_batches are those cut by an earlier run which stopped before
+    all the images were handed out: they are processed again, and the rest
+    of the images scheduled after them.
+
+    The time taken by each batch, and each step of it, and the fraction of
+    the time the processes were busy are saved to batch_scheduling.json.
+    Returns the batch directories processed.
+    """
+    n_images = len(load.experiment_list(imported_expts, check_format=False))
+    resubmit: collections.deque = collections.deque()  # (directory, images)
+    first_image = 0
+    if existing_batches:
+        for subdir in existing_batches:
+            with (subdir / IMPORTED_SLICE).open(mode="r") as f:
+                resubmit.append((subdir, tuple(json.load(f)["slice"])))
+        first_image = images_cut_into_batches(existing_batches) or 0
+        xia2_logger.info(
+            f"Carrying on after {len(resubmit)} batches cut by a previous run, "
+            + f"from image {first_image + 1}"
+        )
+    scheduler = BatchScheduler(
+        n_images, options.njobs, options.batch_size, first_image=first_image
+    )
+    images_per_batch: dict = {}
+    progress = ProgressReport(images_per_batch)
+    batch_directories: List[pathlib.Path] = []
+    running: dict = {}  # future: (slice of images, time submitted)
+    # the number of batches is not known in advance, but cannot be more
+    # than the number of images
+    template = functools.partial(
+        "batch_{index:0{fmt:d}d}".format, fmt=len(str(n_images))
+    )
+    function = ProcessBatch(
+        spotfinding_params, indexing_params, integration_params, options
+    )
+    xia2_logger.info(
+        f"Submitting processing of {n_images} images in batches across {options.njobs} processes, each with nproc={options.nproc}."
+    )
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=options.njobs) as pool:
+
+        def submit() -> bool:
+            if resubmit:
+                subdir, images = resubmit.popleft()
+            else:
+                images = scheduler.next_batch()
+                if images is None:
+                    return False
+                subdir = main_directory / template(index=len(batch_directories) + 1)
+                if not subdir.is_dir():
+                    pathlib.Path.mkdir(subdir)
+                write_imported_slice(subdir, imported_expts, images)
+            batch_directories.append(subdir)
+            images_per_batch[str(subdir)] = images[1] - images[0]
+            running[pool.submit(function, subdir)] = (images, time.perf_counter())
+            return True
+
+        while len(running) < options.njobs and submit():
+            pass
+        while running:
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                images, submitted = running.pop(future)
+                summary_data = future.result()
+                scheduler.record(
+                    images, submitted, time.perf_counter(), summary_data["step_times"]
+                )
+                progress.add(summary_data)
+                record_data_files(summary_data)
+            while len(running) < options.njobs and submit():
+                pass
+
+    scheduling = scheduler.summary()
+    xia2_logger.info(
+        f"Processed {scheduling['n_batches']} batches, with the processes busy "
+        + f"{100 * scheduling['utilisation']:.1f}% of the time"
+    )
+    with open(main_directory / "batch_scheduling.json", "w") as outfile:
+        json.dump(scheduling, outfile, indent=2)
+    return batch_directories
 
 
 def check_for_gaps_in_steps(steps: List[str]) -> bool:
@@ -694,6 +1162,37 @@ def run_data_integration(
     # Note, it is allowed in general to not have to have index or find_spots, as
     # one may be rerunning in a stepwise manner.
 
+    # When watching for images as they are collected, there is no dataset to
+    # assess or refine the geometry from, so those must be done beforehand.
+    if options.watch:
+        if has_gaps:
+            raise ValueError(
+                "Some processing steps are missing, which is not possible when watching for images. Please adjust input."
+            )
+        if not (
+            file_input.reference_geometry
+            and indexing_params.space_group
+            and indexing_params.unit_cell
+        ):
+            raise ValueError(
+                "Watching for images needs a reference geometry, space group and unit cell.\n"
+                + "These can be determined by running xia2.ssx on the first images collected."
+            )
+        if not options.steps:
+            return []
+        from xia2.Modules.SSX.data_integration_streaming import (
+            run_streaming_integration,
+        )
+
+        return run_streaming_integration(
+            root_working_directory,
+            file_input,
+            options,
+            spotfinding_params,
+            indexing_params,
+            integration_params,
+        )
+
     # Start by importing the data
     import_wd = root_working_directory / "import"
     same_as_previous, previous = check_previous_import(import_wd, file_input)
@@ -784,6 +1283,46 @@ def run_data_integration(
             root_working_directory
         )
     except ValueError:  # if existing batches weren't found
+        batch_directories = []
+    if batch_directories:
+        n_cut = images_cut_into_batches(batch_directories)
+        n_images = len(load.experiment_list(imported_expts, check_format=False))
+        if n_cut is not None and n_cut < n_images:
+            # a run with dynamic batches stopped before cutting them all
+            if options.pipeline or options.multiprocessing_method != "multiprocessing":
+                raise ValueError(
+                    f"Only {n_cut} of {n_images} images were cut into batches by "
+                    + "the previous run, which can only be carried on with "
+                    + "multiprocessing_method=multiprocessing, without the pipeline"
+                )
+            batch_directories = process_batches_dynamically(
+                root_working_directory,
+                imported_expts,
+                spotfinding_params,
+                indexing_params,
+                integration_params,
+                options,
+                existing_batches=batch_directories,
+            )
+            return batch_directories
+    else:
+        if (
+            options.njobs > 1
+            and options.dynamic_batches
+            and not options.pipeline
+            and options.multiprocessing_method == "multiprocessing"
+        ):
+            batch_directories = process_batches_dynamically(
+                root_working_directory,
+                imported_expts,
+                spotfinding_params,
+                indexing_params,
+                integration_params,
+                options,
+            )
+            if not batch_directories:
+                raise ValueError("Unable to determine directories for processing.")
+            return batch_directories
         batch_directories, setup_data = setup_main_process(
             root_working_directory,
             imported_expts,
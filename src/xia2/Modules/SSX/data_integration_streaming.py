@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import dataclasses
+import glob
+import json
+import logging
+import os
+import pathlib
+import re
+import time
+from typing import List
+
+import h5py
+
+from dxtbx.serialize import load
+
+from xia2.Handlers.Streams import banner
+from xia2.Modules.SSX.data_integration_programs import (
+    IndexingParams,
+    IntegrationParams,
+    SpotfindingParams,
+)
+from xia2.Modules.SSX.data_integration_standard import (
+    AlgorithmParams,
+    FileInput,
+    ProgressReport,
+    forget_imported_experiments,
+    process_batch,
+    record_data_files,
+    run_import,
+    write_imported_slice,
+)
+
+xia2_logger = logging.getLogger(__name__)
+
+# Processing of the images of a serial collection while they are still being
+# written: rather than importing the whole dataset and slicing it into
+# batches, the images are watched for as they arrive and each batch is
+# imported and processed as soon as batch_size images have been written.
+
+HDF5_EXTENSIONS = (".h5", ".nxs")
+
+# the single image formats looked for in the directories watched, as for
+# xia2.setup (any other files written there, such as logs, are ignored)
+IMAGE_EXTENSIONS = tuple(
+    f".{extension}{compression}"
+    for extension in (
+        "cbf",
+        "img",
+        "mccd",
+        "mar1200",
+        "mar1600",
+        "mar2000",
+        "mar2300",
+        "mar3450",
+        "osc",
+        "sfrm",
+    )
+    for compression in ("", ".bz2", ".gz")
+)
+
+# batches are numbered as they are found, so without knowing how many there
+# will be; the names are padded so that they still sort in order
+BATCH_NAME = "batch_{index:04d}"
+
+
+class ImageFiles(object):
+
+    """The image files matching some glob patterns, or in some directories,
+    in the order in which they finish being written."""
+
+    def __init__(self, patterns: List[str], directories: List[str], settle: float):
+        self.patterns = patterns
+        self.directories = directories
+        self.settle = settle
+        self.last_change = time.time()
+        self._changing: dict = {}  # path: (size and mtime, when first seen)
+        self._landed: set = set()
+
+    def _stat_new_files(self) -> dict:
+        found = {}
+        for pattern in self.patterns:
+            for path in glob.glob(pattern):
+                if path in self._landed:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (st.st_size, st.st_mtime_ns)
+        for directory in self.directories:
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.startswith(".") or entry.path in self._landed:
+                            continue
+                        if not entry.name.endswith(IMAGE_EXTENSIONS):
+                            continue
+                        if entry.is_file():
+                            st = entry.stat()
+                            found[entry.path] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        return found
+
+    def skip(self, images: list) -> None:
+        """Ignore images which were processed before."""
+        self._landed.update(images)
+
+    def poll(self, now: float) -> list:
+        """The images which have been written in full since the last poll -
+        that is, which have not changed for the last settle seconds."""
+
+        landed = []
+        for path, state in self._stat_new_files().items():
+            if path not in self._changing or self._changing[path][0] != state:
+                self._changing[path] = (state, now)
+                self.last_change = now
+            if now - self._changing[path][1] >= self.settle:
+                landed.append(path)
+        for path in landed:
+            del self._changing[path]
+        self._landed.update(landed)
+        return sorted(landed)
+
+    def import_batch(
+        self, directory: pathlib.Path, images: list, file_input: FileInput
+    ) -> list:
+        """Import the images for the batch, returning those imported."""
+        run_import(
+            directory,
+            dataclasses.replace(
+                file_input, images=images, templates=[], directories=[]
+            ),
+        )
+        return images
+
+
+class HDF5Frames(object):
+
+    """The frames of an HDF5 master file, which links to a data file for each
+    block of frames as it is written (as for an Eiger detector)."""
+
+    def __init__(self, master: str, settle: float):
+        self.master = master
+        self.settle = settle
+        self.last_change = time.time()
+        self._counts: list = []  # (when seen, number of frames written)
+        self._landed = 0
+        self._n_imported = 0
+
+    def frames_written(self) -> int:
+        n = 0
+        try:
+            with h5py.File(self.master, "r") as f:
+                data = f["entry/data"]
+                for name in sorted(data):
+                    # the link to a data file not yet written cannot be followed
+                    try:
+                        n += data[name].shape[0]
+                    except (KeyError, OSError):
+                        break
+        except (KeyError, OSError):
+            pass
+        return n
+
+    def skip(self, frames: list) -> None:
+        """Ignore frames which were processed before."""
+        if frames:
+            self._landed = max(self._landed, max(frames) + 1)
+
+    def poll(self, now: float) -> list:
+        """The frames which have been written since the last poll, counting
+        only those which were already there settle seconds ago."""
+
+        n = self.frames_written()
+        if not self._counts or self._counts[-1][1] != n:
+            self._counts.append((now, n))
+            self.last_change = now
+        settled = [
+            i for i, (when, _) in enumerate(self._counts) if now - when >= self.settle
+        ]
+        if not settled:
+            return []
+        del self._counts[: settled[-1]]
+        landed = self._counts[0][1]
+        frames = list(range(self._landed, landed))
+        self._landed = max(self._landed, landed)
+        return frames
+
+    def import_batch(
+        self, directory: pathlib.Path, frames: list, file_input: FileInput
+    ) -> list:
+        """
+        Record the slice of the imported master file for the batch, returning
+        the frames in it. The master file is imported again only when it has
+        grown past the frames imported before, and then into the import
+        directory shared by all the batches. The frames counted may not all
+        be found by the import yet, in which case only those found are
+        sliced into the batch.
+        """
+        import_wd = directory.parent / "import"
+        imported_expts = import_wd / "imported.expt"
+        if frames[-1] >= self._n_imported:
+            run_import(
+                import_wd,
+                dataclasses.replace(
+                    file_input, images=[self.master], templates=[], directories=[]
+                ),
+            )
+            self._n_imported = len(
+                load.experiment_list(imported_expts, check_format=False)
+            )
+        frames = [i for i in frames if i < self._n_imported]
+        if frames:
+            if not directory.is_dir():
+                directory.mkdir()
+            write_imported_slice(directory, imported_expts, (frames[0], frames[-1] + 1))
+        return frames
+
+
+def image_stream(file_input: FileInput, settle: float):
+    """The images or frames to watch for, given the input."""
+
+    hdf5 = [image for image in file_input.images if image.endswith(HDF5_EXTENSIONS)]
+    if hdf5:
+        if len(file_input.images) > 1:
+            raise ValueError(
+                "Only a single HDF5 master file can be watched for new images"
+            )
+        return HDF5Frames(hdf5[0], settle)
+    patterns = list(file_input.images) + [
+        re.sub("#+", lambda m: "[0-9]" * len(m.group()), template)
+        for template in file_input.templates
+    ]
+    return ImageFiles(patterns, file_input.directories, settle)
+
+
+def _file_input_dict(file_input: FileInput) -> dict:
+    return {
+        k: os.fspath(v) if isinstance(v, pathlib.Path) else v
+        for k, v in dataclasses.asdict(file_input).items()
+    }
+
+
+def _write_json(filename: pathlib.Path, data: dict) -> None:
+    # written in full before replacing the last version, for anything
+    # monitoring the progress of the processing
+    tmp_file = filename.with_name(filename.name + ".tmp")
+    with tmp_file.open(mode="w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, filename)
+
+
+def run_streaming_integration(
+    root_working_directory: pathlib.Path,
+    file_input: FileInput,
+    options: AlgorithmParams,
+    spotfinding_params: SpotfindingParams,
+    indexing_params: IndexingParams,
+    integration_params: IntegrationParams,
+) -> List[pathlib.Path]:
+    """
+    Watch for images as they are written, processing them in batches of
+    options.batch_size as soon as there are enough, until no new images have
+    arrived for options.watch.timeout seconds, when the remaining images are
+    processed as a last, smaller batch.
+
+    The cumulative totals of the images indexed and crystals integrated are
+    kept in stream_progress.json, and the images processed in each batch in
+    batch_images.json in the batch directory, so that a rerun with the same
+    input carries on where the last run stopped.
+
+    Returns the batch directories processed.
+    """
+    watch = options.watch
+    stream = image_stream(file_input, watch.settle)
+
+    progress_file = root_working_directory / "stream_progress.json"
+    file_input_dict = _file_input_dict(file_input)
+    previous_batches: List[str] = []
+    if progress_file.is_file():
+        with progress_file.open(mode="r") as f:
+            previous = json.load(f)
+        if previous["file_input"] == file_input_dict:
+            previous_batches = [batch["directory"] for batch in previous["batches"]]
+        else:
+            xia2_logger.info("Input differs from the previous run, starting again")
+
+    images_per_batch: dict = {}
+    progress = ProgressReport(images_per_batch)
+    batches: List[dict] = []
+    batch_directories: List[pathlib.Path] = []
+
+    def add_batch(directory: pathlib.Path, images: list, summary_data: dict) -> None:
+        images_per_batch[str(directory)] = len(images)
+        progress.add(summary_data)
+        batch_directories.append(directory)
+        batches.append(
+            {
+                "directory": str(directory),
+                "n_images": len(images),
+                "n_images_indexed": summary_data["n_images_indexed"],
+                "n_cryst_integrated": summary_data["n_cryst_integrated"],
+            }
+        )
+        _write_json(
+            progress_file,
+            {
+                "file_input": file_input_dict,
+                "cumulative_images": progress.cumulative_images,
+                "cumulative_images_indexed": progress.cumulative_images_indexed,
+                "cumulative_crystals_integrated": progress.cumulative_crystals_integrated,
+                "batches": batches,
+            },
+        )
+
+    for directory in previous_batches:
+        batch_file = pathlib.Path(directory) / "batch_images.json"
+        if not batch_file.is_file():
+            break
+        with batch_file.open(mode="r") as f:
+            batch = json.load(f)
+        stream.skip(batch["images"])
+        record_data_files(batch["summary"])
+        add_batch(pathlib.Path(directory), batch["images"], batch["summary"])
+    if batch_directories:
+        xia2_logger.info(
+            f"Carrying on after {len(batch_directories)} batches processed previously"
+        )
+
+    xia2_logger.notice(banner("Watching for images"))  # type: ignore
+    xia2_logger.info(
+        f"Looking for new images every {watch.interval:.0f}s, "
+        + f"until none have arrived for {watch.timeout:.0f}s"
+    )
+    pending: list = []
+    try:
+        while True:
+            now = time.time()
+            pending.extend(stream.poll(now))
+            finished = now - stream.last_change >= max(watch.timeout, watch.settle)
+            while len(pending) >= options.batch_size or (finished and pending):
+                directory = root_working_directory / BATCH_NAME.format(
+                    index=len(batch_directories) + 1
+                )
+                images = stream.import_batch(
+                    directory, pending[: options.batch_size], file_input
+                )
+                if not images:
+                    if not finished:
+                        # look again once more of the master file is there
+                        break
+                    xia2_logger.warning(
+                        f"Unable to import {len(pending)} images, not processed"
+                    )
+                    pending = []
+                    break
+                pending = pending[len(images) :]
+                summary_data = process_batch(
+                    directory,
+                    spotfinding_params,
+                    indexing_params,
+                    integration_params,
+                    options,
+                )
+                record_data_files(summary_data)
+                with (directory / "batch_images.json").open(mode="w") as f:
+                    json.dump({"images": images, "summary": summary_data}, f)
+                add_batch(directory, images, summary_data)
+            if finished:
+                xia2_logger.info(
+                    f"No new images for {now - stream.last_change:.0f}s, stopped watching"
+                )
+                break
+            time.sleep(watch.interval)
+    except KeyboardInterrupt:
+        xia2_logger.info("Stopped watching")
+    finally:
+        forget_imported_experiments()
+
+    return batch_directories
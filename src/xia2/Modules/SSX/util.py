@@ -21,6 +21,7 @@ def report_timing(fn):
         result = fn(*args, **kwargs)
         xia2_logger.debug("\nTiming report:")
         xia2_logger.debug("\n".join(xia2.Driver.timing.report()))
+        xia2.Driver.timing.write_trace("xia2-trace.json")
         duration = time.time() - start_time
         # write out the time taken in a human readable way
         xia2_logger.info(
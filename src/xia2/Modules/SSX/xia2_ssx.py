@@ -17,6 +17,8 @@ from xia2.Modules.SSX.data_integration_programs import (
 from xia2.Modules.SSX.data_integration_standard import (
     AlgorithmParams,
     FileInput,
+    PipelineParams,
+    WatchParams,
     run_data_integration,
 )
 from xia2.Modules.SSX.data_reduction_definitions import ReductionParams
@@ -63,6 +65,43 @@ multiprocessing {
             "cluster."
             "WARNING: be considerate of fair use policies for the computing"
             "resources you will be using and whether it is necessary to use njobs>1."
+  dynamic_batches = False
+    .type = bool
+    .expert_level=3
+    .help = "If njobs>1, cut each batch only when a job is free to take it,"
+            " sizing the batches to keep all the jobs busy to the end: large"
+            " to start with (up to batch_size images), shrinking towards the"
+            " end of the run, and judged from the time taken by the batches"
+            " processed so far."
+  pipeline {
+    enable = False
+      .type = bool
+      .expert_level=3
+      .help = "Run find_spots, index and integrate each with its own pool of"
+              " jobs, passing each batch from one to the next, so that e.g."
+              " one batch can be finding spots (mostly reading images) while"
+              " another is being indexed (mostly computing). Up to the sum of"
+              " the jobs for each step, each with nproc processes, run at once."
+    find_spots_njobs = Auto
+      .type = int(value_min=1)
+      .expert_level=3
+      .help = "The number of batches to find spots on at once (Auto for njobs)"
+    index_njobs = Auto
+      .type = int(value_min=1)
+      .expert_level=3
+      .help = "The number of batches to index at once (Auto for njobs)"
+    integrate_njobs = Auto
+      .type = int(value_min=1)
+      .expert_level=3
+      .help = "The number of batches to integrate at once (Auto for njobs)"
+    queue_size = 2
+      .type = int(value_min=0)
+      .expert_level=3
+      .help = "A step waits before starting on another batch while this many"
+              " of the batches it has finished are waiting for the next step."
+              " With 0, a step only starts on another batch while the next"
+              " step has a job free to take it."
+  }
 }
 
 space_group = None
@@ -184,6 +223,39 @@ enable_live_reporting = False
   .type = bool
   .help = "If True, additional output will be generated to allow in-process monitoring"
   .expert_level=3
+intermediate_files = True
+  .type = bool
+  .help = "If True, the spots found (strong.refl) and indexing results"
+          " (indexed.expt, indexed.refl) are saved in each batch directory,"
+          " in the background while the processing carries on, for inspection"
+          " or to rerun later steps with workflow.steps. If False, these are"
+          " only passed between the steps in memory. They are always saved"
+          " if multiprocessing.pipeline.enable=True."
+  .expert_level=3
+watch {
+  enable = False
+    .type = bool
+    .help = "Process the images while they are being collected, in batches of"
+            " batch_size images as soon as enough have been written. Needs a"
+            " reference_geometry, space_group and unit_cell. Images are found"
+            " from image= (a single HDF5 master file, or file names or glob"
+            " patterns), template= or directory=."
+    .expert_level=2
+  interval = 10
+    .type = float(value_min=0)
+    .help = "Time between looking for new images, in seconds"
+    .expert_level=2
+  settle = 5
+    .type = float(value_min=0)
+    .help = "An image has been written in full once it has not changed for"
+            " this many seconds"
+    .expert_level=3
+  timeout = 600
+    .type = float(value_min=0)
+    .help = "Stop watching, and process any remaining images, once no new"
+            " images have arrived for this many seconds"
+    .expert_level=2
+}
 """
 
 full_phil_str = phil_str + data_reduction_phil_str + workflow_phil
@@ -237,10 +309,32 @@ def run_xia2_ssx(
         geometry_refinement_n_crystals=params.geometry_refinement.n_crystals,
         batch_size=params.batch_size,
         njobs=params.multiprocessing.njobs,
+        dynamic_batches=params.multiprocessing.dynamic_batches,
         nproc=params.multiprocessing.nproc,
         steps=params.workflow.steps,
         enable_live_reporting=params.enable_live_reporting,
+        intermediate_files=params.intermediate_files,
     )
+    if params.multiprocessing.pipeline.enable:
+        pipeline = params.multiprocessing.pipeline
+        if pipeline.find_spots_njobs is Auto:
+            pipeline.find_spots_njobs = params.multiprocessing.njobs
+        if pipeline.index_njobs is Auto:
+            pipeline.index_njobs = params.multiprocessing.njobs
+        if pipeline.integrate_njobs is Auto:
+            pipeline.integrate_njobs = params.multiprocessing.njobs
+        options.pipeline = PipelineParams(
+            find_spots_njobs=pipeline.find_spots_njobs,
+            index_njobs=pipeline.index_njobs,
+            integrate_njobs=pipeline.integrate_njobs,
+            queue_size=pipeline.queue_size,
+        )
+    if params.watch.enable:
+        options.watch = WatchParams(
+            interval=params.watch.interval,
+            settle=params.watch.settle,
+            timeout=params.watch.timeout,
+        )
 
     if params.assess_crystals.images_to_use:
         if ":" not in params.assess_crystals.images_to_use:
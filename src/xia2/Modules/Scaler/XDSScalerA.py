@@ -11,6 +11,7 @@ import logging
 import os
 import shutil
 
+import xia2.Driver.cpu_budget
 from xia2.Handlers.Citations import Citations
 from xia2.Handlers.Files import FileHandler
 from xia2.Handlers.Phil import PhilIndex
@@ -694,6 +695,12 @@ class XDSScalerA(Scaler):
             mp_params = params.xia2.settings.multiprocessing
             njob = mp_params.njob
 
+            cpu_budget = xia2.Driver.cpu_budget.get_cores()
+            if cpu_budget and mp_params.type == "simple":
+                # the CPU budget stops the per-sweep programs from
+                # oversubscribing the machine, so run them side by side
+                njob = max(njob, min(cpu_budget, len(self._sweep_information)))
+
             if njob > 1:
                 # cache drivertype
                 drivertype = DriverFactory.get_driver_type()
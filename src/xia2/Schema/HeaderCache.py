@@ -0,0 +1,158 @@
+# A persistent cache of the models read from image headers, so that repeated
+# xia2 jobs (or the many processes of one parallel job) on the same images
+# need not read every header again. Entries are validated against the size
+# and modification time of every file they were read from, and of the
+# directories those files are in, so a hit costs only a few stat() calls.
+
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger("xia2.Schema.HeaderCache")
+
+# bump this whenever the format of the entries changes
+CACHE_VERSION = 1
+
+# walking the whole cache to evict entries costs far more than writing one,
+# so it is done on the first write to each cache by a process and then only
+# once the writes since add up to a fraction of the maximum size
+EVICTION_FRACTION = 1 / 16
+_written_since_eviction: dict = {}
+
+
+def default_directory():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "xia2", "headers")
+
+
+def _normalise(key):
+    # compare keys as they will be read back from the entry file
+    return json.loads(json.dumps(key, sort_keys=True, default=str))
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class HeaderCache:
+    """An on-disk cache of JSON-serialisable header models, one file per
+    entry, with the least recently used entries removed once the cache grows
+    beyond max_size bytes."""
+
+    def __init__(self, directory=None, max_size=256 * 1024 * 1024):
+        self._directory = directory or default_directory()
+        self._max_size = max_size
+
+    def get_directory(self):
+        return self._directory
+
+    def _entry_file(self, key):
+        digest = hashlib.sha256(json.dumps([CACHE_VERSION, key]).encode()).hexdigest()
+        return os.path.join(self._directory, digest[:2], digest + ".json")
+
+    def get(self, key):
+        """Return the models stored for key, or None if there are none or
+        any of the files they were read from has changed since."""
+
+        key = _normalise(key)
+        entry_file = self._entry_file(key)
+        try:
+            with open(entry_file) as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("key") != key:
+            return None
+        for path, stat in entry["files"]:
+            if _stat(path) != stat:
+                logger.debug("Header cache entry for %s is out of date", path)
+                return None
+
+        # mark the entry as recently used
+        try:
+            os.utime(entry_file)
+        except OSError:
+            pass
+        return entry["models"]
+
+    def put(self, key, models, files):
+        """
+        Store models for key.
+
+        :param key: a JSON-serialisable description of what was read
+        :param models: the JSON-serialisable models read
+        :param files: the files the models were read from - the directories
+                      containing them are checked too, to notice new files
+        """
+
+        key = _normalise(key)
+        files = sorted(set(files))
+        directories = sorted({os.path.dirname(f) for f in files})
+        entry = {
+            "key": key,
+            "files": [[f, _stat(f)] for f in directories + files],
+            "models": models,
+        }
+        if any(stat is None for _, stat in entry["files"]):
+            return
+
+        entry_file = self._entry_file(key)
+        try:
+            os.makedirs(os.path.dirname(entry_file), exist_ok=True)
+            fd, tmp_file = tempfile.mkstemp(
+                dir=os.path.dirname(entry_file), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as fh:
+                json.dump(entry, fh)
+                size = fh.tell()
+            os.replace(tmp_file, entry_file)
+        except OSError as e:
+            logger.debug("Could not write to header cache: %s", e)
+            return
+
+        written = _written_since_eviction.get(self._directory)
+        if written is None or written + size >= self._max_size * EVICTION_FRACTION:
+            self.evict()
+        else:
+            _written_since_eviction[self._directory] = written + size
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in
+        max_size."""
+
+        _written_since_eviction[self._directory] = 0
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self._directory) as subdirectories:
+                for subdirectory in subdirectories:
+                    if not subdirectory.is_dir():
+                        continue
+                    with os.scandir(subdirectory.path) as it:
+                        for entry in it:
+                            st = entry.stat()
+                            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                            total += st.st_size
+        except OSError:
+            return
+
+        entries.sort()
+        while total > self._max_size and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -10,16 +10,20 @@ from xia2.Experts.FindImages import find_matching_images
 from xia2.Handlers.Phil import PhilIndex
 
 
-def SweepFactory(template, directory, beam=None):
+def SweepFactory(template, directory, beam=None, experiments=None):
     """A factory which will return a list of sweep objects which match
-    the input template and directory."""
+    the input template and directory, from the image headers in experiments
+    if these have been read already."""
 
     sweeps = []
 
     from xia2.Schema import load_imagesets
 
     imagesets = load_imagesets(
-        template, directory, reversephi=PhilIndex.params.xia2.settings.input.reverse_phi
+        template,
+        directory,
+        reversephi=PhilIndex.params.xia2.settings.input.reverse_phi,
+        experiments=experiments,
     )
 
     for imageset in imagesets:
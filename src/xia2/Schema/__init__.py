@@ -1,14 +1,15 @@
 from __future__ import annotations
 
 import collections
+import copy
+import functools
 import glob
 import itertools
 import logging
 import os
+from importlib import metadata
 
-from dials.command_line.dials_import import ManualGeometryUpdater
-from dials.util.options import geometry_phil_scope
-from dxtbx.imageset import ImageSequence
+from dxtbx.imageset import ImageSequence, ImageSetFactory
 from dxtbx.model.experiment_list import (
     BeamComparison,
     DetectorComparison,
@@ -20,6 +21,7 @@ from dxtbx.sequence_filenames import locate_files_matching_template_string
 from scitbx.array_family import flex
 
 from xia2.Handlers.Phil import PhilIndex
+from xia2.Schema.HeaderCache import HeaderCache
 
 logger = logging.getLogger("xia2.Schema")
 
@@ -46,6 +48,188 @@ def longest_common_substring(s1, s2):
     return s1[x_longest - longest : x_longest]
 
 
+def _get_header_cache():
+    settings = PhilIndex.params.xia2.settings.input.header_cache
+    if not settings.enable:
+        return None
+    return HeaderCache(
+        directory=settings.directory, max_size=settings.max_size * 1024 * 1024
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _package_versions():
+    """The versions of the packages which read the models from the headers,
+    so that entries cached by other versions (with other format classes) are
+    not used."""
+    versions = {}
+    for package in ("dxtbx", "dials", "xia2"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def _header_cache_key(full_template_path, format_kwargs):
+    """Everything which affects the models read for a template."""
+    from xia2.Handlers.CommandLine import CommandLine
+
+    settings = PhilIndex.params.xia2.settings
+    tolerance = settings.input.tolerance
+    key = {
+        "template": os.path.abspath(full_template_path),
+        "format_kwargs": format_kwargs,
+        "tolerance": [
+            tolerance.beam.wavelength,
+            tolerance.beam.direction,
+            tolerance.beam.polarization_normal,
+            tolerance.beam.polarization_fraction,
+            tolerance.detector.fast_axis,
+            tolerance.detector.slow_axis,
+            tolerance.detector.origin,
+            tolerance.goniometer.rotation_axis,
+            tolerance.goniometer.fixed_rotation,
+            tolerance.goniometer.setting_rotation,
+            tolerance.scan.oscillation,
+        ],
+        "read_all_image_headers": settings.read_all_image_headers,
+        "versions": _package_versions(),
+    }
+    if not settings.read_all_image_headers:
+        key["start_ends"] = CommandLine.get_start_ends(full_template_path)
+    return key
+
+
+def _comparisons():
+    """The tolerances used to decide whether images belong to one sweep."""
+    tolerance = PhilIndex.params.xia2.settings.input.tolerance
+    return {
+        "compare_beam": BeamComparison(
+            wavelength_tolerance=tolerance.beam.wavelength,
+            direction_tolerance=tolerance.beam.direction,
+            polarization_normal_tolerance=tolerance.beam.polarization_normal,
+            polarization_fraction_tolerance=tolerance.beam.polarization_fraction,
+        ),
+        "compare_detector": DetectorComparison(
+            fast_axis_tolerance=tolerance.detector.fast_axis,
+            slow_axis_tolerance=tolerance.detector.slow_axis,
+            origin_tolerance=tolerance.detector.origin,
+        ),
+        "compare_goniometer": GoniometerComparison(
+            rotation_axis_tolerance=tolerance.goniometer.rotation_axis,
+            fixed_rotation_tolerance=tolerance.goniometer.fixed_rotation,
+            setting_rotation_tolerance=tolerance.goniometer.setting_rotation,
+        ),
+        "scan_tolerance": tolerance.scan.oscillation,
+    }
+
+
+def _format_kwargs():
+    params = PhilIndex.params.xia2.settings
+    # If diamond anvil cell data, always use dynamic shadowing
+    high_pressure = PhilIndex.params.dials.high_pressure.correction
+    return {
+        "dynamic_shadowing": params.input.format.dynamic_shadowing or high_pressure,
+        "multi_panel": params.input.format.multi_panel,
+    }
+
+
+def read_image_headers(paths):
+    """Read the headers of the image files paths into an ExperimentList, as
+    load_imagesets() would."""
+    unhandled = []
+    experiments = ExperimentListFactory.from_filenames(
+        paths, unhandled=unhandled, format_kwargs=_format_kwargs(), **_comparisons()
+    )
+    assert len(unhandled) == 0, "unhandled image files identified: %s" % unhandled
+    return experiments
+
+
+def image_header_chunks(full_template_path, chunk_size):
+    """
+    Split the image files of a template into chunks of at most chunk_size
+    files, for their headers to be read separately with read_image_headers()
+    and joined up again with join_image_headers().
+
+    :return: the chunks, or None if load_imagesets() would not read the
+             headers of the files one by one, or they are in the header cache
+    """
+
+    from xia2.Applications.xia2setup import known_hdf5_extensions
+
+    if os.path.splitext(full_template_path)[-1] in known_hdf5_extensions:
+        return None
+    if not PhilIndex.params.xia2.settings.read_all_image_headers:
+        return None
+    header_cache = _get_header_cache()
+    if header_cache is not None:
+        cache_key = _header_cache_key(full_template_path, _format_kwargs())
+        if header_cache.get(cache_key) is not None:
+            return None
+    paths = sorted(locate_files_matching_template_string(full_template_path))
+    return [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+
+def join_image_headers(chunks):
+    """Join up the experiments read from consecutive chunks of the files of a
+    template, where a sweep was split between two chunks."""
+
+    comparisons = _comparisons()
+    imagesets = []
+    for experiments in chunks:
+        for n, imageset in enumerate(experiments.imagesets()):
+            if n == 0 and imagesets:
+                joined = _join_sequences(imagesets[-1], imageset, comparisons)
+                if joined is not None:
+                    imagesets[-1] = joined
+                    continue
+            imagesets.append(imageset)
+
+    experiments = ExperimentList()
+    for imageset in imagesets:
+        experiments.extend(
+            ExperimentListFactory.from_imageset_and_crystal(imageset, None)
+        )
+    return experiments
+
+
+def _join_sequences(first, second, comparisons):
+    """The two image sequences as one, or None if the second does not carry
+    on from the first as ExperimentListFactory.from_filenames() would have
+    found, had it read the files of both together."""
+
+    if not (
+        isinstance(first, ImageSequence)
+        and isinstance(second, ImageSequence)
+        and first.get_template() == second.get_template()
+        and comparisons["compare_beam"](first.get_beam(), second.get_beam())
+        and comparisons["compare_detector"](first.get_detector(), second.get_detector())
+        and comparisons["compare_goniometer"](
+            first.get_goniometer(), second.get_goniometer()
+        )
+    ):
+        return None
+    scan = copy.deepcopy(first.get_scan())
+    if scan.get_image_range()[1] + 1 != second.get_scan().get_image_range()[0]:
+        return None
+    try:
+        scan.append(second.get_scan(), scan_tolerance=comparisons["scan_tolerance"])
+    except RuntimeError:
+        return None
+    start, end = scan.get_image_range()
+    return ImageSetFactory.make_sequence(
+        first.get_template(),
+        list(range(start, end + 1)),
+        format_class=first.get_format_class(),
+        beam=first.get_beam(),
+        detector=first.get_detector(),
+        goniometer=first.get_goniometer(),
+        scan=scan,
+        format_kwargs=_format_kwargs(),
+    )
+
+
 def load_imagesets(
     template,
     directory,
@@ -53,40 +237,36 @@ def load_imagesets(
     image_range=None,
     use_cache=True,
     reversephi=False,
+    experiments=None,
 ):
     global imageset_cache
     from xia2.Applications.xia2setup import known_hdf5_extensions
 
     full_template_path = os.path.join(directory, template)
 
-    if full_template_path not in imageset_cache or not use_cache:
-        params = PhilIndex.params.xia2.settings
-        compare_beam = BeamComparison(
-            wavelength_tolerance=params.input.tolerance.beam.wavelength,
-            direction_tolerance=params.input.tolerance.beam.direction,
-            polarization_normal_tolerance=params.input.tolerance.beam.polarization_normal,
-            polarization_fraction_tolerance=params.input.tolerance.beam.polarization_fraction,
-        )
-        compare_detector = DetectorComparison(
-            fast_axis_tolerance=params.input.tolerance.detector.fast_axis,
-            slow_axis_tolerance=params.input.tolerance.detector.slow_axis,
-            origin_tolerance=params.input.tolerance.detector.origin,
-        )
-        compare_goniometer = GoniometerComparison(
-            rotation_axis_tolerance=params.input.tolerance.goniometer.rotation_axis,
-            fixed_rotation_tolerance=params.input.tolerance.goniometer.fixed_rotation,
-            setting_rotation_tolerance=params.input.tolerance.goniometer.setting_rotation,
-        )
-        scan_tolerance = params.input.tolerance.scan.oscillation
-
-        # If diamond anvil cell data, always use dynamic shadowing
-        high_pressure = PhilIndex.params.dials.high_pressure.correction
-        format_kwargs = {
-            "dynamic_shadowing": params.input.format.dynamic_shadowing or high_pressure,
-            "multi_panel": params.input.format.multi_panel,
-        }
-
-        if os.path.splitext(full_template_path)[-1] in known_hdf5_extensions:
+    # headers read by the caller replace whatever was read before
+    if (
+        full_template_path not in imageset_cache
+        or not use_cache
+        or experiments is not None
+    ):
+        format_kwargs = _format_kwargs()
+
+        # look for the models from an earlier read of the same images
+        header_cache = _get_header_cache()
+        models = None
+        if header_cache is not None:
+            cache_key = _header_cache_key(full_template_path, format_kwargs)
+            if experiments is None:
+                models = header_cache.get(cache_key)
+
+        if experiments is not None:
+            # read by the caller, perhaps in chunks - see image_header_chunks()
+            pass
+        elif models is not None:
+            logger.debug("Using cached image headers for %s", full_template_path)
+            experiments = ExperimentListFactory.from_dict(models)
+        elif os.path.splitext(full_template_path)[-1] in known_hdf5_extensions:
             # if we are passed the correct file, use this, else look for a master
             # file (i.e. something_master.h5)
 
@@ -109,20 +289,7 @@ def load_imagesets(
             if master_file is None:
                 raise RuntimeError("Can't find master file for %s" % full_template_path)
 
-            unhandled = []
-            experiments = ExperimentListFactory.from_filenames(
-                [master_file],
-                unhandled=unhandled,
-                compare_beam=compare_beam,
-                compare_detector=compare_detector,
-                compare_goniometer=compare_goniometer,
-                scan_tolerance=scan_tolerance,
-                format_kwargs=format_kwargs,
-            )
-
-            assert len(unhandled) == 0, (
-                "unhandled image files identified: %s" % unhandled
-            )
+            experiments = read_image_headers([master_file])
 
         else:
             params = PhilIndex.get_python_object()
@@ -132,19 +299,7 @@ def load_imagesets(
                 paths = sorted(
                     locate_files_matching_template_string(full_template_path)
                 )
-                unhandled = []
-                experiments = ExperimentListFactory.from_filenames(
-                    paths,
-                    unhandled=unhandled,
-                    compare_beam=compare_beam,
-                    compare_detector=compare_detector,
-                    compare_goniometer=compare_goniometer,
-                    scan_tolerance=scan_tolerance,
-                    format_kwargs=format_kwargs,
-                )
-                assert len(unhandled) == 0, (
-                    "unhandled image files identified: %s" % unhandled
-                )
+                experiments = read_image_headers(paths)
 
             else:
                 from xia2.Handlers.CommandLine import CommandLine
@@ -162,6 +317,13 @@ def load_imagesets(
                         )
                     )
 
+        if header_cache is not None and models is None:
+            header_cache.put(
+                cache_key,
+                experiments.to_dict(),
+                [path for iset in experiments.imagesets() for path in iset.paths()],
+            )
+
         imagesets = [
             iset for iset in experiments.imagesets() if isinstance(iset, ImageSequence)
         ]
@@ -183,7 +345,11 @@ def load_imagesets(
         params = PhilIndex.params.xia2.settings
         update_geometry = []
 
-        # Then add manual geometry
+        # Then add manual geometry (dials.import is slow to import, so only
+        # imported here where it is needed)
+        from dials.command_line.dials_import import ManualGeometryUpdater
+        from dials.util.options import geometry_phil_scope
+
         work_phil = geometry_phil_scope.format(params.input)
         diff_phil = geometry_phil_scope.fetch_diff(source=work_phil)
         if diff_phil.as_str() != "":
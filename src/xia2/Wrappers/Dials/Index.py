@@ -200,6 +200,13 @@ def Index(DriverType=None):
             self.add_command_line("output.experiments=%s" % self._experiment_filename)
             self.add_command_line("output.reflections=%s" % self._indexed_filename)
 
+            for f in self._sweep_filenames + self._spot_filenames:
+                self.add_input_file(f)
+            if self._phil_file is not None:
+                self.add_input_file(self._phil_file)
+            self.add_output_file(self._experiment_filename)
+            self.add_output_file(self._indexed_filename)
+
             self.start()
             self.close_wait()
 
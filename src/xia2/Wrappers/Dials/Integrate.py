@@ -202,6 +202,14 @@ def Integrate(DriverType=None):
                     "gaussian_rs.min_spots.overall=%d" % self._min_spots_overall
                 )
 
+            self.add_input_file(self._experiments_filename)
+            self.add_input_file(self._reflections_filename)
+            if self._phil_file is not None:
+                self.add_input_file(self._phil_file)
+            self.add_output_file(self._integrated_experiments)
+            self.add_output_file(self._integrated_reflections)
+            self.add_output_file(self._integration_report_filename)
+
             self.start()
             self.close_wait()
 
@@ -148,6 +148,17 @@ def Spotfinder(DriverType=None):
                 self.add_command_line(
                     "maximum_trusted_value=%f" % self._maximum_trusted_value
                 )
+
+            self.add_input_file(self._input_sweep_filename)
+            if self._phil_file is not None:
+                self.add_input_file(self._phil_file)
+            # the hot mask files are not known in advance, so only declare
+            # the outputs (and allow the results to be cached) without them
+            if not self._write_hot_mask:
+                self.add_output_file(self._input_spot_filename)
+                if self._output_sweep_filename is not None:
+                    self.add_output_file(self._output_sweep_filename)
+
             self.start()
             self.close_wait()
             self.check_for_errors()
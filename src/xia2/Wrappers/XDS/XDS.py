@@ -3,11 +3,12 @@ from __future__ import annotations
 import datetime
 import logging
 import os
-import subprocess
 import time
 
 from scitbx import matrix
 
+from xia2.Driver.DriverHelper import probe_executable
+
 logger = logging.getLogger("xia2.Wrappers.XDS.XDS")
 
 
@@ -25,8 +26,8 @@ _xds_version_cache = None
 def get_xds_version():
     global _xds_version_cache
     if _xds_version_cache is None:
-        xds_version_str = subprocess.check_output("xds")
-        assert b"VERSION" in xds_version_str
+        xds_version_str = probe_executable("xds")
+        assert xds_version_str and b"VERSION" in xds_version_str
         first_line = xds_version_str.split(b"\n")[1].strip().decode("latin-1")
 
         _xds_version_cache = str(first_line.split("(")[1].split(")")[0])
@@ -41,9 +42,9 @@ _running_xds_version_stamp = None
 def _running_xds_version():
     global _running_xds_version_stamp
     if _running_xds_version_stamp is None:
-        xds_version_str = subprocess.check_output("xds")
-        assert b"VERSION" in xds_version_str
-        first_line = xds_version_str.split("\n")[1].strip().decode("latin-1")
+        xds_version_str = probe_executable("xds")
+        assert xds_version_str and b"VERSION" in xds_version_str
+        first_line = xds_version_str.split(b"\n")[1].strip().decode("latin-1")
         if b"BUILT=" not in xds_version_str:
             format_str = "***** XDS *****  (VERSION  %B %d, %Y)"
             date = datetime.datetime.strptime(first_line, format_str)
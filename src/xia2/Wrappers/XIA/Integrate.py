@@ -40,6 +40,15 @@ def Integrate(DriverType=None):
         def run(self):
             logger.debug("Running xia2.integrate")
 
+            self.set_up()
+            self.start()
+            self.close_wait()
+            self.check_output()
+
+        def set_up(self):
+            """Set up the command line - separate from run() so that the job
+            can be run in other ways, e.g. as part of an array job."""
+
             self.clear_command_line()
 
             if self._phil_file is not None:
@@ -59,8 +68,7 @@ def Integrate(DriverType=None):
 
             self.add_command_line("failover=False")
 
-            self.start()
-            self.close_wait()
+        def check_output(self):
             self.check_for_errors()
             for line in self.get_all_output():
                 if "Status: error" in line:
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+from xia2.Driver.result_cache import ResultCache
+from xia2.Driver.timing import readable_size
+
+
+def run(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(
+        prog="xia2.cache",
+        description="Inspect or prune the cache of program results kept by "
+        "xia2 with result_cache.enable=True",
+    )
+    parser.add_argument(
+        "--directory", help="The cache directory, if not the default location"
+    )
+    subparsers = parser.add_subparsers(dest="action")
+    subparsers.add_parser("list", help="List the cached results (the default)")
+    prune = subparsers.add_parser(
+        "prune", help="Remove the least recently used results"
+    )
+    prune.add_argument(
+        "--max-size",
+        type=float,
+        required=True,
+        help="Remove results until the cache is no bigger than this, in MB",
+    )
+    subparsers.add_parser("clear", help="Remove all cached results")
+    args = parser.parse_args(args)
+
+    cache = ResultCache(directory=args.directory)
+
+    if args.action == "prune":
+        removed = cache.prune(max_size=args.max_size * 1024 * 1024)
+        print(
+            "Removed %d results, %s"
+            % (len(removed), readable_size(sum(entry["size"] for entry in removed)))
+        )
+    elif args.action == "clear":
+        removed = cache.prune(max_size=0)
+        print("Removed %d results" % len(removed))
+    else:
+        entries = cache.entries()
+        print("Cache directory: %s" % cache.get_directory())
+        for entry in entries:
+            print(
+                "%s %8s  %s"
+                % (
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"])),
+                    readable_size(entry["size"]),
+                    entry["command"],
+                )
+            )
+        print(
+            "%d results, %s in total"
+            % (len(entries), readable_size(sum(entry["size"] for entry in entries)))
+        )
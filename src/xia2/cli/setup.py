@@ -5,14 +5,9 @@ import os
 import sys
 import traceback
 
-from dials.util import Sorry
-from dials.util.version import dials_version
-
 import xia2.Driver.timing
 import xia2.Handlers.Streams
 import xia2.XIA2Version
-from xia2.Applications.xia2_main import check_environment, get_command_line, help
-from xia2.Handlers.Citations import Citations
 
 from .xia2_main import get_ccp4_version
 
@@ -21,6 +16,11 @@ logger = logging.getLogger("xia2.cli.setup")
 
 def xia2_setup():
     """Actually process something..."""
+    from dials.util.version import dials_version
+
+    from xia2.Applications.xia2_main import get_command_line
+    from xia2.Handlers.Citations import Citations
+
     Citations.cite("xia2")
 
     # print versions of related software
@@ -51,11 +51,15 @@ def xia2_setup():
 
 
 def run():
+    from xia2.Applications.xia2_main import help
+
     if len(sys.argv) < 2 or "-help" in sys.argv or "--help" in sys.argv:
         help()
         sys.exit()
 
     if "-version" in sys.argv or "--version" in sys.argv:
+        from dials.util.version import dials_version
+
         print(xia2.XIA2Version.Version)
         print(dials_version())
         ccp4_version = get_ccp4_version()
@@ -63,6 +67,10 @@ def run():
             print("CCP4 %s" % ccp4_version)
         sys.exit()
 
+    from dials.util import Sorry
+
+    from xia2.Applications.xia2_main import check_environment
+
     xia2.Handlers.Streams.setup_logging(logfile="xia2.txt", debugfile="xia2-debug.txt")
 
     try:
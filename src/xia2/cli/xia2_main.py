@@ -6,24 +6,13 @@ import sys
 import time
 import traceback
 
-from dials.util import Sorry
-from dials.util.version import dials_version
-from libtbx import group_args
-
+import xia2.Driver.profiler
 import xia2.Driver.timing
 import xia2.Handlers.Streams
 import xia2.XIA2Version
-from xia2.Applications.xia2_helpers import process_one_sweep
-from xia2.Applications.xia2_main import (
-    check_environment,
-    get_command_line,
-    help,
-    write_citations,
-)
-from xia2.Handlers.Citations import Citations
-from xia2.Handlers.Files import cleanup
-from xia2.Schema.XProject import XProject
-from xia2.Schema.XSweep import XSweep
+
+# the rest of xia2, and dials, are imported where they are needed so that
+# e.g. xia2 --help need not wait for them
 
 logger = logging.getLogger("xia2.cli.xia2_main")
 
@@ -39,6 +28,19 @@ def get_ccp4_version():
 
 def xia2_main(stop_after=None):
     """Actually process something..."""
+    from dials.util.version import dials_version
+    from libtbx import group_args
+
+    from xia2.Applications.xia2_helpers import (
+        process_one_sweep,
+        process_sweeps_as_array_job,
+    )
+    from xia2.Applications.xia2_main import get_command_line, write_citations
+    from xia2.Handlers.Citations import Citations
+    from xia2.Handlers.Files import cleanup
+    from xia2.Schema.XProject import XProject
+    from xia2.Schema.XSweep import XSweep
+
     Citations.cite("xia2")
 
     # print versions of related software
@@ -165,30 +167,34 @@ def xia2_main(stop_after=None):
                             )
                         )
 
-            from xia2.Driver.DriverFactory import DriverFactory
-
-            default_driver_type = DriverFactory.get_driver_type()
-
-            # run every nth job on the current computer (no need to submit to qsub)
-            for i_job, arg in enumerate(jobs):
-                if (i_job % njob) == 0:
-                    arg[0].driver_type = default_driver_type
-
-            nproc = mp_params.nproc
-            qsub_command = mp_params.qsub_command or "qsub"
-            qsub_command = "%s -V -cwd -pe smp %d" % (qsub_command, nproc)
-
-            from libtbx import easy_mp
-
-            results = easy_mp.parallel_map(
-                process_one_sweep,
-                jobs,
-                processes=njob,
-                method="multiprocessing",
-                qsub_command=qsub_command,
-                preserve_order=True,
-                preserve_exception_message=True,
-            )
+            if driver_type == "qsub" and mp_params.array_job:
+                # one submission for all of the sweeps
+                results = process_sweeps_as_array_job(jobs)
+            else:
+                from xia2.Driver.DriverFactory import DriverFactory
+
+                default_driver_type = DriverFactory.get_driver_type()
+
+                # run every nth job on the current computer (no need to submit to qsub)
+                for i_job, arg in enumerate(jobs):
+                    if (i_job % njob) == 0:
+                        arg[0].driver_type = default_driver_type
+
+                nproc = mp_params.nproc
+                qsub_command = mp_params.qsub_command or "qsub"
+                qsub_command = "%s -V -cwd -pe smp %d" % (qsub_command, nproc)
+
+                from libtbx import easy_mp
+
+                results = easy_mp.parallel_map(
+                    process_one_sweep,
+                    jobs,
+                    processes=njob,
+                    method="multiprocessing",
+                    qsub_command=qsub_command,
+                    preserve_order=True,
+                    preserve_exception_message=True,
+                )
 
             # Hack to update sweep with the serialized indexers/refiners/integraters
             i_sweep = 0
@@ -299,11 +305,15 @@ def xia2_main(stop_after=None):
 
 
 def run():
+    from xia2.Applications.xia2_main import help
+
     if len(sys.argv) < 2 or "-help" in sys.argv or "--help" in sys.argv:
         help()
         sys.exit()
 
     if "-version" in sys.argv or "--version" in sys.argv:
+        from dials.util.version import dials_version
+
         print(xia2.XIA2Version.Version)
         print(dials_version())
         ccp4_version = get_ccp4_version()
@@ -311,6 +321,10 @@ def run():
             print("CCP4 %s" % ccp4_version)
         sys.exit()
 
+    from dials.util import Sorry
+
+    from xia2.Applications.xia2_main import check_environment
+
     xia2.Handlers.Streams.setup_logging(logfile="xia2.txt", debugfile="xia2-debug.txt")
 
     try:
@@ -331,6 +345,7 @@ def run():
         xia2_main()
         logger.debug("\nTiming report:")
         logger.debug("\n".join(xia2.Driver.timing.report()))
+        xia2.Driver.timing.write_trace("xia2-trace.json")
         logger.info("Status: normal termination")
         return
     except Sorry as s:
@@ -346,3 +361,6 @@ def run():
         )
         logger.warning("xia2.support@gmail.com")
         sys.exit(1)
+    finally:
+        # write out the profile, if one was asked for, whatever happened
+        xia2.Driver.profiler.stop(os.path.join(wd, "xia2-profile"))
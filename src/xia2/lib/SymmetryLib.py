@@ -18,41 +18,43 @@
 
 from __future__ import annotations
 
+import functools
 import os
 
 
+_lattice_to_spacegroup = {
+    "aP": 1,
+    "mP": 3,
+    "mC": 5,
+    "mI": 5,
+    "oP": 16,
+    "oC": 20,
+    "oF": 22,
+    "oI": 23,
+    "tP": 75,
+    "tI": 79,
+    "hP": 143,
+    "hR": 146,
+    "cP": 195,
+    "cF": 196,
+    "cI": 197,
+}
+
+
 def lattice_to_spacegroup(lattice):
     """Convert a lattice e.g. tP into the minimal spacegroup number
     to represent this."""
 
-    _lattice_to_spacegroup = {
-        "aP": 1,
-        "mP": 3,
-        "mC": 5,
-        "mI": 5,
-        "oP": 16,
-        "oC": 20,
-        "oF": 22,
-        "oI": 23,
-        "tP": 75,
-        "tI": 79,
-        "hP": 143,
-        "hR": 146,
-        "cP": 195,
-        "cF": 196,
-        "cI": 197,
-    }
-
     if lattice not in _lattice_to_spacegroup:
         raise RuntimeError('lattice "%s" unknown' % lattice)
 
     return _lattice_to_spacegroup[lattice]
 
 
-def spacegroup_name_xHM_to_old(xHM):
-    """Convert to an old name."""
-
-    # generate mapping table
+@functools.lru_cache(maxsize=None)
+def _read_syminfo(syminfo):
+    """Read the mapping of xHM to old spacegroup names, and the set of old
+    names, from syminfo.lib - once per process, as it does not change."""
 
     mapping = {}
     current_old = ""
@@ -60,7 +62,6 @@ def spacegroup_name_xHM_to_old(xHM):
 
     old_names = set()
 
-    syminfo = os.path.join(os.environ["CCP4"], "lib", "data", "syminfo.lib")
     with open(syminfo) as fh:
         for line in fh.readlines():
             if line[0] == "#":
@@ -76,6 +77,15 @@ def spacegroup_name_xHM_to_old(xHM):
                 mapping[current_xHM] = current_old
                 old_names.add(current_old)
 
+    return mapping, frozenset(old_names)
+
+
+def spacegroup_name_xHM_to_old(xHM):
+    """Convert to an old name."""
+
+    syminfo = os.path.join(os.environ["CCP4"], "lib", "data", "syminfo.lib")
+    mapping, old_names = _read_syminfo(syminfo)
+
     xHM = xHM.upper()
 
     if xHM not in mapping:
@@ -134,52 +144,53 @@ def sort_lattices(lattices):
     return ordered_lattices
 
 
+# this has been calculated from the results of Ralf GK's sginfo and a
+# little fiddling...
+#
+# 19/feb/08 added mI record as pointless has started producing this -
+# why??? this is not a "real" spacegroup... may be able to switch this
+# off...
+#                             'I2/m': 'mI',
+
+_lauegroup_to_lattice = {
+    "Ammm": "oA",
+    "C2/m": "mC",
+    "Cmmm": "oC",
+    "Fm-3": "cF",
+    "Fm-3m": "cF",
+    "Fmmm": "oF",
+    "H-3": "hR",
+    "H-3m": "hR",
+    "R-3:H": "hR",
+    "R-3m:H": "hR",
+    "I4/m": "tI",
+    "I4/mmm": "tI",
+    "Im-3": "cI",
+    "Im-3m": "cI",
+    "Immm": "oI",
+    "P-1": "aP",
+    "P-3": "hP",
+    "P-3m": "hP",
+    "P2/m": "mP",
+    "P4/m": "tP",
+    "P4/mmm": "tP",
+    "P6/m": "hP",
+    "P6/mmm": "hP",
+    "Pm-3": "cP",
+    "Pm-3m": "cP",
+    "Pmmm": "oP",
+}
+
+
 def lauegroup_to_lattice(lauegroup):
     """Convert a Laue group representation (from pointless, e.g. I m m m)
     to something useful, like the implied crystal lattice (in this
     case, oI.)"""
 
-    # this has been calculated from the results of Ralf GK's sginfo and a
-    # little fiddling...
-    #
-    # 19/feb/08 added mI record as pointless has started producing this -
-    # why??? this is not a "real" spacegroup... may be able to switch this
-    # off...
-    #                             'I2/m': 'mI',
-
-    lauegroup_to_lattice = {
-        "Ammm": "oA",
-        "C2/m": "mC",
-        "Cmmm": "oC",
-        "Fm-3": "cF",
-        "Fm-3m": "cF",
-        "Fmmm": "oF",
-        "H-3": "hR",
-        "H-3m": "hR",
-        "R-3:H": "hR",
-        "R-3m:H": "hR",
-        "I4/m": "tI",
-        "I4/mmm": "tI",
-        "Im-3": "cI",
-        "Im-3m": "cI",
-        "Immm": "oI",
-        "P-1": "aP",
-        "P-3": "hP",
-        "P-3m": "hP",
-        "P2/m": "mP",
-        "P4/m": "tP",
-        "P4/mmm": "tP",
-        "P6/m": "hP",
-        "P6/mmm": "hP",
-        "Pm-3": "cP",
-        "Pm-3m": "cP",
-        "Pmmm": "oP",
-    }
-
     updated_laue = ""
 
     for l in lauegroup.split():
         if not l == "1":
             updated_laue += l
 
-    return lauegroup_to_lattice[updated_laue]
+    return _lauegroup_to_lattice[updated_laue]
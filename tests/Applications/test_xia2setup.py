@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import subprocess
+import time
 
 import pytest
 
@@ -98,3 +99,71 @@ def test_write_xinfo_unroll(dials_data, tmp_path):
     assert x.get_crystals()["DEFAULT"]["sweeps"]["SWEEP1"]["start_end"] == [1, 15]
     assert x.get_crystals()["DEFAULT"]["sweeps"]["SWEEP2"]["start_end"] == [16, 30]
     assert x.get_crystals()["DEFAULT"]["sweeps"]["SWEEP3"]["start_end"] == [31, 45]
+
+
+def test_find_images_lists_only_changed_directories(tmp_path, mocker):
+    from xia2.Applications import xia2setup
+    from xia2.Applications.xia2setup_index import ScanIndex
+
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        for i in (1, 2, 3, 5):
+            (tmp_path / name / f"{name}_1_{i:04d}.cbf").touch()
+    for path in (tmp_path, tmp_path / "a", tmp_path / "b"):
+        os.utime(path, ns=(0, 10**9))
+    filename = str(tmp_path.parent / f"{tmp_path.name}-scan-index.json")
+
+    expected = {
+        str(tmp_path / "a" / "a_1_####.cbf"): [[1, 3], [5, 5]],
+        str(tmp_path / "b" / "b_1_####.cbf"): [[1, 3], [5, 5]],
+    }
+    found = xia2setup._find_images([str(tmp_path)], index=ScanIndex(filename))
+    assert found == expected
+
+    visit = mocker.spy(xia2setup, "_visit")
+    (tmp_path / "b" / "b_1_0004.cbf").touch()
+    found = xia2setup._find_images([str(tmp_path)], index=ScanIndex(filename))
+    assert found == dict(expected, **{str(tmp_path / "b" / "b_1_####.cbf"): [[1, 5]]})
+    assert [call.args[0] for call in visit.call_args_list] == [str(tmp_path / "b")]
+
+
+def test_watch_rereads_template_which_has_grown(dials_data, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+
+    def link(first, last):
+        for j in range(first, last + 1):
+            images.joinpath(f"insulin_1_{j:03d}.img").symlink_to(
+                dials_data("insulin", pathlib=True) / f"insulin_1_{j:03d}.img"
+            )
+
+    link(1, 20)
+    xinfo = tmp_path / "automatic.xinfo"
+    process = subprocess.Popen(
+        [
+            "xia2.setup",
+            f"directory={images}",
+            "watch.enable=True",
+            "watch.interval=0.5",
+            "watch.settle=0",
+            "watch.timeout=5",
+        ],
+        env={"CCP4": tmp_path, **os.environ},
+        cwd=tmp_path,
+    )
+    try:
+        for _ in range(120):
+            if xinfo.is_file():
+                break
+            time.sleep(0.5)
+        x = XInfo(xinfo)
+        assert x.get_crystals()["DEFAULT"]["sweeps"]["SWEEP1"]["start_end"] == [1, 20]
+
+        # the template grows between one poll and the next
+        link(21, 45)
+        assert process.wait(timeout=120) == 0
+    finally:
+        process.kill()
+    x = XInfo(xinfo)
+    assert len(x.get_crystals()["DEFAULT"]["sweeps"]) == 1
+    assert x.get_crystals()["DEFAULT"]["sweeps"]["SWEEP1"]["start_end"] == [1, 45]
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import os
+
+from xia2.Applications.xia2setup_index import ScanIndex, directory_stat, image_ranges
+
+
+def test_image_ranges():
+    assert image_ranges([]) == []
+    assert image_ranges([3, 1, 2, 5, 7, 6, 2]) == [[1, 3], [5, 7]]
+
+
+def test_scan_index_round_trip(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "image_001.cbf").touch()
+    # not so recently modified that the index can not trust it
+    os.utime(images, ns=(0, 10**9))
+    found = {str(images / "image_###.cbf"): [[1, 1]]}
+
+    index = ScanIndex(str(tmp_path / "setup" / "scan-index.json"))
+    assert index.lookup(str(images)) is None
+    index.update(str(images), directory_stat(str(images)), 100, found, ["sub"])
+    index.save()
+
+    index = ScanIndex(str(tmp_path / "setup" / "scan-index.json"))
+    entry = index.lookup(str(images))
+    assert entry["images"] == found
+    assert entry["subdirectories"] == ["sub"]
+
+    # a new file in the directory invalidates the entry
+    (images / "image_002.cbf").touch()
+    assert index.lookup(str(images)) is None
+
+
+def test_scan_index_distrusts_recently_modified_directories(tmp_path):
+    stat = directory_stat(str(tmp_path))
+    index = ScanIndex(str(tmp_path / "scan-index.json"))
+    index.update(str(tmp_path), stat, stat[1] / 1e9, {}, [])
+    assert index.lookup(str(tmp_path)) is None
+
+
+def test_scan_index_drops_directories_no_longer_searched(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        os.utime(tmp_path / name, ns=(0, 10**9))
+    filename = str(tmp_path / "scan-index.json")
+
+    index = ScanIndex(filename)
+    for name in ("a", "b"):
+        path = str(tmp_path / name)
+        index.update(path, directory_stat(path), 100, {}, [])
+    index.save()
+
+    index = ScanIndex(filename)
+    assert index.lookup(str(tmp_path / "a")) is not None
+    index.save()
+
+    index = ScanIndex(filename)
+    assert index.lookup(str(tmp_path / "a")) is not None
+    assert index.lookup(str(tmp_path / "b")) is None
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from xia2.Driver import DriverHelper
+
+
+@pytest.fixture
+def empty_executable_cache():
+    DriverHelper.clear_executable_cache()
+    yield
+    DriverHelper.clear_executable_cache()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX shell scripts only")
+def test_executable_lookups_are_cached_per_path(
+    tmp_path, monkeypatch, empty_executable_cache
+):
+    first = tmp_path / "first"
+    second = tmp_path / "second"
+    for directory in (first, second):
+        directory.mkdir()
+        program = directory / "xia2_test_program"
+        program.write_text("#!/bin/sh\necho %s\n" % directory.name)
+        program.chmod(0o755)
+    (first / "xia2_test_directory").mkdir()
+
+    monkeypatch.setenv("PATH", os.pathsep.join([str(first), str(second)]))
+    assert DriverHelper.executable_exists("xia2_test_program") == str(
+        first / "xia2_test_program"
+    )
+    assert DriverHelper.executable_exists("xia2_test_directory") == ""
+    assert DriverHelper.probe_executable("xia2_test_program") == b"first\n"
+
+    # the results are cached: removing the program is not noticed...
+    (first / "xia2_test_program").unlink()
+    assert DriverHelper.executable_exists("xia2_test_program") == str(
+        first / "xia2_test_program"
+    )
+    assert DriverHelper.probe_executable("xia2_test_program") == b"first\n"
+
+    # ...until the cache is cleared
+    DriverHelper.clear_executable_cache()
+    assert DriverHelper.executable_exists("xia2_test_program") == str(
+        second / "xia2_test_program"
+    )
+    assert DriverHelper.probe_executable("xia2_test_program") == b"second\n"
+
+    # or PATH is changed
+    (first / "xia2_test_program").write_text("#!/bin/sh\necho first\n")
+    (first / "xia2_test_program").chmod(0o755)
+    monkeypatch.setenv("PATH", str(first))
+    assert DriverHelper.executable_exists("xia2_test_program") == str(
+        first / "xia2_test_program"
+    )
+    assert DriverHelper.probe_executable("xia2_test_program") == b"first\n"
+    assert DriverHelper.probe_executable("xia2_no_such_program") is None
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import xia2.Driver.QSubDriver
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="queue stubs need bash")
+
+# a stub Grid Engine: qsub runs the job script (or each task of an array job)
+# as local background processes, qstat lists the jobs which are still queued;
+# both count how often they have been called
+QSUB = """#!/bin/bash
+echo x >> "$QUEUE_STUB.qsub"
+script="${@: -1}"
+name=$(basename "$script")
+job_id=$(date +%N)$RANDOM
+touch "$QUEUE_STUB/$job_id"
+tasks=""
+while [ $# -gt 1 ]; do
+  [ "$1" = "-t" ] && range=$2 && tasks=$(seq ${2#1-})
+  shift
+done
+if [ -n "$tasks" ]; then
+  echo "Your job-array $job_id.$range:1 (\\"$name\\") has been submitted"
+else
+  echo "Your job $job_id (\\"$name\\") has been submitted"
+fi
+(
+  if [ -z "$tasks" ]; then
+    bash "$script" > "$name.o$job_id" 2> "$name.e$job_id"
+  else
+    for task in $tasks; do
+      SGE_TASK_ID=$task bash "$script" > "$name.o$job_id.$task" 2> "$name.e$job_id.$task" &
+    done
+    wait
+  fi
+  sleep 3
+  rm -f "$QUEUE_STUB/$job_id"
+) > /dev/null 2>&1 &
+"""
+
+QSTAT = """#!/bin/bash
+echo x >> "$QUEUE_STUB.qstat"
+for job in "$QUEUE_STUB"/*; do
+  [ -e "$job" ] && echo " $(basename "$job") 0.50000 Jjob user r"
+done
+exit 0
+"""
+
+
+@pytest.fixture
+def queue_stub(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name, script in (("qsub", QSUB), ("qstat", QSTAT)):
+        (bin_dir / name).write_text(script)
+        (bin_dir / name).chmod(0o755)
+    queue = tmp_path / "queue"
+    queue.mkdir()
+    monkeypatch.setenv("PATH", str(bin_dir) + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("QUEUE_STUB", str(queue))
+    monkeypatch.setattr(xia2.Driver.QSubDriver, "get_qsub_command", lambda: None)
+    monkeypatch.setattr(xia2.Driver.QSubDriver, "job_monitor", _fast_monitor())
+    return queue
+
+
+def _fast_monitor():
+    return xia2.Driver.QSubDriver.JobMonitor(min_interval=0.05, max_interval=0.5)
+
+
+def _job(working_directory, text, delay=0.5):
+    d = xia2.Driver.QSubDriver.QSubDriver()
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(working_directory))
+    d.add_command_line(
+        ["-c", "import sys, time; time.sleep(%s); print(input())" % delay]
+    )
+    d.start()
+    d.input(text)
+    return d
+
+
+def _run_job(working_directory, text, results):
+    d = _job(working_directory, text)
+    d.close_wait()
+    results[text] = d.get_all_output()
+
+
+def test_qsub_driver_runs_concurrent_jobs(tmp_path, queue_stub):
+    start = time.time()
+    results = {}
+    threads = [
+        threading.Thread(target=_run_job, args=(tmp_path, "job%d" % j, results))
+        for j in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for j in range(4):
+        assert results["job%d" % j][0] == "job%d\n" % j
+    # the stub keeps jobs queued for a while after they have finished, so
+    # the drivers must have been woken by the .xstatus files
+    assert time.time() - start < 2.5
+    assert list(queue_stub.iterdir())
+
+
+def test_job_monitor_polls_qstat_for_all_jobs(tmp_path, queue_stub):
+    monitor = xia2.Driver.QSubDriver.job_monitor
+    for name in ("1", "2", "3"):
+        (queue_stub / name).touch()
+
+    timers = [
+        threading.Timer(0.3 * j, (queue_stub / name).unlink)
+        for j, name in enumerate(("1", "2", "3"), start=1)
+    ]
+    waiters = [
+        threading.Thread(target=monitor.wait, args=(name,)) for name in ("1", "2", "3")
+    ]
+    for t in timers + waiters:
+        t.start()
+    for t in waiters:
+        t.join(timeout=10)
+        assert not t.is_alive()
+
+    # one qstat call per poll, not one per job per poll
+    polls = (tmp_path / "queue.qstat").read_text().count("x")
+    assert polls < 30
+
+
+def test_array_job_collects_tasks_as_they_finish(tmp_path, queue_stub):
+    drivers = []
+    for j, delay in enumerate((1.5, 0.2, 0.8)):
+        working_directory = tmp_path / ("sweep%d" % j)
+        working_directory.mkdir()
+        drivers.append(_job(working_directory, "task%d" % j, delay))
+
+    finished = []
+
+    def callback(index, driver):
+        driver.close_wait()
+        finished.append((index, driver.get_all_output()[0]))
+
+    xia2.Driver.QSubDriver.run_array_job(drivers, str(tmp_path), callback)
+
+    assert finished == [(1, "task1\n"), (2, "task2\n"), (0, "task0\n")]
+    assert (tmp_path / "queue.qsub").read_text() == "x\n"
+    assert len(list((tmp_path / "jobs").glob("*.manifest"))) == 1
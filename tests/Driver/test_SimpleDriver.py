@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+from xia2.Driver.SimpleDriver import SimpleDriver
+
+
+def test_simple_driver_collects_chatty_output(tmp_path):
+    d = SimpleDriver()
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(tmp_path))
+    d.add_command_line(["-c", 'for i in range(20000): print("line %d" % i)'])
+    d.write_log_file(str(tmp_path / "chatty.log"))
+    d.start()
+    d.close_wait()
+    d.check_for_errors()
+
+    output = d.get_all_output()
+    assert len(output) == 20001
+    assert output[0] == "line 0\n"
+    assert output[-2] == "line 19999\n"
+    assert output[-1] == ""
+    log = (tmp_path / "chatty.log").read_text().splitlines()
+    assert log[19999] == "line 19999"
+    assert log[20000] == "# command line:"
+
+
+def test_simple_driver_passes_input_and_partial_lines(tmp_path):
+    d = SimpleDriver()
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(tmp_path))
+    d.add_command_line(
+        ["-c", 'import sys; sys.stdout.write(sys.stdin.read().upper() + "END")']
+    )
+    d.start()
+    d.input("hello")
+    d.input("big\rworld")
+    d.close_wait()
+
+    assert d.get_all_output() == ["HELLO\n", "BIG\n", "WORLD\n", "END", ""]
+    assert d.status() == 0
+
+
+def test_simple_driver_bounded_output_retention(tmp_path):
+    d = SimpleDriver()
+    d.set_output_retention(100)
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(tmp_path))
+    d.add_command_line(["-c", 'for i in range(5000): print("line %d" % i)'])
+    d.write_log_file(str(tmp_path / "bounded.log"))
+    d.start()
+    d.close_wait()
+    d.check_for_errors()
+
+    assert len(d._standard_output_records) == 100
+    assert d.get_output_tail(2) == ["line 4999\n", ""]
+
+    # the full output is read back from the log, without the trailer
+    output = d.get_all_output()
+    assert len(output) == 5001
+    assert output[0] == "line 0\n"
+    assert output[-2] == "line 4999\n"
+    assert output[-1] == ""
+
+
+def test_simple_driver_bounded_output_retention_without_log_file(tmp_path, caplog):
+    d = SimpleDriver()
+    d.set_output_retention(100)
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(tmp_path))
+    d.add_command_line(["-c", 'for i in range(500): print("line %d" % i)'])
+    d.start()
+    d.close_wait()
+
+    # only the retained tail, as a list, with a warning that it is not all
+    output = d.get_all_output()
+    assert isinstance(output, list)
+    assert len(output) == 100
+    assert output[-10:][-2:] == ["line 499\n", ""]
+    assert "Only the last 100 lines" in caplog.text
+
+
+def test_simple_driver_passes_arguments_without_a_shell(tmp_path):
+    d = SimpleDriver()
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(tmp_path))
+    d.add_command_line(["-c", "import sys; print(sys.argv[1:])", "it's", "$HOME *"])
+    d.set_working_environment("XIA2_TEST_VARIABLE", "sentinel")
+    d.start()
+    d.close_wait()
+
+    assert d.get_all_output()[0] == "[\"it's\", '$HOME *']\n"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX shell scripts only")
+def test_simple_driver_runs_scripts_without_interpreter_line(tmp_path):
+    script = tmp_path / "script"
+    script.write_text('echo "$XIA2_TEST_VARIABLE"\n')
+    script.chmod(0o755)
+
+    d = SimpleDriver()
+    d.set_executable(str(script))
+    d.set_working_directory(str(tmp_path))
+    d.add_working_environment("XIA2_TEST_VARIABLE", "a")
+    d.add_working_environment("XIA2_TEST_VARIABLE", "b")
+    d.start()
+    d.close_wait()
+
+    assert d.get_all_output()[0] == os.pathsep.join("ab") + "\n"
+
+
+@pytest.mark.skipif(not hasattr(os, "wait4"), reason="needs os.wait4")
+def test_simple_driver_records_resource_usage(tmp_path):
+    d = SimpleDriver()
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(tmp_path))
+    d.add_command_line(
+        ["-c", "x = bytearray(64 * 1024 * 1024); sum(range(3000000)); exit(3)"]
+    )
+    d.start()
+    d.close_wait()
+
+    assert d.status() == 3
+    assert d._rusage["max_rss"] > 64 * 1024 * 1024
+    assert d._rusage["user_time"] + d._rusage["system_time"] > 0
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+from xia2.Driver import WorkerDriver, cpu_budget
+from xia2.Driver.SimpleDriver import SimpleDriver
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="workers need pass_fds")
+
+PROGRAM = """
+import logging
+import os
+import sys
+
+logger = logging.getLogger("xia2_worker_test")
+
+
+def run():
+    logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
+    logging.getLogger().setLevel(logging.INFO)
+    logger.info("cwd: %s", os.path.basename(os.getcwd()))
+    logger.info("argv: %s", sys.argv[1:])
+    logger.info("env: %s", os.environ.get("XIA2_WORKER_TEST"))
+    print("stdin: %s" % sys.stdin.read().strip())
+    sys.stdout.flush()
+    os.write(2, b"written to fd 2\\n")
+    if "fail" in sys.argv:
+        raise ValueError("failed on request")
+    sys.exit(int(sys.argv[-1]))
+
+
+if __name__ == "__main__":
+    run()
+"""
+
+
+@pytest.fixture
+def worker_program(tmp_path, monkeypatch):
+    (tmp_path / "xia2_worker_test.py").write_text(PROGRAM)
+    program = tmp_path / "bin" / "xia2_worker_test"
+    program.parent.mkdir()
+    program.write_text(
+        "#!%s\nimport xia2_worker_test\nxia2_worker_test.run()\n" % sys.executable
+    )
+    program.chmod(0o755)
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path), prepend=os.pathsep)
+    pool = WorkerDriver.WorkerPool(size=1, max_jobs=2)
+    monkeypatch.setattr(WorkerDriver, "worker_pool", pool)
+    WorkerDriver.register_entry_point(program.name, "xia2_worker_test:run")
+    yield str(program)
+    pool.shutdown()
+    WorkerDriver._registered_entry_points.pop(program.name)
+
+
+def _run(driver_class, executable, working_directory, args):
+    d = driver_class()
+    d.set_executable(executable)
+    d.set_working_directory(str(working_directory))
+    d.set_working_environment("XIA2_WORKER_TEST", "sentinel")
+    d.add_command_line(args)
+    d.start()
+    d.input("some input")
+    d.close_wait()
+    return d.get_all_output(), d.status()
+
+
+@pytest.mark.parametrize("args", [["a b", "0"], ["2"], ["fail"]])
+def test_worker_driver_matches_subprocess(tmp_path, worker_program, args):
+    expected = _run(SimpleDriver, worker_program, tmp_path, args)
+    # run twice to make sure nothing leaks from one job into the next
+    for _ in range(2):
+        output, status = _run(WorkerDriver.WorkerDriver, worker_program, tmp_path, args)
+        if "fail" in args:
+            assert status == expected[1] == 1
+            assert output[-2:] == expected[0][-2:]
+            assert output[-2] == "ValueError: failed on request\n"
+        else:
+            assert (output, status) == expected
+    assert "XIA2_WORKER_TEST" not in os.environ
+
+
+def test_worker_driver_runs_other_programs_as_subprocesses(tmp_path):
+    output, status = _run(
+        WorkerDriver.WorkerDriver, sys.executable, tmp_path, ["-c", "print(1)"]
+    )
+    assert output == ["1\n", ""]
+    assert status == 0
+
+
+LEAKY_PROGRAM = """
+import logging
+import os
+import sys
+
+
+def run():
+    logging.getLogger("xia2_leaky_test").addHandler(logging.StreamHandler(sys.stdout))
+    logging.getLogger("xia2_leaky_test.new").addHandler(logging.NullHandler())
+    logging.getLogger("xia2_leaky_test").setLevel(logging.DEBUG)
+    os.environ["XIA2_LEAKY_TEST"] = "leaked"
+"""
+
+
+def test_run_job_restores_loggers_and_environment(tmp_path, monkeypatch):
+    (tmp_path / "xia2_leaky_test.py").write_text(LEAKY_PROGRAM)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    output = tmp_path / "output"
+    output.touch()
+    logger = WorkerDriver.logging.getLogger("xia2_leaky_test")
+    handlers = list(logger.handlers)
+    status, _ = WorkerDriver._run_job(
+        {
+            "entry_point": "xia2_leaky_test:run",
+            "argv": ["xia2_leaky_test"],
+            "cwd": str(tmp_path),
+            "environment": None,
+            "stdin": "",
+            "output": str(output),
+        }
+    )
+    assert status == 0
+    assert logger.handlers == handlers
+    assert logger.level == WorkerDriver.logging.NOTSET
+    assert not WorkerDriver.logging.getLogger("xia2_leaky_test.new").handlers
+    assert "XIA2_LEAKY_TEST" not in os.environ
+
+
+def test_kill_releases_cores_of_job_not_yet_run(tmp_path, worker_program):
+    cpu_budget.set_cores(4)
+    try:
+        d = WorkerDriver.WorkerDriver()
+        d.set_executable(worker_program)
+        d.set_working_directory(str(tmp_path))
+        d.set_cpu_threads(2)
+        d.start()
+        assert cpu_budget.in_use() == 2
+        d.kill()
+        assert cpu_budget.in_use() == 0
+    finally:
+        cpu_budget.set_cores(None)
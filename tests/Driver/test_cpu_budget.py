@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import sys
+import threading
+
+import pytest
+
+import xia2.Driver.cpu_budget
+import xia2.Driver.timing
+from xia2.Driver.SimpleDriver import SimpleDriver
+
+
+@pytest.fixture
+def cpu_budget():
+    xia2.Driver.cpu_budget.set_cores(2)
+    xia2.Driver.timing.reset()
+    yield xia2.Driver.cpu_budget
+    xia2.Driver.cpu_budget.set_cores(None)
+    xia2.Driver.timing.reset()
+
+
+def _run(threads, intervals):
+    d = SimpleDriver()
+    d.set_executable(sys.executable)
+    d.set_cpu_threads(threads)
+    d.add_command_line(["-c", "import time; print(time.time()); time.sleep(0.3)"])
+    d.start()
+    d.close_wait()
+    d.check_for_errors()
+    start = float(d.get_all_output()[0])
+    intervals.append((start, start + 0.3, threads))
+
+
+def test_cpu_budget_is_never_oversubscribed(cpu_budget):
+    intervals = []
+    jobs = [
+        threading.Thread(target=_run, args=(threads, intervals))
+        for threads in (1, 1, 2, 1, 1, 4)
+    ]
+    for job in jobs:
+        job.start()
+    for job in jobs:
+        job.join()
+    assert len(intervals) == 6
+    assert cpu_budget.in_use() == 0
+
+    for start, _, _ in intervals:
+        # requests for more than the budget are given the whole budget
+        cores = sum(
+            min(threads, 2) for s, e, threads in intervals if s <= start + 0.01 < e
+        )
+        assert cores <= 2
+
+    # waiting for cores shows up in the timing database and report
+    waits = [t["cpu_wait"] for t in xia2.Driver.timing._timing_db]
+    assert max(waits) > 0.2
+    report = xia2.Driver.timing.report()
+    assert any(line.startswith("Waited for CPU cores") for line in report)
+
+
+def test_cpu_budget_does_not_block_a_thread_which_holds_cores(cpu_budget):
+    first = cpu_budget.acquire(2)
+    second = cpu_budget.acquire(1)
+    assert cpu_budget.in_use() == 3
+    cpu_budget.release(second)
+    cpu_budget.release(first)
+    assert cpu_budget.in_use() == 0
+
+
+def test_no_cpu_budget():
+    assert xia2.Driver.cpu_budget.get_cores() is None
+    assert xia2.Driver.cpu_budget.acquire(64) is None
+    xia2.Driver.cpu_budget.release(None)
+
+
+def test_cores_released_when_close_wait_fails(cpu_budget, monkeypatch):
+    d = SimpleDriver()
+    d.set_executable(sys.executable)
+    d.set_cpu_threads(2)
+    d.add_command_line(["-c", "print(1)"])
+    d.start()
+    assert cpu_budget.in_use() == 2
+
+    def cleanup():
+        raise OSError("failed to clean up")
+
+    monkeypatch.setattr(d, "cleanup", cleanup)
+    with pytest.raises(OSError):
+        d.close_wait()
+    assert cpu_budget.in_use() == 0
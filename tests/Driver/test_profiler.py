@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import xia2.Driver.profiler
+import xia2.Driver.timing
+from xia2.Driver.SimpleDriver import SimpleDriver
+
+
+def busy_loop(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+def test_profiler_attributes_samples_to_stages(tmp_path):
+    xia2.Driver.timing.reset()
+    xia2.Driver.profiler.start(interval=0.005, cprofile_stages=["cprofiled step"])
+    try:
+        busy_loop(0.2)
+        with xia2.Driver.timing.record_step("some step"):
+            busy_loop(0.2)
+            with xia2.Driver.timing.record_step("cprofiled step"):
+                busy_loop(0.1)
+
+        d = SimpleDriver()
+        d.set_executable(sys.executable)
+        d.set_working_directory(str(tmp_path))
+        d.add_command_line(["-c", "import time; time.sleep(0.2)"])
+        d.start()
+        d.close_wait()
+    finally:
+        xia2.Driver.profiler.stop(str(tmp_path / "profile"))
+    xia2.Driver.timing.reset()
+
+    assert not xia2.Driver.profiler.running()
+    profile = tmp_path / "profile"
+    assert (profile / "cprofiled_step.prof").is_file()
+
+    def samples(filename):
+        lines = (profile / filename).read_text().splitlines()
+        return {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+
+    thinking = samples("xia2_thinking_time.folded")
+    assert any(stack.endswith(":busy_loop") for stack in thinking)
+    step = samples("some_step.folded")
+    assert any("test_profiler_attributes_samples_to_stages" in s for s in step)
+    assert samples("cprofiled_step.folded")
+    # time spent waiting for the program is attributed to the program
+    program = os.path.basename(sys.executable)
+    assert samples(xia2.Driver.profiler._file_name(program, ".folded"))
+
+    # all.folded has every sample, under the names of the enclosing stages
+    everything = samples("all.folded")
+    assert any(s.startswith("some_step;cprofiled_step;") for s in everything)
+    assert any(s.startswith("xia2_thinking_time;") for s in everything)
+    assert sum(everything.values()) == sum(
+        sum(samples(f.name).values())
+        for f in profile.glob("*.folded")
+        if f.name != "all.folded"
+    )
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import sys
+
+import pytest
+
+import xia2.Driver.result_cache
+from xia2.cli import cache as cache_cli
+from xia2.Driver.DriverFactory import DriverFactory
+
+program = """
+import sys
+data = open(sys.argv[1]).read()
+with open(sys.argv[2], "w") as fh:
+    fh.write(data.upper() + sys.stdin.read())
+with open("runs", "a") as fh:
+    fh.write("run\\n")
+print("Wrote %s" % sys.argv[2])
+"""
+
+
+@pytest.fixture
+def result_cache(tmp_path):
+    cache = xia2.Driver.result_cache.ResultCache(directory=str(tmp_path / "cache"))
+    xia2.Driver.result_cache.set_cache(cache)
+    yield cache
+    xia2.Driver.result_cache.set_cache(None)
+
+
+def run_program(working_directory, output_name, stdin="a"):
+    d = DriverFactory.Driver("simple")
+    d.set_executable(sys.executable)
+    d.set_working_directory(str(working_directory))
+    d.add_command_line(["-c", program, "input.txt", output_name])
+    d.add_input_file("input.txt")
+    d.add_output_file(output_name)
+    d.start()
+    d.input(stdin)
+    d.close_wait()
+    return d
+
+
+def test_result_cache(tmp_path, result_cache):
+    (tmp_path / "input.txt").write_text("data")
+
+    d = run_program(tmp_path, "1_output.txt")
+    assert d.status() == 0
+    assert (tmp_path / "1_output.txt").read_text() == "DATAa\n"
+    assert (tmp_path / "runs").read_text() == "run\n"
+
+    # the same job writing to another file is not run again
+    d = run_program(tmp_path, "2_output.txt")
+    assert d.status() == 0
+    assert (tmp_path / "2_output.txt").read_text() == "DATAa\n"
+    assert d.get_all_output() == ["Wrote 2_output.txt\n", ""]
+    assert (tmp_path / "runs").read_text() == "run\n"
+
+    # but a different standard input or input file is
+    run_program(tmp_path, "3_output.txt", stdin="b")
+    assert (tmp_path / "3_output.txt").read_text() == "DATAb\n"
+    (tmp_path / "input.txt").write_text("other data")
+    run_program(tmp_path, "4_output.txt")
+    assert (tmp_path / "4_output.txt").read_text() == "OTHER DATAa\n"
+    assert (tmp_path / "runs").read_text() == "run\n" * 3
+
+    assert len(result_cache.entries()) == 3
+    assert result_cache.prune(max_size=0)
+    assert not result_cache.entries()
+
+
+def test_result_cache_needs_declared_outputs(tmp_path, result_cache):
+    (tmp_path / "input.txt").write_text("data")
+    for _ in range(2):
+        d = DriverFactory.Driver("simple")
+        d.set_executable(sys.executable)
+        d.set_working_directory(str(tmp_path))
+        d.add_command_line(["-c", program, "input.txt", "output.txt"])
+        d.start()
+        d.close_wait()
+    assert (tmp_path / "runs").read_text() == "run\n" * 2
+    assert not result_cache.entries()
+
+
+def test_cache_command_line(tmp_path, result_cache, capsys):
+    (tmp_path / "input.txt").write_text("data")
+    run_program(tmp_path, "output.txt")
+
+    cache_cli.run(["--directory", result_cache.get_directory()])
+    output = capsys.readouterr().out
+    assert "1 results" in output
+    assert "{input0} {output0}" in output
+
+    cache_cli.run(["--directory", result_cache.get_directory(), "clear"])
+    assert "Removed 1 results" in capsys.readouterr().out
+    assert not result_cache.entries()
+
+
+def test_result_cache_skips_outputs_containing_paths(tmp_path, result_cache):
+    (tmp_path / "input.txt").write_text("data")
+    for _ in range(2):
+        d = DriverFactory.Driver("simple")
+        d.set_executable(sys.executable)
+        d.set_working_directory(str(tmp_path))
+        d.add_command_line(
+            [
+                "-c",
+                program.replace("data.upper()", "os.getcwd()").replace(
+                    "import sys", "import os, sys"
+                ),
+                "input.txt",
+                "output.txt",
+            ]
+        )
+        d.add_input_file("input.txt")
+        d.add_output_file("output.txt")
+        d.start()
+        d.close_wait()
+        assert d.status() == 0
+    assert (tmp_path / "runs").read_text() == "run\n" * 2
+    assert not result_cache.entries()
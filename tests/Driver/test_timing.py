@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import re
 
 import xia2.Driver.timing
@@ -265,3 +266,86 @@ def test_timing_visualisation():
 
     # thinking time should appear in the tree
     assert re.search("^13.* T[0-9] .*xia2 thinking time.*$", tree, re.MULTILINE)
+
+
+def test_timing_visualisation_of_resource_usage():
+    def usage(cpu_time, max_rss):
+        return {
+            "user_time": cpu_time,
+            "system_time": 0.0,
+            "max_rss": max_rss,
+            "block_input": 0,
+            "block_output": 0,
+            "voluntary_context_switches": 0,
+            "involuntary_context_switches": 0,
+        }
+
+    example = [
+        {
+            "command": "dials.integrate 'nproc=4'",
+            "time_start": 100.0,
+            "time_end": 120.0,
+            "cpu_threads": 4,
+            "rusage": usage(60.0, 3 * 1024**3),
+            "parallelism": 3.0,
+        },
+        {"command": "xia2 step", "time_start": 120.0, "time_end": 125.0},
+    ]
+
+    output = xia2.Driver.timing.visualise_db(example)
+    lt = output.index("Longest times:")
+    assert re.search(r"3\.0x +75% +3\.0GB +dials\.integrate 'nproc=4'$", output[lt + 1])
+    assert re.search(r"2\. +xia2 step$", output[lt + 2])
+    assert output[lt + 1].index("dials") == output[lt + 2].index("xia2 step")
+    assert "effective parallelism 2.4x" in output[-1]
+
+
+def test_readable_size():
+    assert xia2.Driver.timing.readable_size(512) == "512B"
+    assert xia2.Driver.timing.readable_size(1536 * 1024) == "1.5MB"
+    assert xia2.Driver.timing.readable_size(5 * 1024**4) == "5120.0GB"
+
+
+def test_trace_of_timing_events():
+    example = [
+        {
+            "command": "dials.ssx_index",
+            "time_start": 10.0,
+            "time_end": 20.0,
+            "working_directory": "/data/batch_1",
+        },
+        {
+            "command": "dials.integrate 'nproc=4'",
+            "time_start": 11.0,
+            "time_end": 15.0,
+            "details": {"object initialization": 11.0, "process start": 11.5},
+            "working_directory": "/data/integrate",
+            "cpu_threads": 4,
+            "rusage": {"user_time": 12.0, "system_time": 0.0, "max_rss": 1024},
+        },
+        {"command": "dials.refine", "time_start": 16.0, "time_end": 18.0},
+        {"command": "dials.scale", "time_start": 30.0, "time_end": 40.0},
+    ]
+
+    trace = xia2.Driver.timing.trace_db(example)
+    json.dumps(trace)
+    spans = {e["name"]: e for e in trace["traceEvents"] if e["ph"] == "X"}
+
+    assert spans["dials.ssx_index"]["cat"] == "step"
+    assert spans["dials.ssx_index"]["ts"] == 0
+    assert spans["dials.ssx_index"]["dur"] == 10000000
+    assert spans["dials.integrate"]["cat"] == "program"
+    assert spans["dials.integrate"]["args"]["working_directory"] == "/data/integrate"
+    assert spans["dials.integrate"]["args"]["rusage"]["user_time"] == 12.0
+    assert spans["dials.integrate"]["args"]["details"]["process start"] == 1.5
+
+    # concurrent records go on separate tracks, which are reused once free
+    assert spans["dials.ssx_index"]["tid"] == 1
+    assert spans["dials.integrate"]["tid"] == 2
+    assert spans["dials.refine"]["tid"] == 2
+    assert spans["dials.scale"]["tid"] == 1
+
+    # the gap between 20s and 30s is xia2 thinking time
+    thinking = spans["xia2 thinking time"]
+    assert thinking["tid"] == 0
+    assert (thinking["ts"], thinking["dur"]) == (10000000, 10000000)
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import re
+
+import pytest
+
+from xia2.Experts.FindImages import find_matching_images
+
+
+def _regex_matching_images(template, directory):
+    length = template.count("#")
+    regexp = re.compile(
+        re.escape(template).replace("\\#" * length, "([0-9]{%d})" % length)
+    )
+    images = []
+    for f in os.listdir(directory):
+        match = regexp.match(f)
+        if match:
+            images.append(int(match.group(1)))
+    return sorted(images)
+
+
+@pytest.fixture
+def image_directory(tmp_path):
+    names = [f"x_1_{i:04d}.cbf" for i in range(1, 21)]
+    names += [f"x_1_{i:04d}.cbf.gz" for i in (3, 4)]
+    names += [f"x_10_{i:04d}.cbf" for i in range(1, 6)]
+    names += [f"x_1_{i:05d}.cbf" for i in range(1, 6)]
+    names += ["x_1_00a1.cbf", "x_1_.cbf", "x_1_0001.img", "x_1_０００１.cbf"]
+    names += [f"{i:04d}.img" for i in range(1, 4)]
+    for name in names:
+        (tmp_path / name).touch()
+    os.utime(tmp_path, ns=(0, 10**9))
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "x_1_####.cbf",
+        "x_1_#####.cbf",
+        "x_10_####.cbf",
+        "x_1_000#.cbf",
+        "x_#_####.cbf",
+        "####.img",
+        "x_2_####.cbf",
+    ],
+)
+def test_find_matching_images(image_directory, template):
+    assert find_matching_images(template, str(image_directory)) == (
+        _regex_matching_images(template, str(image_directory))
+    )
+
+
+def test_find_matching_images_notices_new_images(image_directory, monkeypatch):
+    listed = []
+    listdir = os.listdir
+    monkeypatch.setattr(
+        os, "listdir", lambda path: listed.append(path) or listdir(path)
+    )
+
+    assert find_matching_images("x_10_####.cbf", str(image_directory)) == list(
+        range(1, 6)
+    )
+    assert find_matching_images("x_1_####.cbf", str(image_directory))[:3] == [1, 2, 3]
+    assert len(listed) == 1
+
+    (image_directory / "x_10_0006.cbf").touch()
+    os.utime(image_directory, ns=(0, 2 * 10**9))
+    assert find_matching_images("x_10_####.cbf", str(image_directory)) == list(
+        range(1, 7)
+    )
+    assert len(listed) == 2
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+
+from xia2.Handlers import Phil
+
+
+def test_master_phil_cache(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("XIA2_PHIL_CACHE", "1")
+    monkeypatch.setattr(Phil, "_cache_key", lambda: "0123456789abcdef")
+    filename = os.path.join(Phil.cache_directory(), "0123456789abcdef.phil")
+
+    parsed = Phil.load_master_phil()
+    assert os.path.isfile(filename)
+    cached = Phil.load_master_phil()
+    assert cached.as_str(attributes_level=3) == parsed.as_str(attributes_level=3)
+    params = cached.extract()
+    assert params.xia2.settings.resolution.isigma is None
+    assert params.xia2.settings.report.d_min is None
+
+    # a damaged cache is ignored
+    with open(filename, "w") as fh:
+        fh.write("xia2.settings {")
+    damaged = Phil.load_master_phil()
+    assert damaged.as_str(attributes_level=3) == parsed.as_str(attributes_level=3)
+
+
+def test_master_phil_cache_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.delenv("XIA2_PHIL_CACHE", raising=False)
+    monkeypatch.setattr(Phil, "_cache_key", lambda: "0123456789abcdef")
+
+    Phil.load_master_phil()
+    assert not os.path.exists(Phil.cache_directory())
+
+
+def test_master_phil_cache_key_covers_included_modules(monkeypatch):
+    key = Phil._cache_key()
+    assert key
+
+    # a change to a dials module a scope is included from is noticed
+    module_file = Phil._module_file
+
+    def changed_module_file(module):
+        if module == "dials.util.masking":
+            return Phil.__file__
+        return module_file(module)
+
+    monkeypatch.setattr(Phil, "_module_file", changed_module_file)
+    assert Phil._cache_key() != key
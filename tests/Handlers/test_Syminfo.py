@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from xia2.Handlers import Syminfo
+
+
+def test_syminfo_lookups():
+    assert Syminfo.spacegroup_name_to_number("P 43 21 2") == 96
+    assert Syminfo.spacegroup_name_to_number("96") == 96
+    assert Syminfo.spacegroup_number_to_name(96) == "P 43 21 2"
+    assert Syminfo.get_pointgroup("P 43 21 2") == "P422"
+    assert Syminfo.get_lattice("P 43 21 2") == "tP"
+    assert Syminfo.get_lattice(96) == "tP"
+    assert Syminfo.get_lattice("96") == "tP"
+    assert Syminfo.get_lattice("hR") == "hR"
+    assert Syminfo.get_num_symops(96) == 8
+
+
+def test_syminfo_lookups_are_remembered():
+    Syminfo.get_pointgroup.cache_clear()
+    for _ in range(3):
+        assert Syminfo.get_pointgroup("C 1 2 1") == "C121"
+    info = Syminfo.get_pointgroup.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import pytest
+
+from xia2.Modules.SSX.batch_scheduler import BatchScheduler
+
+
+def test_batches_shrink_towards_the_end():
+    scheduler = BatchScheduler(10000, njobs=4, max_batch_size=1000)
+    sizes = []
+    for images in iter(scheduler.next_batch, None):
+        assert images[0] == sum(sizes)
+        sizes.append(images[1] - images[0])
+    assert sum(sizes) == 10000
+    assert sizes[0] == 1000
+    assert sizes == sorted(sizes, reverse=True)
+    assert sizes[-1] < 10
+
+
+def test_batches_are_not_dominated_by_overheads():
+    scheduler = BatchScheduler(10000, njobs=4, max_batch_size=1000)
+    for i in range(4):
+        images = scheduler.next_batch()
+        n = images[1] - images[0]
+        scheduler.record(images, i, i + 6 + 0.1 * n, {"find_spots": 0.1 * n})
+    assert scheduler.time_per_image() == pytest.approx(0.1)
+    assert scheduler.time_per_batch() == pytest.approx(6)
+    sizes = []
+    for images in iter(scheduler.next_batch, None):
+        sizes.append(images[1] - images[0])
+    # each batch spends at least 54s processing images, including the last
+    assert min(sizes) >= 540
+    assert scheduler.next_image == 10000
+
+
+def test_utilisation():
+    scheduler = BatchScheduler(300, njobs=2, max_batch_size=100)
+    scheduler.record((0, 100), 0, 10, {"find_spots": 4, "index": 6})
+    scheduler.record((100, 200), 0, 5, {"find_spots": 2, "index": 3})
+    scheduler.record((200, 300), 5, 10, {"find_spots": 2, "index": 3})
+    assert scheduler.utilisation() == 1
+    summary = scheduler.summary()
+    assert summary["n_batches"] == 3
+    assert summary["time_per_image"] == {"find_spots": 8 / 300, "index": 12 / 300}
+    scheduler.record((300, 300), 10, 20)
+    assert scheduler.utilisation() == 0.75
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import concurrent.futures
+import json
+
+import pytest
+
+from xia2.Modules.SSX import data_integration_standard
+from xia2.Modules.SSX.data_integration_standard import (
+    IMPORTED_SLICE,
+    AlgorithmParams,
+    images_cut_into_batches,
+    inspect_existing_batch_directories,
+    process_batches_dynamically,
+)
+
+N_IMAGES = 100
+
+
+class FakeLoad:
+    @staticmethod
+    def experiment_list(filename, check_format=True):
+        return list(range(N_IMAGES))
+
+
+class FakeBatch:
+    processed: list = []
+    fail_at = None
+
+    def __init__(self, *args):
+        pass
+
+    def __call__(self, directory):
+        with (directory / IMPORTED_SLICE).open() as f:
+            start, end = json.load(f)["slice"]
+        if FakeBatch.fail_at is not None and len(FakeBatch.processed) >= (
+            FakeBatch.fail_at
+        ):
+            raise RuntimeError("the run stops here")
+        FakeBatch.processed.append((start, end))
+        return {
+            "directory": str(directory),
+            "n_images_indexed": None,
+            "n_cryst_integrated": None,
+            "step_times": {"find_spots": 0.001 * (end - start)},
+        }
+
+
+def test_rerun_after_partial_dynamic_run(monkeypatch, tmp_path):
+    # threads stand in for the processes, and the batches do nothing
+    monkeypatch.setattr(
+        concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor
+    )
+    monkeypatch.setattr(data_integration_standard, "ProcessBatch", FakeBatch)
+    monkeypatch.setattr(data_integration_standard, "load", FakeLoad)
+    imported_expts = tmp_path / "imported.expt"
+    imported_expts.touch()
+    options = AlgorithmParams(batch_size=20, njobs=2, dynamic_batches=True)
+
+    FakeBatch.processed, FakeBatch.fail_at = [], 2
+    with pytest.raises(RuntimeError):
+        process_batches_dynamically(tmp_path, imported_expts, None, None, None, options)
+    existing, _ = inspect_existing_batch_directories(tmp_path)
+    n_cut = images_cut_into_batches(existing)
+    assert 0 < n_cut < N_IMAGES
+
+    # the rerun processes the batches already cut, then the rest
+    FakeBatch.processed, FakeBatch.fail_at = [], None
+    batch_directories = process_batches_dynamically(
+        tmp_path,
+        imported_expts,
+        None,
+        None,
+        None,
+        options,
+        existing_batches=existing,
+    )
+    assert batch_directories[: len(existing)] == existing
+    assert images_cut_into_batches(batch_directories) == N_IMAGES
+    end = 0
+    for start, stop in sorted(FakeBatch.processed):
+        assert start == end
+        end = stop
+    assert end == N_IMAGES
+
+
+def test_images_cut_into_batches(tmp_path):
+    for i, images in enumerate([(0, 10), (20, 30), (10, 20)]):
+        (tmp_path / f"batch_{i}").mkdir()
+        data_integration_standard.write_imported_slice(
+            tmp_path / f"batch_{i}", tmp_path / "imported.expt", images
+        )
+    batches = sorted(tmp_path.glob("batch_*"))
+    assert images_cut_into_batches(batches) == 30
+    # a gap in the slices
+    with pytest.raises(ValueError):
+        images_cut_into_batches(batches[1:])
+    # batches holding their own imported.expt cover all the images
+    (tmp_path / "batch_3").mkdir()
+    (tmp_path / "batch_3" / "imported.expt").touch()
+    assert images_cut_into_batches(batches + [tmp_path / "batch_3"]) is None
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import concurrent.futures
+import pathlib
+import threading
+import time
+
+import pytest
+
+from xia2.Modules.SSX import data_integration_standard
+from xia2.Modules.SSX.data_integration_standard import (
+    AlgorithmParams,
+    PipelineParams,
+    process_batches_pipelined,
+)
+
+
+class FakeStep:
+    def __init__(self, step, *args):
+        self.step = step
+
+    def __call__(self, data):
+        time.sleep(0.01)
+        data["step_times"][self.step] = 0.01
+        return data, True
+
+
+@pytest.mark.parametrize("queue_size", [0, 1])
+def test_pipeline_queue_size(monkeypatch, tmp_path, queue_size):
+    # threads stand in for the processes, and the steps do nothing
+    monkeypatch.setattr(
+        concurrent.futures, "ProcessPoolExecutor", concurrent.futures.ThreadPoolExecutor
+    )
+    monkeypatch.setattr(data_integration_standard, "ProcessBatchStep", FakeStep)
+    batch_directories = [tmp_path / f"batch_{i}" for i in range(1, 7)]
+    options = AlgorithmParams(
+        steps=["find_spots", "index", "integrate"],
+        pipeline=PipelineParams(
+            find_spots_njobs=2, index_njobs=1, integrate_njobs=1, queue_size=queue_size
+        ),
+    )
+    finished = []
+
+    thread = threading.Thread(
+        target=process_batches_pipelined,
+        args=(batch_directories, None, None, None, options, finished.append),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "the pipeline never finished"
+    assert sorted(pathlib.Path(d["directory"]) for d in finished) == sorted(
+        batch_directories
+    )
+    assert all(len(d["step_times"]) == 3 for d in finished)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+
+from xia2.Schema.HeaderCache import HeaderCache
+
+
+def test_header_cache_round_trip(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    files = []
+    for i in range(1, 4):
+        image = images / ("image_%03d.cbf" % i)
+        image.write_bytes(b"header %d" % i)
+        files.append(str(image))
+
+    cache = HeaderCache(directory=str(tmp_path / "cache"))
+    key = {"template": str(images / "image_###.cbf"), "start_ends": [(1, 3)]}
+    models = {"experiment": [{"scan": 0}], "scan": [{"image_range": [1, 3]}]}
+    assert cache.get(key) is None
+    cache.put(key, models, files)
+    assert cache.get(key) == models
+    assert cache.get(dict(key, start_ends=[(1, 2)])) is None
+
+    # a changed image invalidates the entry
+    os.utime(files[1], ns=(0, 0))
+    assert cache.get(key) is None
+    cache.put(key, models, files)
+    assert cache.get(key) == models
+
+    # and so does a new one in the same directory
+    (images / "image_004.cbf").write_bytes(b"header 4")
+    assert cache.get(key) is None
+
+
+def test_header_cache_evicts_least_recently_used(tmp_path):
+    image = tmp_path / "image_001.cbf"
+    image.write_bytes(b"header")
+    models = {"padding": "x" * 1000}
+
+    cache = HeaderCache(directory=str(tmp_path / "cache"))
+    cache.put({"template": 0}, models, [str(image)])
+    entry_size = os.path.getsize(cache._entry_file({"template": 0}))
+
+    # room for three entries
+    cache = HeaderCache(directory=str(tmp_path / "cache"), max_size=3.5 * entry_size)
+    for i in range(3):
+        cache.put({"template": i}, models, [str(image)])
+        # ensure distinct modification times for the entries
+        entry = cache._entry_file({"template": i})
+        os.utime(entry, ns=(i * 10**9, i * 10**9))
+    assert cache.get({"template": 0}) == models
+
+    cache.put({"template": 3}, models, [str(image)])
+    assert cache.get({"template": 0}) == models
+    assert cache.get({"template": 1}) is None
+    assert cache.get({"template": 2}) == models
+    assert cache.get({"template": 3}) == models
+
+
+def test_header_cache_evicts_only_occasionally(tmp_path, monkeypatch):
+    image = tmp_path / "image_001.cbf"
+    image.write_bytes(b"header")
+    models = {"padding": "x" * 1000}
+
+    cache = HeaderCache(directory=str(tmp_path / "cache"), max_size=10**6)
+    evictions = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: evictions.append(evict()))
+    for i in range(20):
+        cache.put({"template": i}, models, [str(image)])
+    # once on the first write, then not again until 1/16 of max_size is written
+    assert len(evictions) == 1
+    for i in range(20, 100):
+        cache.put({"template": i}, models, [str(image)])
+    assert len(evictions) == 2
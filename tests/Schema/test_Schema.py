@@ -2,7 +2,14 @@ from __future__ import annotations
 
 from dxtbx.model import ExperimentList
 
-from xia2.Schema import compare_geometries, load_reference_geometries
+import xia2.Schema
+from xia2.Schema import (
+    compare_geometries,
+    image_header_chunks,
+    join_image_headers,
+    load_reference_geometries,
+    read_image_headers,
+)
 
 
 def test_load_reference_geometries(dials_data):
@@ -26,3 +33,17 @@ def test_load_reference_geometries(dials_data):
 
     detectors = (geom["detector"] for geom in unique_geometries)
     assert not compare_geometries(*detectors), "Unique detectors cannot be equivalent."
+
+
+def test_join_image_headers(dials_data, monkeypatch):
+    monkeypatch.setattr(xia2.Schema, "_get_header_cache", lambda: None)
+    template = str(dials_data("insulin", pathlib=True) / "insulin_1_###.img")
+
+    chunks = image_header_chunks(template, 10)
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 10, 5]
+    joined = join_image_headers([read_image_headers(chunk) for chunk in chunks])
+    whole = read_image_headers([path for chunk in chunks for path in chunk])
+
+    assert len(joined) == len(whole) == 1
+    assert joined[0].scan == whole[0].scan
+    assert joined[0].imageset.paths() == whole[0].imageset.paths()
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import pytest
+
 
 def test_lauegroup_to_lattice_functions(ccp4):
     from xia2.lib.SymmetryLib import lauegroup_to_lattice
@@ -29,3 +31,36 @@ def test_lattice_order(ccp4):
         "cF",
         "cI",
     ]
+
+
+def test_spacegroup_name_xHM_to_old(tmp_path, monkeypatch):
+    from xia2.lib import SymmetryLib
+
+    syminfo = tmp_path / "lib" / "data" / "syminfo.lib"
+    syminfo.parent.mkdir(parents=True)
+    syminfo.write_text(
+        """\
+# a few entries from syminfo.lib
+begin_spacegroup
+symbol xHM  'P 1 21 1'
+symbol old  'P 1 21 1' 'P 21'
+end_spacegroup
+begin_spacegroup
+symbol xHM  'H 3 2'
+symbol old  'H32' 'R 3 2'
+end_spacegroup
+"""
+    )
+    monkeypatch.setenv("CCP4", str(tmp_path))
+    SymmetryLib._read_syminfo.cache_clear()
+
+    assert SymmetryLib.spacegroup_name_xHM_to_old("p 1 21 1") == "P 1 21 1"
+    assert SymmetryLib.spacegroup_name_xHM_to_old("H 3 2") == "H32"
+    assert SymmetryLib.spacegroup_name_xHM_to_old("H32") == "H32"
+    with pytest.raises(RuntimeError):
+        SymmetryLib.spacegroup_name_xHM_to_old("P 43 21 2")
+
+    # the file is only read once
+    syminfo.unlink()
+    assert SymmetryLib.spacegroup_name_xHM_to_old("H 3 2") == "H32"
+    SymmetryLib._read_syminfo.cache_clear()
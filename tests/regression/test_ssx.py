@@ -5,6 +5,7 @@ import os
 import pathlib
 import shutil
 import subprocess
+import sys
 from typing import List
 
 import pytest
@@ -12,6 +13,7 @@ import pytest
 from dials.array_family import flex
 from dxtbx.serialize import load
 
+from xia2.Modules.SSX.data_integration_standard import load_batch_experiments
 from xia2.Modules.SSX.data_reduction_programs import determine_best_unit_cell
 
 
@@ -185,6 +187,108 @@ def test_run_with_reference(dials_data, tmp_path, refined_expt):
     assert not (tmp_path / "LogFiles" / "dials.refine.log").is_file()
 
 
+def test_run_as_pipeline(dials_data, tmp_path, refined_expt):
+    """
+    Test running find_spots, index and integrate as a pipeline across batches.
+    """
+    refined_expt.as_file(tmp_path / "refined.expt")
+
+    ssx = dials_data("cunir_serial", pathlib=True)
+
+    args = [
+        "xia2.ssx",
+        "unit_cell=96.4,96.4,96.4,90,90,90",
+        "space_group=P213",
+        "integration.algorithm=stills",
+        f"reference_geometry={os.fspath(tmp_path / 'refined.expt')}",
+        "steps=find_spots+index+integrate",
+        "batch_size=2",
+        "multiprocessing.pipeline.enable=True",
+        "multiprocessing.pipeline.index_njobs=2",
+        "multiprocessing.pipeline.queue_size=1",
+    ]
+    args.append("image=" + os.fspath(ssx / "merlin0047_1700*.cbf"))
+
+    result = subprocess.run(args, cwd=tmp_path, capture_output=True)
+    assert not result.returncode and not result.stderr
+    check_output(tmp_path, find_spots=True, index=True, integrate=True)
+    assert (tmp_path / "batch_2" / "integrated_1.refl").is_file()
+
+
+def test_run_without_intermediate_files(dials_data, tmp_path, refined_expt):
+    """
+    Test passing the spots and indexing results between the steps in memory,
+    without saving them.
+    """
+    refined_expt.as_file(tmp_path / "refined.expt")
+
+    ssx = dials_data("cunir_serial", pathlib=True)
+
+    args = [
+        "xia2.ssx",
+        "unit_cell=96.4,96.4,96.4,90,90,90",
+        "space_group=P213",
+        "integration.algorithm=stills",
+        f"reference_geometry={os.fspath(tmp_path / 'refined.expt')}",
+        "steps=find_spots+index+integrate",
+        "intermediate_files=False",
+    ]
+    args.append("image=" + os.fspath(ssx / "merlin0047_1700*.cbf"))
+
+    result = subprocess.run(args, cwd=tmp_path, capture_output=True)
+    assert not result.returncode and not result.stderr
+    check_output(tmp_path, integrate=True)
+
+
+def test_watch_for_images(dials_data, tmp_path, refined_expt):
+    """
+    Test processing images as they are written, in batches as they arrive.
+    """
+    refined_expt.as_file(tmp_path / "refined.expt")
+
+    ssx = dials_data("cunir_serial", pathlib=True)
+    writer = subprocess.Popen(
+        [
+            sys.executable,
+            os.fspath(
+                pathlib.Path(__file__).parents[2]
+                / "benchmarks"
+                / "ssx_stream_images.py"
+            ),
+            os.fspath(tmp_path / "images"),
+            "--source",
+            os.fspath(ssx / "merlin0047_1700*.cbf"),
+            "--rate",
+            "1",
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+
+    args = [
+        "xia2.ssx",
+        "unit_cell=96.4,96.4,96.4,90,90,90",
+        "space_group=P213",
+        "integration.algorithm=stills",
+        f"reference_geometry={os.fspath(tmp_path / 'refined.expt')}",
+        "steps=find_spots+index+integrate",
+        "batch_size=2",
+        "watch.enable=True",
+        "watch.interval=1",
+        "watch.settle=1",
+        "watch.timeout=10",
+        f"directory={os.fspath(tmp_path / 'images')}",
+    ]
+    result = subprocess.run(args, cwd=tmp_path, capture_output=True)
+    assert not writer.wait()
+    assert not result.returncode and not result.stderr
+    check_output(tmp_path, find_spots=True, index=True, integrate=True)
+
+    with (tmp_path / "stream_progress.json").open(mode="r") as f:
+        progress = json.load(f)
+    assert progress["cumulative_images"] == 5
+    assert [batch["n_images"] for batch in progress["batches"]] == [2, 2, 1]
+
+
 def test_full_run_without_reference(dials_data, tmp_path):
     ssx = dials_data("cunir_serial", pathlib=True)
 
@@ -225,11 +329,9 @@ def test_full_run_without_reference(dials_data, tmp_path):
     # Check that the data were integrated with this new reference geometry
     assert (tmp_path / "batch_1").is_dir()
     assert (tmp_path / "batch_1/nuggets").is_dir()
-    sliced_expts = tmp_path / "batch_1" / "imported.expt"
-    assert sliced_expts.is_file()
-    sliced_identifiers = load.experiment_list(
-        sliced_expts, check_format=False
-    ).identifiers()
+    assert (tmp_path / "batch_1" / "imported_slice.json").is_file()
+    assert not (tmp_path / "batch_1" / "imported.expt").is_file()
+    sliced_identifiers = load_batch_experiments(tmp_path / "batch_1").identifiers()
     assert with_reference_identifiers == sliced_identifiers
     check_output(tmp_path, find_spots=True, index=True, integrate=True)
     assert len(list((tmp_path / "batch_1/nuggets").glob("nugget_index*"))) == 5
@@ -276,11 +378,9 @@ def test_stepwise_run_without_reference(dials_data, tmp_path):
 
     # Check that find_spots was run with this new reference geometry
     assert (tmp_path / "batch_1").is_dir()
-    sliced_expts = tmp_path / "batch_1" / "imported.expt"
-    assert sliced_expts.is_file()
-    sliced_identifiers = load.experiment_list(
-        sliced_expts, check_format=False
-    ).identifiers()
+    assert (tmp_path / "batch_1" / "imported_slice.json").is_file()
+    assert not (tmp_path / "batch_1" / "imported.expt").is_file()
+    sliced_identifiers = load_batch_experiments(tmp_path / "batch_1").identifiers()
     assert with_reference_identifiers == sliced_identifiers
     check_output(tmp_path, find_spots=True)
 